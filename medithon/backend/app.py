@@ -1,8 +1,21 @@
-from flask import Flask, render_template, request, jsonify
+import hmac
+import os
+import threading
+
+from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
-from gen_ai_components.combined_chaining import chain, get_session_history, chain_user
+from gen_ai_components.combined_chaining import (
+    chain, get_session_history, chain_user, session_lock, history_manager, answer_batch, BATCH_MAX_CONCURRENCY,
+    knowledge_base,
+)
 from gen_ai_components.speech_to_text import transcribe_audio
 from gen_ai_components.serp import serp_search
+from gen_ai_components.metrics import metrics
+from gen_ai_components.slow_requests import record_slow_requests, note
+from gen_ai_components import kb
+from gen_ai_components.single_flight import SingleFlight, query_key
+from gen_ai_components.caches import RESPONSE_CACHE_SIZE, TTLCache
+from gen_ai_components.warmup import Warmup
 
 from dotenv import load_dotenv
 
@@ -11,7 +24,63 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Shared secret for the reload endpoint (unset = reloads over HTTP are refused)
+KB_RELOAD_TOKEN = os.getenv("KB_RELOAD_TOKEN")
+
+# Most queries accepted by one /api/query/batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+
+# Identical stateless queries in flight at the same time share one chain run
+query_flights = SingleFlight("query")
+
+# Answers to stateless queries, by (mode, normalized query, knowledge-base generation)
+response_cache = TTLCache("response", RESPONSE_CACHE_SIZE)
+
+def stateless_answer(mode, query_text, run):
+    """
+    Answer that depends on the question alone: cached, else computed once per burst.
+    Called inside kb.pinned(), so the key names the generation `run` will read.
+    """
+    key = query_key(mode, query_text, knowledge_base.active().version)
+    result = response_cache.get(key)
+    note("response_cached", result is not None)
+    if result is None:
+        result, shared = query_flights.do(key, run)
+        note("coalesced", shared)
+        response_cache.put(key, result)
+    return result
+
+def warm_query(query_text):
+    """Runs a query as a fresh doctor session would, filling every cache on the way."""
+    with kb.pinned():
+        stateless_answer("doctor", query_text, lambda: chain.invoke({"user_query": query_text, "history": []}))
+
+warmup = Warmup(warm_query)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_tasks():
+    """
+    Starts the knowledge-base watcher and the cache warm-up, once per process.
+    Only a process that serves requests calls this, never one that merely
+    imports the app (tests, benchmarks, the debug reloader's parent).
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    kb.start_watcher()
+    warmup.start()
+
+@app.before_request
+def ensure_background_tasks():
+    # Covers WSGI servers, which import the app and never run __main__
+    start_background_tasks()
+
 @app.route("/api/query", methods=["POST"])
+@record_slow_requests
 def query():
     try:
         data = request.get_json()
@@ -22,32 +91,41 @@ def query():
 
         # for now mode methodology is not set
         mode = data.get("mode")
+        note("mode", mode)
+        note("query", query_text)
 
         if mode == "doctor":
-            # Get history manually
-            chat_history = get_session_history(session_id)
-            print(chat_history)
-            
-            # Invoke chain with manual history
-            result = chain.invoke({
-                "user_query": query_text,
-                "history": chat_history.messages
-            })
-            
-            
-            # Add to history manually (Store summary to avoid huge JSONs)
-            chat_history.add_user_message(query_text)
-            chat_history.add_ai_message(result.summary)
+            # One request at a time per session so turns never interleave;
+            # every retrieval reads the knowledge-base generation current at the start
+            with session_lock(session_id), kb.pinned():
+                # Get history manually
+                chat_history = get_session_history(session_id)
+                print(chat_history)
+
+                # Invoke chain with the bounded view: summary + recent turns
+                history = history_manager.window(chat_history.messages)
+                inputs = {"user_query": query_text, "history": history}
+                if history:
+                    result = chain.invoke(inputs)
+                else:
+                    # No history: the answer depends on the question alone
+                    result = stateless_answer(mode, query_text, lambda: chain.invoke(inputs))
+
+                # Add to history manually (Store summary to avoid huge JSONs)
+                chat_history.add_user_message(query_text)
+                chat_history.add_ai_message(result.summary)
         
             # Convert Pydantic model to dict for JSON serialization
             response_data = result.model_dump()
-            
-            return jsonify(response_data)
+
+            # Fold older turns into the summary once the response is sent
+            response = jsonify(response_data)
+            response.call_on_close(lambda: history_manager.schedule_fold(session_id, get_session_history))
+            return response
         
         elif mode == "patient":
-            result = chain_user.invoke({
-                "query": query_text,
-            })
+            with kb.pinned():
+                result = stateless_answer(mode, query_text, lambda: chain_user.invoke({"query": query_text}))
             response_data = result.model_dump()
             
             return jsonify(response_data)
@@ -60,11 +138,93 @@ def query():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/query/batch", methods=["POST"])
+@record_slow_requests
+def query_batch():
+    """
+    Answers independent queries (no session history) in one request.
+    JSON: {"queries": [...], "mode": "doctor" | "patient", "max_concurrency": n}.
+    Returns {"results": [...]} in input order; a failed item is {"error": ...}.
+    """
+    try:
+        data = request.get_json() or {}
+        queries = data.get("queries")
+        mode = data.get("mode", "doctor")
+
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            return jsonify({"error": "queries must be a non-empty list of strings"}), 400
+        if len(queries) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"At most {MAX_BATCH_SIZE} queries per batch"}), 400
+        if mode not in ("doctor", "patient"):
+            return jsonify({"error": "Invalid mode"}), 400
+        try:
+            max_concurrency = min(max(1, int(data.get("max_concurrency") or BATCH_MAX_CONCURRENCY)), BATCH_MAX_CONCURRENCY)
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_concurrency must be an integer"}), 400
+
+        note("mode", mode)
+        note("batch_size", len(queries))
+
+        with kb.pinned():
+            if mode == "doctor":
+                answers = answer_batch(queries, max_concurrency)
+            else:
+                answers = chain_user.batch(
+                    [{"query": q} for q in queries], {"max_concurrency": max_concurrency}, return_exceptions=True
+                )
+
+        results = []
+        for query_text, answer in zip(queries, answers):
+            if isinstance(answer, Exception):
+                print(f"Batch item error ({query_text[:60]!r}): {answer}")
+                results.append({"error": str(answer)})
+            else:
+                results.append(answer.model_dump())
+        return jsonify({"results": results})
+
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
 
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    """Readiness: 503 until the startup cache warm-up has finished, with its progress."""
+    status = warmup.status()
+    return jsonify({"status": "ready" if status["ready"] else "warming", "warmup": status}), (200 if status["ready"] else 503)
+
+@app.route("/api/kb", methods=["GET"])
+def kb_status():
+    """Loaded knowledge-base generations and the outcome of the last reload."""
+    return jsonify({"generations": kb.status()})
+
+@app.route("/api/kb/reload", methods=["POST"])
+def kb_reload():
+    """
+    Re-reads the configured vector root or snapshot and swaps in the new
+    generation in the background. Requires the X-Reload-Token header to
+    match KB_RELOAD_TOKEN. Optional JSON: {"force": true}.
+    """
+    if not KB_RELOAD_TOKEN:
+        return jsonify({"error": "Reload over HTTP is disabled; set KB_RELOAD_TOKEN"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Reload-Token", ""), KB_RELOAD_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    started = kb.reload_all(force=bool(data.get("force")))
+    return jsonify({"status": "reloading" if started else "already_reloading", "generations": kb.status()}), 202
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Per-stage latency, token, cache and error metrics in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/transcribe", methods=["POST"])
+@record_slow_requests
 def transcribe():
     """Transcribe audio to text using open-source Whisper."""
     try:
@@ -86,6 +246,7 @@ def transcribe():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/search", methods=["POST"])
+@record_slow_requests
 def search():
     """Perform a web search using SerpAPI."""
     try:
@@ -107,4 +268,8 @@ def search():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    # The debug reloader re-runs this file in a child that serves requests;
+    # the parent only watches files, so it starts nothing
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_tasks()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Benchmark: iterative tool loop vs plan-then-execute modes of MedicalRepAgent.
+
+Replays recorded sessions instead of calling OpenAI, so the numbers measure
+the agent's orchestration (LLM round-trips, prompt size, tool fan-out) rather
+than network noise. Recordings are derived from the tool-call sequences in
+gen_ai_components/audit_log.jsonl, or loaded from a JSON file via --recordings.
+
+Run from backend/:
+    python -m benchmarks.bench_agent_planner
+    python -m benchmarks.bench_agent_planner --llm-latency-ms 800 --out planner.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+COMPONENTS_DIR = BACKEND_DIR / "gen_ai_components"
+AUDIT_LOG = COMPONENTS_DIR / "audit_log.jsonl"
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-replay")
+
+# Tools that take a single drug run in the first round of a recorded loop;
+# multi-drug tools come after the model has seen the single-drug results.
+SINGLE_DRUG_TOOLS = {"drug_information_retrieval", "reimbursement_navigator"}
+
+
+# =============================================================================
+# RECORDINGS
+# =============================================================================
+
+def recordings_from_audit_log(path: Path):
+    """Turns audit entries into [{query, rounds, final}] recordings."""
+    recordings = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            query = entry.get("query", "").strip()
+            calls = entry.get("tool_calls") or []
+            if not query or not calls or query in seen:
+                continue
+            seen.add(query)
+
+            first = [c for c in calls if c["tool_name"] in SINGLE_DRUG_TOOLS]
+            second = [c for c in calls if c["tool_name"] not in SINGLE_DRUG_TOOLS]
+            recordings.append({
+                "query": query,
+                "rounds": [r for r in (first, second) if r],
+                "final": entry["response"],
+            })
+    return recordings
+
+
+# =============================================================================
+# REPLAY CLIENT
+# =============================================================================
+
+class ReplayCompletions:
+    def __init__(self, recordings, latency_s, prefill_s_per_1k):
+        self.recordings = recordings
+        self.latency_s = latency_s
+        self.prefill_s_per_1k = prefill_s_per_1k
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def _recording_for(self, messages):
+        user_content = [m for m in messages if isinstance(m, dict) and m.get("role") == "user"][-1]["content"]
+        for rec in self.recordings:
+            if f"\n{rec['query']}\n" in user_content:
+                return rec
+        raise KeyError("No recording for query")
+
+    def create(self, model, messages, tools=None, tool_choice="auto", **kwargs):
+        prompt_tokens = len(json.dumps(messages, default=str)) // 4
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+
+        time.sleep(self.latency_s + self.prefill_s_per_1k * prompt_tokens / 1000)
+
+        rec = self._recording_for(messages)
+        # Rounds already answered = assistant tool-call messages after the user query
+        done = sum(1 for m in messages if isinstance(m, dict) and m.get("tool_calls"))
+
+        if messages[-1].get("role") == "system":
+            # The plan-then-execute planning call: every round at once
+            calls = [c for r in rec["rounds"] for c in r]
+        elif tool_choice == "auto" and done < len(rec["rounds"]):
+            calls = rec["rounds"][done]
+        else:
+            calls = []
+
+        tool_calls = [
+            SimpleNamespace(
+                id=f"call_{done}_{i}",
+                type="function",
+                function=SimpleNamespace(name=c["tool_name"], arguments=json.dumps(c["tool_args"])),
+            )
+            for i, c in enumerate(calls)
+        ]
+        message = SimpleNamespace(content=None if tool_calls else rec["final"], tool_calls=tool_calls or None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_replay_tool(latency_s):
+    def execute_tool(tool_name, tool_args):
+        time.sleep(latency_s)
+        seed = json.dumps(tool_args, sort_keys=True)
+        return {
+            "query": seed,
+            "top_matches": [
+                {"content": f"{tool_name} {seed} chunk {i} " * 60, "metadata": {"seq_num": i}}
+                for i in range(5)
+            ],
+        }
+    return execute_tool
+
+
+# =============================================================================
+# RUN
+# =============================================================================
+
+def run_mode(agent_module, planner, recordings, args):
+    completions = ReplayCompletions(recordings, args.llm_latency_ms / 1000, args.prefill_ms_per_1k / 1000)
+    agent_module.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    agent_module.execute_tool = make_replay_tool(args.tool_latency_ms / 1000)
+
+    agent = agent_module.MedicalRepAgent(planner=planner)
+    latencies = []
+    for rec in recordings:
+        start = time.perf_counter()
+        agent.process_message(rec["query"], [])
+        latencies.append(time.perf_counter() - start)
+
+    n = len(recordings)
+    return {
+        "planner": planner or "loop",
+        "queries": n,
+        "llm_calls_total": completions.calls,
+        "llm_calls_per_query": round(completions.calls / n, 2),
+        "prompt_tokens_per_query": round(completions.prompt_tokens / n),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "latency_max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", type=Path, help="JSON list of {query, rounds, final}")
+    parser.add_argument("--llm-latency-ms", type=float, default=600, help="fixed latency per completion call")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=30, help="extra latency per 1k prompt tokens")
+    parser.add_argument("--tool-latency-ms", type=float, default=80, help="latency per tool execution")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.recordings:
+        recordings = json.loads(args.recordings.read_text(encoding="utf-8"))
+    else:
+        recordings = recordings_from_audit_log(AUDIT_LOG)
+
+    from gen_ai_components import agent as agent_module
+    from gen_ai_components.audit_writer import AuditLogger
+
+    # Keep replayed answers out of the real audit log
+    agent_module.guardrails.logger = AuditLogger(os.path.join(tempfile.mkdtemp(), "audit_log.jsonl"))
+
+    results = [run_mode(agent_module, planner, recordings, args) for planner in agent_module.PLANNER_MODES]
+
+    print(f"\n{'mode':<6} {'calls/q':>8} {'prompt tok/q':>13} {'mean ms':>9} {'p50 ms':>9}")
+    for r in results:
+        print(f"{r['planner']:<6} {r['llm_calls_per_query']:>8} {r['prompt_tokens_per_query']:>13} "
+              f"{r['latency_mean_ms']:>9} {r['latency_p50_ms']:>9}")
+
+    if args.out:
+        config = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+        args.out.write_text(json.dumps({"config": config, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
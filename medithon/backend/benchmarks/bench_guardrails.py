@@ -0,0 +1,201 @@
+"""
+Benchmark + regression check for the input guardrails.
+
+The regression corpus (benchmarks/guardrails_corpus.jsonl) is built from the
+queries in gen_ai_components/test_guardrails.py, the queries in the audit log
+and probes derived from every guardrail pattern and known drug name, labelled
+with the decision of the original one-re.search-per-pattern implementation. Any change to the
+matcher or the pattern lists must keep the corpus green.
+
+Run from backend/:
+    python -m benchmarks.bench_guardrails              # check corpus + timings
+    python -m benchmarks.bench_guardrails --rebuild    # regenerate the corpus
+"""
+import argparse
+import ast
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+from gen_ai_components import guardrails
+from gen_ai_components.drug_index import get_drug_index, normalize_name
+from gen_ai_components.guardrails import GUARDRAIL_CATEGORIES, GuardrailMatcher, InputGuardrails
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+COMPONENTS_DIR = BACKEND_DIR / "gen_ai_components"
+CORPUS_PATH = Path(__file__).resolve().parent / "guardrails_corpus.jsonl"
+
+GREETINGS = ["hi", "hello", "hello doctor", "hi doctor"]
+
+
+# =============================================================================
+# ORACLE: the original per-pattern implementation
+# =============================================================================
+
+def legacy_decision(query: str):
+    def detect(patterns, q):
+        return any(re.search(p, q) for p in patterns)
+
+    q = query.lower().strip()
+    if q in GREETINGS:
+        return "allowed", None
+    if detect(guardrails.PROMPT_INJECTION_PATTERNS, q):
+        return "blocked", "prompt_injection"
+    # Drug names are checked one by one, like the original medication list,
+    # in the matching form the recognizer gives names and query text alike
+    drug_names = [rf"(?<![\w-]){re.escape(n)}(?![\w-])" for n in get_drug_index().names]
+    if detect(guardrails.CREATIVE_PATTERNS, q) and (
+            detect(guardrails.MEDICATION_INDICATORS + guardrails.DISEASE_PATTERNS, q)
+            or detect(drug_names, normalize_name(q))):
+        return "blocked", "creative_medical_conflict"
+    if detect(guardrails.NON_MEDICAL_PATTERNS, q):
+        return "blocked", "out_of_scope"
+    if detect(guardrails.DIAGNOSIS_PATTERNS, q):
+        return "blocked", "diagnosis_blocked"
+    if detect(guardrails.PATIENT_SPECIFIC_PATTERNS, q):
+        return "clarification_required", None
+    return "allowed", None
+
+
+def decision(result):
+    return result["status"], result.get("category")
+
+
+# =============================================================================
+# CORPUS
+# =============================================================================
+
+def test_script_queries():
+    tree = ast.parse((COMPONENTS_DIR / "test_guardrails.py").read_text(encoding="utf-8"))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "queries" for t in node.targets):
+            return ast.literal_eval(node.value)
+    return []
+
+
+def audit_log_queries():
+    queries = []
+    with open(COMPONENTS_DIR / "audit_log.jsonl", encoding="utf-8") as f:
+        for line in f:
+            queries.append(json.loads(line).get("query", ""))
+    return queries
+
+
+def pattern_probes():
+    """Every pattern in a sentence, alone and next to a pattern of each other category."""
+    samples = {}
+    for category, patterns in GUARDRAIL_CATEGORIES.items():
+        samples[category] = [
+            re.sub(r"\(([^|)]*)\|[^)]*\)", r"\1", p.replace("\\b", "")) for p in patterns
+        ]
+
+    probes = []
+    for category, texts in samples.items():
+        for text in texts:
+            probes.append(f"Please {text} for the clinic.")
+            probes.append(f"{text.upper()}!")
+            for other in samples.values():
+                probes.append(f"{text} and {other[0]}")
+
+    # Creative requests naming a drug by generic, brand or Jan Aushadhi name,
+    # in matching form and as written in the data ("Zerodol-P", "A + B")
+    index = get_drug_index()
+    written = {name for drug in index.drugs.values() for name in [drug["generic_name"]] + drug.get("brands", [])}
+    for name in sorted(set(index.names) | written):
+        probes.append(f"Write a poem about {name}")
+        probes.append(f"Tell me about {name}")
+    return probes
+
+
+def build_corpus():
+    queries = test_script_queries() + audit_log_queries() + GREETINGS + pattern_probes()
+    seen, corpus = set(), []
+    for q in queries:
+        if q in seen:
+            continue
+        seen.add(q)
+        status, category = legacy_decision(q)
+        corpus.append({"query": q, "status": status, "category": category})
+    return corpus
+
+
+def check_corpus(input_guardrails):
+    failures = 0
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f]
+    for case in corpus:
+        got = decision(input_guardrails.run(case["query"]))
+        if got != (case["status"], case["category"]):
+            failures += 1
+            print(f"❌ {case['query']!r}: expected {(case['status'], case['category'])}, got {got}")
+    print(f"Corpus: {len(corpus) - failures}/{len(corpus)} match")
+    return corpus, failures
+
+
+# =============================================================================
+# TIMINGS
+# =============================================================================
+
+def time_us(fn, number):
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+
+def bench(corpus, number):
+    input_guardrails = InputGuardrails()
+    queries = [c["query"] for c in corpus]
+    n_categories = len(GUARDRAIL_CATEGORIES)
+
+    def run_all(fn):
+        for q in queries:
+            fn(q)
+
+    compiled_us = time_us(lambda: run_all(input_guardrails.run), number) / len(queries)
+    legacy_us = time_us(lambda: run_all(legacy_decision), number) / len(queries)
+
+    # Pattern-list growth: pad the medication list with synthetic drug names
+    growth = []
+    for extra in (0, 100, 1000):
+        categories = dict(GUARDRAIL_CATEGORIES)
+        categories["medication"] = categories["medication"] + [rf"\bdrug{i:04d}zol\b" for i in range(extra)]
+        matcher = GuardrailMatcher(categories)
+        scan_us = time_us(lambda: run_all(matcher.scan), number) / len(queries)
+        growth.append({"patterns": sum(len(p) for p in categories.values()), "scan_us": round(scan_us, 2)})
+
+    return {
+        "queries": len(queries),
+        "legacy_us_per_query": round(legacy_us, 2),
+        "compiled_us_per_query": round(compiled_us, 2),
+        "compiled_us_per_category_check": round(compiled_us / n_categories, 3),
+        "speedup": round(legacy_us / compiled_us, 1),
+        "pattern_growth": growth,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="regenerate the regression corpus")
+    parser.add_argument("--number", type=int, default=20, help="timing repetitions over the corpus")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        corpus = build_corpus()
+        with open(CORPUS_PATH, "w", encoding="utf-8") as f:
+            for case in corpus:
+                f.write(json.dumps(case) + "\n")
+        print(f"✅ Wrote {len(corpus)} cases to {CORPUS_PATH}")
+
+    corpus, failures = check_corpus(InputGuardrails())
+    results = bench(corpus, args.number)
+    print(json.dumps(results, indent=2))
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
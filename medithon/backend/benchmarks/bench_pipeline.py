@@ -0,0 +1,241 @@
+"""
+Benchmark: the whole pipeline offline, phase by phase.
+
+Runs the real code (populate_db, rag_chain, rag_batch, chain_user, the
+agent loop with its Chroma tools, serp_search) against deterministic stand-ins from
+benchmarks/fakes.py: hash embeddings, a chat model that returns a valid
+MedicalResponse, and a local SerpAPI stub. Vector stores are built in a
+temp dir (VECTOR_DIR), so nothing in the checkout is touched.
+
+Per phase it reports throughput, latency percentiles, per-stage latency
+from the metrics registry and process RSS. --out writes JSON with the
+git commit, so runs from two commits can be diffed directly. rag_batch
+answers the same queries as rag_chain in one answer_batch call (the
+/api/query/batch path), so the two rows compare batch and per-query
+throughput.
+
+Run from backend/:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --llm-latency-ms 0 --concurrency 8 --out pipeline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+COMPONENTS_DIR = BACKEND_DIR / "gen_ai_components"
+AUDIT_LOG = COMPONENTS_DIR / "audit_log.jsonl"
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def rss_mb(pid="self") -> float:
+    """Current RSS of a process from /proc; our own peak RSS where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if pid != "self":
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_phase(name, fn, items, concurrency, registries):
+    """Calls fn(item) for every item; returns throughput, latencies and stage means."""
+    for registry in registries:
+        registry.reset()
+    latencies, errors = [], 0
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            fn(item)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, error in pool.map(timed, items):
+            latencies.append(seconds)
+            if error is not None:
+                errors += 1
+                print(f"   {name}: {type(error).__name__}: {error}")
+    wall = time.perf_counter() - wall_start
+
+    stages = {}
+    for registry in registries:
+        stages.update(registry.stage_summary())
+    return {
+        "phase": name,
+        "items": len(items),
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(items) / wall, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "stages": dict(sorted(stages.items())),
+        "rss_mb": rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =============================================================================
+# WORKLOAD
+# =============================================================================
+
+def audit_queries(path: Path, limit: int):
+    """Distinct queries from the audit log, repeated up to limit."""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            query = json.loads(line).get("query", "").strip()
+            if query and query not in queries:
+                queries.append(query)
+    return [queries[i % len(queries)] for i in range(limit)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=40, help="chain invocations per phase")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="fixed latency per chat completion")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0, help="extra latency per 1k prompt tokens")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0, help="latency per embeddings call")
+    parser.add_argument("--serp-latency-ms", type=float, default=0, help="latency of the SerpAPI stub")
+    parser.add_argument("--phases", nargs="+", default=["populate_db", "rag_chain", "rag_batch", "chain_user", "agent", "serp"])
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    from benchmarks.fakes import CannedChatModel, HashEmbeddings, StubSerpServer
+
+    serp_stub = StubSerpServer(latency_s=args.serp_latency_ms / 1000).__enter__()
+
+    # Before any pipeline import: these are read at module import time
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.environ["VECTOR_DIR"] = os.path.join(workdir, "Vector")
+    os.environ["OPENAI_API_KEY"] = "sk-offline"
+    os.environ["SERPAPI_API_KEY"] = "offline"
+    os.environ["SERPAPI_URL"] = serp_stub.url
+    os.environ["SESSION_STORE"] = "memory"
+    os.environ["SLOW_REQUEST_LOG"] = os.path.join(workdir, "slow_requests.jsonl")
+
+    embeddings = HashEmbeddings(latency_s=args.embedding_latency_ms / 1000)
+
+    def chat_factory(model, temperature=0, **kwargs):
+        return CannedChatModel(model=model, latency_s=args.llm_latency_ms / 1000,
+                               prefill_s_per_1k=args.prefill_ms_per_1k / 1000)
+
+    def embeddings_factory(model, **kwargs):
+        return embeddings
+
+    from gen_ai_components import providers
+    providers.override(chat=chat_factory, embeddings=embeddings_factory)
+
+    from gen_ai_components.metrics import metrics
+
+    queries = audit_queries(AUDIT_LOG, args.queries)
+    results = []
+    print(f"Working dir: {workdir}")
+
+    # populate_db always runs: the other phases read its stores
+    import populate_db
+    phase = run_phase("populate_db", lambda _: populate_db.populate_all(), [None], 1, [metrics])
+    phase["embedded_texts"] = embeddings.texts
+    if "populate_db" in args.phases:
+        results.append(phase)
+
+    if {"rag_chain", "rag_batch", "chain_user"} & set(args.phases):
+        from gen_ai_components.combined_chaining import answer_batch, chain_user, rag_chain
+        if "rag_chain" in args.phases:
+            results.append(run_phase(
+                "rag_chain", lambda q: rag_chain.invoke({"user_query": q, "history": []}),
+                queries, args.concurrency, [metrics],
+            ))
+        if "rag_batch" in args.phases:
+            failed = []
+            phase = run_phase(
+                "rag_batch", lambda batch: failed.extend(a for a in answer_batch(batch, args.concurrency)
+                                                         if isinstance(a, Exception)),
+                [queries], 1, [metrics],
+            )
+            # One call answers every query: report per-query throughput
+            phase.update(items=len(queries), errors=len(failed),
+                         throughput_per_s=round(len(queries) / phase["wall_s"], 2))
+            results.append(phase)
+        if "chain_user" in args.phases:
+            results.append(run_phase(
+                "chain_user", lambda q: chain_user.invoke({"query": q}),
+                queries, args.concurrency, [metrics],
+            ))
+
+    if "agent" in args.phases:
+        from types import SimpleNamespace
+
+        from benchmarks.bench_agent_planner import ReplayCompletions, recordings_from_audit_log
+        from gen_ai_components import agent as agent_module
+        from gen_ai_components.audit_writer import AuditLogger
+
+        recordings = recordings_from_audit_log(AUDIT_LOG)
+        completions = ReplayCompletions(recordings, args.llm_latency_ms / 1000, args.prefill_ms_per_1k / 1000)
+        agent_module.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        agent_module.guardrails.logger = AuditLogger(os.path.join(workdir, "agent_audit_log.jsonl"))
+        agent = agent_module.MedicalRepAgent()
+        phase = run_phase(
+            "agent", lambda rec: agent.process_message(rec["query"], []),
+            recordings, args.concurrency, [metrics],
+        )
+        phase["llm_calls_per_item"] = round(completions.calls / max(1, len(recordings)), 2)
+        results.append(phase)
+
+    if "serp" in args.phases:
+        from gen_ai_components.serp import serp_search
+        results.append(run_phase("serp", serp_search, queries, args.concurrency, [metrics]))
+
+    serp_stub.__exit__(None, None, None)
+
+    print(f"\n{'phase':<12} {'items':>6} {'err':>4} {'per s':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'rss MB':>8}")
+    for r in results:
+        print(f"{r['phase']:<12} {r['items']:>6} {r['errors']:>4} {r['throughput_per_s']:>8} "
+              f"{r['latency_mean_ms']:>9} {r['latency_p50_ms']:>9} {r['latency_p95_ms']:>9} {r['rss_mb']:>8}")
+        for stage, s in r["stages"].items():
+            print(f"    {stage:<28} n={s['count']:<6} mean {s['mean_ms']} ms")
+
+    if args.out:
+        config = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+        machine = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+        args.out.write_text(json.dumps(
+            {"commit": git_commit(), "config": config, "machine": machine, "results": results}, indent=2,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmark: retrieval quality and latency against labels derived from the data.
+
+Every record in data/ has a known id, so query -> expected-record pairs can
+be generated instead of hand-labelled:
+
+    interactions.json   scenario demo_query   -> the scenario + both drug records
+    comparisons.json    "Compare A vs B ..."  -> the comparison table + drug records
+    drugs_master.json   indication / strength -> the drug record
+                        price / coverage      -> its drug_coverage group or CSV price rows
+
+A retrieved chunk satisfies an expected record if its metadata record_id
+matches or its text carries the record's anchor (e.g. `"id": "metformin"`).
+Each configuration reports recall@k (share of expected records found),
+MRR, context tokens and search latency:
+
+    dense      each needed collection searched at k (oracle routing)
+    hybrid     dense + BM25 over the same collection, fused by reciprocal rank
+    filtered   dense restricted by a `where` on the drugs named in the query
+    fanout     all four collections at k, as combined_chaining does today
+    routed     only the collections a keyword/drug-name router picks
+    chunk=N    dense over stores re-split at chunk size N (--chunk-sizes)
+
+--snapshot-variants exports the stores to snapshots (gen_ai_components/
+snapshot.py) at several index precisions and reports, for each, dense
+recall and latency against the bytes per vector a search has to scan:
+
+    f32 / f16          exact over the full matrix
+    512/f16, 512/int8  shortened index, top candidates re-scored at full precision
+    256/int8           the same at 256 dims; "norescore" ranks by the index alone
+
+Queries are embedded once and searched by vector, so latency is the vector
+store alone; the embedding call is reported separately.
+
+Run from backend/:
+    python -m benchmarks.bench_retrieval                       # stores in ./Vector, OpenAI embeddings
+    python -m benchmarks.bench_retrieval --offline --chunk-sizes 1000 2000 4000
+    python -m benchmarks.bench_retrieval --k 1 2 3 5 8 --out retrieval.json
+    python -m benchmarks.bench_retrieval --offline --snapshot-variants
+"""
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BACKEND_DIR, git_commit, percentile
+
+DATA_DIR = BACKEND_DIR / "data"
+
+# Collection label (as in combined_chaining) -> persist directory
+COLLECTIONS = {
+    "drugs": "Vector_drugs_master",
+    "interactions": "Vector_interactions",
+    "reimbursement": "Vector_reimbursement",
+    "comparisons": "Vector_comparisons",
+}
+
+PRICE_WORDS = ("price", "cost", "cheap", "afford", "covered", "coverage", "cghs", "esic", "pm-jay", "pmjay",
+               "jan aushadhi", "reimburs", "insurance", "mrp")
+COMPARE_WORDS = (" vs ", "versus", "compare", "better", "prefer", "which ")
+INTERACTION_WORDS = ("already on", "together", "interact", "with ", "safe", "taking", "patient on")
+
+TOKEN_PATTERN = re.compile(r"\w+")
+RRF_K = 60
+
+# Snapshot variant -> (export options, rescore factor; None = snapshot default)
+SNAPSHOT_VARIANTS = {
+    "f32": ({"dtype": "float32"}, None),
+    "f16": ({"dtype": "float16"}, None),
+    "512/f16": ({"dtype": "float16", "index_dim": 512, "index_dtype": "float16"}, None),
+    "512/int8": ({"dtype": "float16", "index_dim": 512, "index_dtype": "int8"}, None),
+    "256/int8": ({"dtype": "float16", "index_dim": 256, "index_dtype": "int8"}, None),
+    "256/int8 norescore": ({"dtype": "float16", "index_dim": 256, "index_dtype": "int8"}, 0),
+}
+
+
+# =============================================================================
+# LABELLED CASES
+# =============================================================================
+
+def _title_anchors(title):
+    return [f'"title": {json.dumps(title)}', f'"title": {json.dumps(title, ensure_ascii=False)}']
+
+
+def build_cases(data_dir: Path = DATA_DIR):
+    """
+    Returns (cases, anchors): cases are {query, kind, needs: [(collection, [record keys])]};
+    anchors maps record key -> substrings that identify the record in a chunk.
+    """
+    load = lambda name: json.loads((data_dir / name).read_text(encoding="utf-8"))
+    drugs = load("drugs_master.json")["drugs"]
+    scenarios = load("interactions.json")["scenarios"]
+    comparisons = load("comparisons.json")["comparisons"]
+    coverage = load("reimbursement.json")["drug_coverage"]
+    names = {d["id"]: d["generic_name"] for d in drugs}
+
+    anchors = {}
+    for d in drugs:
+        anchors[f"drug:{d['id']}"] = [f'"id": "{d["id"]}"']
+        anchors[f"price:{d['generic_name'].lower()}"] = [f"Drug: {d['generic_name']}\n"]
+    for s in scenarios:
+        anchors[f"scenario:{s['id']}"] = _title_anchors(s["title"])
+    for c in comparisons:
+        anchors[f"comparison:{c['id']}"] = _title_anchors(c["title"])
+    for group in coverage:
+        anchors[f"coverage:{group}"] = [f'"{group}": {{']
+
+    cases = []
+    for s in scenarios:
+        ids = [s["drug_a"]["id"], s["drug_b"]["id"]]
+        cases.append({"kind": "scenario", "query": s["demo_query"], "needs": [
+            ("interactions", [f"scenario:{s['id']}"]),
+            *(("drugs", [f"drug:{i}"]) for i in ids if i in names),
+        ]})
+    for c in comparisons:
+        drug_names = [names.get(i, i) for i in c["drugs"]]
+        cases.append({"kind": "comparison", "query": f"Compare {' vs '.join(drug_names)}: which is preferred?", "needs": [
+            ("comparisons", [f"comparison:{c['id']}"]),
+            *(("drugs", [f"drug:{i}"]) for i in c["drugs"] if i in names),
+        ]})
+    for d in drugs:
+        generic = d["generic_name"]
+        cases.append({"kind": "drug", "query": f"What is {generic} used for and what strength is usually prescribed?",
+                      "needs": [("drugs", [f"drug:{d['id']}"])]})
+        groups = [g for g, entry in coverage.items() if any(generic.lower() in n.lower() for n in entry.get("drugs", []))]
+        cases.append({"kind": "reimbursement", "query": f"What does {generic} cost at Jan Aushadhi and is it covered under CGHS?",
+                      "needs": [("reimbursement", [f"coverage:{g}" for g in groups] + [f"price:{generic.lower()}"])]})
+    return cases, anchors
+
+
+def record_keys(doc, anchors):
+    keys = set()
+    record_id = (doc.metadata or {}).get("record_id")
+    if record_id:
+        keys.add(record_id)
+    for key, needles in anchors.items():
+        if any(n in doc.page_content for n in needles):
+            keys.add(key)
+    return keys
+
+
+# =============================================================================
+# RETRIEVERS
+# =============================================================================
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25:
+    """Okapi BM25 over a collection's chunks (k1=1.5, b=0.75)."""
+
+    def __init__(self, docs, k1=1.5, b=0.75):
+        self.docs = docs
+        self.k1, self.b = k1, b
+        self.tf = [Counter(tokenize(d.page_content)) for d in docs]
+        self.lengths = [sum(tf.values()) for tf in self.tf]
+        self.avg_length = sum(self.lengths) / max(1, len(docs))
+        df = Counter(t for tf in self.tf for t in tf)
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def search(self, query, k):
+        terms = [t for t in tokenize(query) if t in self.idf]
+        scores = []
+        for i, tf in enumerate(self.tf):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+            score = sum(self.idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm) for t in terms if t in tf)
+            if score:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [self.docs[i] for _, i in scores[:k]]
+
+
+def reciprocal_rank_fusion(rankings, k):
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            docs[key] = doc
+            scores[key] = scores.get(key, 0) + 1 / (RRF_K + rank + 1)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+
+def route(query, drug_index):
+    """Collections a cheap keyword + drug-name router would search."""
+    q = f" {query.lower()} "
+    picked = {"drugs"}
+    if len(drug_index.find(query)) >= 2 or any(w in q for w in INTERACTION_WORDS):
+        picked.add("interactions")
+    if any(w in q for w in PRICE_WORDS):
+        picked.add("reimbursement")
+    if any(w in q for w in COMPARE_WORDS):
+        picked.add("comparisons")
+    return picked
+
+
+# =============================================================================
+# EVALUATION
+# =============================================================================
+
+class Scorer:
+    def __init__(self, anchors, estimate_tokens):
+        self.anchors = anchors
+        self.estimate_tokens = estimate_tokens
+        self.found = self.needed = 0
+        self.reciprocal_ranks = []
+        self.context_tokens = []
+        self.latencies = []
+
+    def add(self, needs, retrieved, seconds):
+        """retrieved: collection -> ranked docs for this query."""
+        first_hit = None
+        for collection, keys in needs:
+            self.needed += 1
+            docs = retrieved.get(collection, [])
+            for rank, doc in enumerate(docs, 1):
+                if record_keys(doc, self.anchors) & set(keys):
+                    self.found += 1
+                    first_hit = rank if first_hit is None else min(first_hit, rank)
+                    break
+        self.reciprocal_ranks.append(1 / first_hit if first_hit else 0.0)
+        self.context_tokens.append(sum(self.estimate_tokens(d.page_content) for docs in retrieved.values() for d in docs))
+        self.latencies.append(seconds)
+
+    def result(self, config, k):
+        return {
+            "config": config,
+            "k": k,
+            "recall": round(self.found / max(1, self.needed), 3),
+            "mrr": round(statistics.mean(self.reciprocal_ranks), 3),
+            "context_tokens_mean": round(statistics.mean(self.context_tokens)),
+            "latency_p50_ms": round(percentile(self.latencies, 0.5) * 1000, 2),
+            "latency_p95_ms": round(percentile(self.latencies, 0.95) * 1000, 2),
+        }
+
+
+def dense(store, vector, k, where=None):
+    return [doc for doc, _ in store.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=where)]
+
+
+def filtered(store, vector, k, where):
+    """Dense search over the chunks tagged with the query's drugs, merged with the whole collection when weak."""
+    from gen_ai_components.drug_index import is_weak, merge_results, search_by_vectors
+    if where is None:
+        return dense(store, vector, k)
+    results = search_by_vectors(store, [vector], k, where)[0]
+    if results and not is_weak(results, k):
+        return [doc for doc, _ in results]
+    return [doc for doc, _ in merge_results(results, search_by_vectors(store, [vector], k)[0], k)]
+
+
+def evaluate(config, k, cases, vectors, search, anchors, estimate_tokens):
+    """search(case, vector) -> {collection: docs}."""
+    scorer = Scorer(anchors, estimate_tokens)
+    for case, vector in zip(cases, vectors):
+        start = time.perf_counter()
+        retrieved = search(case, vector)
+        scorer.add(case["needs"], retrieved, time.perf_counter() - start)
+    return scorer.result(config, k)
+
+
+def open_stores(root, embeddings):
+    from langchain_chroma import Chroma
+    from gen_ai_components.providers import collection_dir
+    return {
+        label: Chroma(persist_directory=collection_dir(root, directory), embedding_function=embeddings)
+        for label, directory in COLLECTIONS.items()
+    }
+
+
+def open_snapshot_variant(root, out_root, embeddings, options, rescore_factor):
+    """Exports root into a snapshot with the given options; returns (label -> retriever, snapshot)."""
+    from gen_ai_components.snapshot import RESCORE_FACTOR, Snapshot, SnapshotRetriever, export_snapshot
+
+    snapshot = Snapshot(export_snapshot(root, out_root, **options))
+    factor = RESCORE_FACTOR if rescore_factor is None else rescore_factor
+    return {
+        label: SnapshotRetriever(snapshot, directory, *snapshot.manifest["collections"][directory], embeddings, factor)
+        for label, directory in COLLECTIONS.items() if directory in snapshot.manifest["collections"]
+    }, snapshot
+
+
+def snapshot_dense(retriever, vector, k):
+    return [doc for doc, _ in retriever.similarity_search_by_vector_with_score(vector, k)]
+
+
+def all_docs(store):
+    from langchain_core.documents import Document
+    raw = store.get(include=["documents", "metadatas"])
+    return [Document(page_content=text, metadata=meta or {}) for text, meta in zip(raw["documents"], raw["metadatas"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 5, 8])
+    parser.add_argument("--offline", action="store_true",
+                        help="hash embeddings and freshly built stores in a temp dir (no API calls)")
+    parser.add_argument("--chunk-sizes", type=int, nargs="*", default=[],
+                        help="also rebuild the stores at these chunk sizes (re-embeds the corpus each)")
+    parser.add_argument("--snapshot-variants", action="store_true",
+                        help="also report recall / memory / latency of reduced and quantized snapshot indexes")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    if args.offline:
+        os.environ["VECTOR_DIR"] = os.path.join(workdir, "Vector")
+        os.environ["OPENAI_API_KEY"] = "sk-offline"
+        from benchmarks.fakes import HashEmbeddings
+        from gen_ai_components import providers
+        embeddings = HashEmbeddings()
+        providers.override(embeddings=lambda model, **kwargs: embeddings)
+
+    from gen_ai_components.drug_index import drug_filter, get_drug_index
+    from gen_ai_components.providers import get_embeddings, vector_dir
+    from gen_ai_components.tool_memo import estimate_tokens
+
+    cases, anchors = build_cases()
+    embeddings = get_embeddings(model="text-embedding-3-small")
+    if args.offline or args.chunk_sizes:
+        import populate_db
+    if args.offline:
+        populate_db.populate_all()
+    root = vector_dir("./Vector")
+    stores = open_stores(root, embeddings)
+    drug_index = get_drug_index()
+
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents([c["query"] for c in cases])
+    embed_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(cases)} cases; embedded in {embed_ms:.0f} ms")
+
+    filters = {c["query"]: drug_filter(drug_index.find(c["query"])) for c in cases}
+    bm25 = {label: BM25(all_docs(store)) for label, store in stores.items()}
+    evaluate_k = lambda config, k, search: evaluate(config, k, cases, vectors, search, anchors, estimate_tokens)
+    needed = lambda case: {collection for collection, _ in case["needs"]}
+
+    results = []
+    for k in args.k:
+        results.append(evaluate_k("dense", k, lambda case, v: {
+            c: dense(stores[c], v, k) for c in needed(case)
+        }))
+        results.append(evaluate_k("hybrid", k, lambda case, v: {
+            c: reciprocal_rank_fusion([dense(stores[c], v, 4 * k), bm25[c].search(case["query"], 4 * k)], k)
+            for c in needed(case)
+        }))
+        results.append(evaluate_k("filtered", k, lambda case, v: {
+            c: filtered(stores[c], v, k, filters[case["query"]]) for c in needed(case)
+        }))
+        results.append(evaluate_k("fanout", k, lambda case, v: {
+            c: dense(store, v, k) for c, store in stores.items()
+        }))
+        results.append(evaluate_k("routed", k, lambda case, v: {
+            c: dense(stores[c], v, k) for c in route(case["query"], drug_index)
+        }))
+
+    for size in args.chunk_sizes:
+        chunk_root = os.path.join(workdir, f"chunk_{size}")
+        populate_db.populate_all(chunk_size=size, chunk_overlap=size // 10, vector_root=chunk_root)
+        chunk_stores = open_stores(chunk_root, embeddings)
+        for k in args.k:
+            results.append(evaluate_k(f"chunk={size}", k, lambda case, v: {
+                c: dense(chunk_stores[c], v, k) for c in needed(case)
+            }))
+
+    snapshot_results = []
+    if args.snapshot_variants:
+        for variant, (options, rescore_factor) in SNAPSHOT_VARIANTS.items():
+            out_root = os.path.join(workdir, "snapshots_" + re.sub(r"\W+", "_", variant))
+            retrievers, snapshot = open_snapshot_variant(root, out_root, embeddings, options, rescore_factor)
+            rows = snapshot.manifest["rows"]
+            for k in args.k:
+                result = evaluate_k(variant, k, lambda case, v: {
+                    c: snapshot_dense(retrievers[c], v, k) for c in needed(case) if c in retrievers
+                })
+                result.update({
+                    "bytes_per_vector": round(snapshot.index_bytes / rows),
+                    "index_mb": round(snapshot.index_bytes / 2**20, 3),
+                    # Against 1536-dim float32, what the Chroma stores hold per vector
+                    "reduction": round(rows * snapshot.manifest["dim"] * 4 / snapshot.index_bytes, 1),
+                })
+                snapshot_results.append(result)
+
+    print(f"\n{'config':<12} {'k':>3} {'recall':>7} {'mrr':>6} {'ctx tok':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['config']:<12} {r['k']:>3} {r['recall']:>7} {r['mrr']:>6} {r['context_tokens_mean']:>8} "
+              f"{r['latency_p50_ms']:>8} {r['latency_p95_ms']:>8}")
+
+    if snapshot_results:
+        print(f"\n{'snapshot':<19} {'k':>3} {'recall':>7} {'mrr':>6} {'B/vec':>6} {'index MB':>9} {'x less':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8}")
+        for r in snapshot_results:
+            print(f"{r['config']:<19} {r['k']:>3} {r['recall']:>7} {r['mrr']:>6} {r['bytes_per_vector']:>6} "
+                  f"{r['index_mb']:>9} {r['reduction']:>7} {r['latency_p50_ms']:>8} {r['latency_p95_ms']:>8}")
+
+    if args.out:
+        config = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+        cases_by_kind = Counter(c["kind"] for c in cases)
+        args.out.write_text(json.dumps({
+            "commit": git_commit(), "config": config, "cases": cases_by_kind,
+            "query_embedding_ms": round(embed_ms, 1), "results": results, "snapshot_results": snapshot_results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
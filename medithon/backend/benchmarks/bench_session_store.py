@@ -0,0 +1,103 @@
+"""
+Benchmark: memory footprint and throughput of the session stores.
+
+Fills each store with N sessions of one doctor-mode turn (user query +
+summary) and reports Python heap per session (tracemalloc), SQLite file
+size, and per-turn latency. The "memory (capped)" row shows the LRU bound
+holding memory flat when traffic exceeds SESSION_MAX.
+
+Run from backend/:
+    python -m benchmarks.bench_session_store
+    python -m benchmarks.bench_session_store --sessions 10000 100000 --out sessions.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from gen_ai_components.session_store import InMemorySessionStore, SQLiteSessionStore
+
+QUERY = "Can I prescribe Ibuprofen for a patient already on Metformin? What are the cheaper alternatives?"
+SUMMARY = (
+    "Ibuprofen with Metformin raises the risk of renal impairment and lactic acidosis; "
+    "Paracetamol is the safer, cheaper option (Jan Aushadhi ₹2.05/10 tablets)."
+)
+
+
+def fill(store, n):
+    start = time.perf_counter()
+    for i in range(n):
+        history = store.get(f"session-{i}")
+        history.add_user_message(QUERY)
+        history.add_ai_message(SUMMARY)
+    return time.perf_counter() - start
+
+
+def bench_memory(n, max_sessions):
+    tracemalloc.start()
+    store = InMemorySessionStore(max_sessions=max_sessions, idle_ttl=3600)
+    elapsed = fill(store, n)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "store": "memory" if max_sessions >= n else "memory (capped)",
+        "sessions_written": n,
+        "sessions_retained": len(store),
+        "heap_mb": round(current / 2**20, 1),
+        "peak_heap_mb": round(peak / 2**20, 1),
+        "bytes_per_retained_session": round(current / max(len(store), 1)),
+        "us_per_turn": round(elapsed / n * 1e6, 1),
+    }
+
+
+def bench_sqlite(n):
+    path = os.path.join(tempfile.mkdtemp(), "sessions.sqlite3")
+    tracemalloc.start()
+    store = SQLiteSessionStore(path=path, idle_ttl=3600)
+    elapsed = fill(store, n)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for i in range(0, n, max(n // 1000, 1)):
+        store.load_messages(f"session-{i}")
+    read_us = (time.perf_counter() - start) / min(n, 1000) * 1e6
+
+    db_bytes = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    return {
+        "store": "sqlite",
+        "sessions_written": n,
+        "sessions_retained": len(store),
+        "heap_mb": round(current / 2**20, 1),
+        "db_mb": round(db_bytes / 2**20, 1),
+        "us_per_turn": round(elapsed / n * 1e6, 1),
+        "us_per_history_read": round(read_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--cap", type=int, default=10_000, help="SESSION_MAX for the capped run")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sessions:
+        results.append(bench_memory(n, max_sessions=n))
+        if n > args.cap:
+            results.append(bench_memory(n, max_sessions=args.cap))
+        results.append(bench_sqlite(n))
+
+    for r in results:
+        print(json.dumps(r))
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Deterministic local stand-ins for the external services the pipeline calls.
+
+HashEmbeddings and CannedChatModel plug into gen_ai_components.providers
+(override()) so the real chains, retrievers and vector stores run without
+network; StubSerpServer answers SerpAPI-shaped requests on localhost.
+Latencies are configurable so a benchmark can model the provider or take
+it out of the picture entirely (0).
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+EMBEDDING_DIM = 1536
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# =============================================================================
+# EMBEDDINGS
+# =============================================================================
+
+class HashEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words, L2-normalized. Texts sharing words land
+    close together, so retrieval still returns related chunks.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.latency_s)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# =============================================================================
+# CHAT MODEL
+# =============================================================================
+
+def canned_medical_response(query: str) -> Dict[str, Any]:
+    """Arguments of a MedicalResponse tool call with every section filled."""
+    return {
+        "summary": f"Canned answer for: {query[:120]}",
+        "drug_information": "Mechanism, indications and usual adult dosing (canned).",
+        "interactions": [{
+            "drugs_involved": ["Ibuprofen", "Metformin"],
+            "severity": "MODERATE",
+            "description": "NSAIDs may impair renal clearance of metformin.",
+            "recommendation": "Monitor renal function; prefer paracetamol for analgesia.",
+        }],
+        "reimbursement": {
+            "coverage_status": "Covered by CGHS",
+            "price_range": "₹2-₹20 per strip",
+            "restrictions": None,
+        },
+        "safety_warnings": [{
+            "category": "WARNING",
+            "condition": "Renal impairment",
+            "description": "Reduce dose or avoid when eGFR < 30.",
+        }],
+        "recommendations": "Prefer the Jan Aushadhi generic where available.",
+        "data_limitations": None,
+        "sources": [{"database": "drugs_master", "snippet": "canned"}],
+    }
+
+
+class CannedChatModel(BaseChatModel):
+    """
+    Answers every call after latency_s + prefill_s_per_1k per 1k prompt tokens.
+
+    With tools bound (with_structured_output) it calls the first tool with
+    canned_medical_response(); without, it replies with a short text derived
+    from the last message. Usage is reported like ChatOpenAI does, so the
+    token metrics see realistic prompt sizes.
+    """
+
+    model: str = "canned"
+    latency_s: float = 0.0
+    prefill_s_per_1k: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        time.sleep(self.latency_s + self.prefill_s_per_1k * prompt_tokens / 1000)
+
+        last = str(messages[-1].content) if messages else ""
+        tools = kwargs.get("tools")
+        if tools:
+            args = canned_medical_response(last.strip().splitlines()[-1] if last.strip() else "")
+            message = AIMessage(content="", tool_calls=[
+                {"name": tools[0]["function"]["name"], "args": args, "id": "call_canned"},
+            ])
+            completion_tokens = estimate_tokens(json.dumps(args))
+        else:
+            text = " ".join(last.split()[-40:])
+            message = AIMessage(content=text)
+            completion_tokens = estimate_tokens(text)
+
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+                "model_name": self.model,
+            },
+        )
+
+
+# =============================================================================
+# SERPAPI STUB
+# =============================================================================
+
+class StubSerpServer:
+    """SerpAPI-shaped JSON on http://127.0.0.1:<port>/search.json, in a daemon thread."""
+
+    def __init__(self, latency_s: float = 0.0, results: int = 10):
+        latency, count = latency_s, results
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                body = json.dumps({"organic_results": [
+                    {
+                        "title": f"{query} result {i}",
+                        "link": f"https://example.org/{i}",
+                        "snippet": f"Snippet {i} about {query}.",
+                        "source": "example.org",
+                    }
+                    for i in range(count)
+                ]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/search.json"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
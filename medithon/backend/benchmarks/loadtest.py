@@ -0,0 +1,288 @@
+"""
+Load test: app.py under concurrent doctors and patients, against a mock OpenAI.
+
+Starts benchmarks/mock_openai.py in-process, starts the app in a subprocess
+with OPENAI_BASE_URL pointing at the mock (or targets --app-url), then runs
+--sessions virtual users for --duration seconds. Each user picks a request
+from --mix: doctor-mode /api/query on its own session (history grows),
+patient-mode /api/query, or /api/transcribe with a short generated WAV.
+
+Reports throughput, p50/p95/p99 latency and error rate per request kind,
+plus the app's RSS (start, peak, end). --max-error-rate and --max-p95-ms
+turn the run into a regression gate (exit 1 on breach).
+
+Run from backend/:
+    python -m benchmarks.loadtest --sessions 50 --duration 60
+    python -m benchmarks.loadtest --sessions 200 --mix doctor=7 patient=3 --max-p95-ms 8000 --out load.json
+    python -m benchmarks.loadtest --server-cmd "gunicorn -w 4 -b 127.0.0.1:{port} app:app"
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shlex
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+
+import requests
+
+from benchmarks.bench_pipeline import AUDIT_LOG, BACKEND_DIR, audit_queries, git_commit, percentile, rss_mb
+from benchmarks.mock_openai import MockOpenAIServer
+
+DEFAULT_SERVER_CMD = f"{shlex.quote(sys.executable)} -m flask --app app run --port {{port}} --with-threads --no-reload"
+
+
+# =============================================================================
+# WORKLOAD
+# =============================================================================
+
+def tone_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    """A short 440 Hz mono WAV, enough for Whisper to do a full pass."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = (int(8000 * math.sin(2 * math.pi * 440 * i / rate)) for i in range(int(seconds * rate)))
+        w.writeframes(b"".join(struct.pack("<h", f) for f in frames))
+    return buffer.getvalue()
+
+
+def parse_mix(items):
+    mix = {}
+    for item in items:
+        kind, _, weight = item.partition("=")
+        if kind not in ("doctor", "patient", "transcribe"):
+            raise SystemExit(f"Unknown request kind in --mix: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    """Per-kind latencies and errors, shared by all virtual users."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds, error=None):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+            if error is not None:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f"{kind}: {error}")
+
+
+def virtual_user(index, base_url, mix, queries, audio, deadline, recorder, think_s):
+    http = requests.Session()
+    rng = random.Random(index)
+    kinds, weights = list(mix), list(mix.values())
+    session_id = f"load-{index}"
+
+    while time.monotonic() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        start = time.perf_counter()
+        error = None
+        try:
+            if kind == "transcribe":
+                r = http.post(f"{base_url}/api/transcribe",
+                              files={"audio": ("tone.wav", audio, "audio/wav")}, timeout=300)
+            else:
+                r = http.post(f"{base_url}/api/query", json={
+                    "query": rng.choice(queries), "mode": kind, "session_id": session_id,
+                }, timeout=300)
+            if r.status_code >= 400:
+                error = f"HTTP {r.status_code} {r.text[:120]}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        recorder.record(kind, time.perf_counter() - start, error)
+        if think_s:
+            time.sleep(rng.uniform(0, 2 * think_s))
+
+
+# =============================================================================
+# APP PROCESS
+# =============================================================================
+
+def start_app(cmd, port, env, log_path):
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(shlex.split(cmd.format(port=port)), cwd=BACKEND_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    return proc, log
+
+
+def wait_healthy(base_url, proc, timeout_s):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"App exited with code {proc.returncode} during startup")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"App not healthy after {timeout_s}s")
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid, interval_s=0.5):
+        super().__init__(daemon=True)
+        self.pid, self.interval_s = pid, interval_s
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self.stopped.wait(self.interval_s)
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {"start_mb": self.samples[0], "peak_mb": max(self.samples), "end_mb": self.samples[-1]}
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def summarize(kind, latencies, errors, wall_s):
+    n = len(latencies)
+    return {
+        "kind": kind,
+        "requests": n,
+        "errors": errors,
+        "error_rate": round(errors / n, 4) if n else 0.0,
+        "throughput_per_s": round(n / wall_s, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1) if n else None,
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1) if n else None,
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1) if n else None,
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if n else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load after warm-up")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users start")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's requests")
+    parser.add_argument("--mix", nargs="+", default=["doctor=6", "patient=3", "transcribe=1"],
+                        help="request kinds and weights")
+    parser.add_argument("--app-url", help="load an already running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="PID of --app-url's process, for RSS")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--server-cmd", default=DEFAULT_SERVER_CMD, help="app command; {port} is substituted")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--vector-dir", help="VECTOR_DIR for the app (default: its own ./Vector)")
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="mock: fixed latency per completion")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0, help="mock: prompt processing rate")
+    parser.add_argument("--tokens-per-s", type=float, default=80, help="mock: completion generation rate")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50, help="mock: latency per embeddings call")
+    parser.add_argument("--max-error-rate", type=float, help="fail if the overall error rate exceeds this")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if the overall p95 latency exceeds this")
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    queries = audit_queries(AUDIT_LOG, 200)
+    audio = tone_wav()
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+
+    mock = MockOpenAIServer(0, args.llm_latency_ms, args.prefill_tokens_per_s,
+                            args.tokens_per_s, args.embedding_latency_ms).__enter__()
+    print(f"Mock OpenAI on {mock.url}; working dir {workdir}")
+
+    proc, log = None, None
+    if args.app_url:
+        base_url, pid = args.app_url.rstrip("/"), args.app_pid
+    else:
+        env = dict(os.environ,
+                   OPENAI_BASE_URL=mock.url,
+                   OPENAI_API_KEY="sk-mock",
+                   SLOW_REQUEST_LOG=os.path.join(workdir, "slow_requests.jsonl"))
+        if args.vector_dir:
+            env["VECTOR_DIR"] = args.vector_dir
+        proc, log = start_app(args.server_cmd, args.port, env, os.path.join(workdir, "app.log"))
+        base_url, pid = f"http://127.0.0.1:{args.port}", proc.pid
+
+    try:
+        wait_healthy(base_url, proc, args.startup_timeout)
+        sampler = RssSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+
+        recorder = Recorder()
+        deadline = time.monotonic() + args.ramp_up + args.duration
+        users = []
+        started = time.perf_counter()
+        for i in range(args.sessions):
+            user = threading.Thread(target=virtual_user, daemon=True, args=(
+                i, base_url, mix, queries, audio, deadline, recorder, args.think_ms / 1000,
+            ))
+            user.start()
+            users.append(user)
+            time.sleep(args.ramp_up / max(1, args.sessions))
+        for user in users:
+            user.join()
+        wall = time.perf_counter() - started
+        if sampler:
+            sampler.stopped.set()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+        mock.__exit__(None, None, None)
+
+    results = [summarize(kind, recorder.latencies.get(kind, []), recorder.errors.get(kind, 0), wall) for kind in mix]
+    overall = summarize("all", [s for v in recorder.latencies.values() for s in v], sum(recorder.errors.values()), wall)
+
+    print(f"\n{'kind':<11} {'reqs':>6} {'err %':>7} {'per s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results + [overall]:
+        print(f"{r['kind']:<11} {r['requests']:>6} {r['error_rate'] * 100:>7.2f} {r['throughput_per_s']:>8} "
+              f"{r['latency_p50_ms']!s:>9} {r['latency_p95_ms']!s:>9} {r['latency_p99_ms']!s:>9}")
+    rss = sampler.summary() if sampler else None
+    if rss:
+        print(f"\nApp RSS: start {rss['start_mb']} MB, peak {rss['peak_mb']} MB, end {rss['end_mb']} MB")
+    print(f"Mock: {mock.stats}")
+    for sample in recorder.error_samples[:5]:
+        print(f"   {sample}")
+
+    if args.out:
+        config = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()}
+        args.out.write_text(json.dumps({
+            "commit": git_commit(), "config": config, "results": results, "overall": overall,
+            "app_rss": rss, "mock": mock.stats,
+        }, indent=2))
+
+    failures = []
+    if args.max_error_rate is not None and overall["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {overall['error_rate']} > {args.max_error_rate}")
+    if args.max_p95_ms is not None and (overall["latency_p95_ms"] or 0) > args.max_p95_ms:
+        failures.append(f"p95 {overall['latency_p95_ms']} ms > {args.max_p95_ms} ms")
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
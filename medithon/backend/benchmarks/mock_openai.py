@@ -0,0 +1,289 @@
+"""
+Local mock of the OpenAI endpoints the backend uses.
+
+    POST /v1/chat/completions   tools / tool_choice, response_format (json_schema, json_object)
+    POST /v1/embeddings         string, list of strings, token array, list of token arrays;
+                                encoding_format float or base64
+    GET  /mock/stats            request and token counts since start
+
+Latency of a completion = --latency-ms + prompt tokens / --prefill-tokens-per-s
++ completion tokens / --tokens-per-s, so the serving stack sees realistic
+time-in-provider without a network or an API key. Answers are
+deterministic: MedicalResponse schemas get a fully populated canned answer,
+other schemas and tools get arguments synthesized from their JSON schema.
+Streaming is not supported.
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Run from backend/:
+    python -m benchmarks.mock_openai --port 8400 --latency-ms 400 --tokens-per-s 60
+"""
+import argparse
+import base64
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from benchmarks.fakes import EMBEDDING_DIM, HashEmbeddings, canned_medical_response, estimate_tokens
+
+DEFAULT_DRUGS = ["Paracetamol", "Ibuprofen"]
+
+
+# =============================================================================
+# ANSWERS
+# =============================================================================
+
+def synthesize(schema: Dict[str, Any], defs: Dict[str, Any] = None) -> Any:
+    """Smallest value that validates against a (pydantic-generated) JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return synthesize(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        return synthesize(options[0], defs) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: synthesize(sub, defs) for name, sub in properties.items()}
+    if kind == "array":
+        item = schema.get("items", {})
+        if item.get("type") == "string":
+            return list(DEFAULT_DRUGS)
+        return [synthesize(item, defs)]
+    if kind == "integer":
+        return schema.get("default", 5)
+    if kind == "number":
+        return schema.get("default", 1.0)
+    if kind == "boolean":
+        return False
+    return schema.get("default") or DEFAULT_DRUGS[0]
+
+
+def answer_for(name: str, schema: Dict[str, Any], query: str) -> Dict[str, Any]:
+    if name == "MedicalResponse":
+        return canned_medical_response(query)
+    return synthesize(schema)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def chat_completion(body: Dict[str, Any], completion_id: int) -> Dict[str, Any]:
+    messages = body.get("messages", [])
+    prompt_tokens = sum(estimate_tokens(message_text(m) + json.dumps(m.get("tool_calls") or "")) for m in messages)
+    prompt_tokens += estimate_tokens(json.dumps(body.get("tools") or ""))
+    users = [m for m in messages if m.get("role") == "user"]
+    query = message_text(users[-1]).strip().splitlines()[-1] if users and message_text(users[-1]).strip() else ""
+
+    tools = body.get("tools") or []
+    tool_choice = body.get("tool_choice", "auto")
+    # One round of tool calls per conversation, then a final answer
+    answered = any(m.get("role") == "tool" for m in messages)
+    response_format = body.get("response_format") or {}
+
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    if tools and tool_choice != "none" and (not answered or tool_choice == "required"):
+        if isinstance(tool_choice, dict):
+            tools = [t for t in tools if t["function"]["name"] == tool_choice["function"]["name"]] or tools
+        message["tool_calls"] = [
+            {
+                "id": f"call_{completion_id}_{i}",
+                "type": "function",
+                "function": {
+                    "name": tool["function"]["name"],
+                    "arguments": json.dumps(answer_for(
+                        tool["function"]["name"], tool["function"].get("parameters", {}), query,
+                    )),
+                },
+            }
+            # with_structured_output binds a single tool; the agent gets its first two
+            for i, tool in enumerate(tools[:2])
+        ]
+        content_tokens = estimate_tokens(json.dumps(message["tool_calls"]))
+        finish_reason = "tool_calls"
+    elif response_format.get("type") == "json_schema":
+        spec = response_format["json_schema"]
+        message["content"] = json.dumps(answer_for(spec.get("name", ""), spec.get("schema", {}), query))
+        content_tokens = estimate_tokens(message["content"])
+        finish_reason = "stop"
+    elif response_format.get("type") == "json_object":
+        message["content"] = json.dumps({"answer": f"Mock answer for: {query[:120]}"})
+        content_tokens = estimate_tokens(message["content"])
+        finish_reason = "stop"
+    else:
+        message["content"] = f"Mock answer for: {query[:200]}"
+        content_tokens = estimate_tokens(message["content"])
+        finish_reason = "stop"
+
+    return {
+        "id": f"chatcmpl-mock-{completion_id}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": content_tokens,
+            "total_tokens": prompt_tokens + content_tokens,
+        },
+    }
+
+
+def embedding_inputs(raw: Any) -> List[str]:
+    """Normalizes every accepted `input` shape to one string per embedding."""
+    if isinstance(raw, str):
+        return [raw]
+    if raw and all(isinstance(t, int) for t in raw):
+        return [" ".join(f"t{t}" for t in raw)]
+    return [item if isinstance(item, str) else " ".join(f"t{t}" for t in item) for item in raw]
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class MockOpenAIServer:
+    """Threaded mock on http://127.0.0.1:<port>/v1; a context manager, or serve_forever() from the CLI."""
+
+    def __init__(self, port: int = 0, latency_ms: float = 300, prefill_tokens_per_s: float = 0,
+                 tokens_per_s: float = 80, embedding_latency_ms: float = 50):
+        self.latency_s = latency_ms / 1000
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.tokens_per_s = tokens_per_s
+        self.embedding_latency_s = embedding_latency_ms / 1000
+        self.embedder = HashEmbeddings(dim=EMBEDDING_DIM)
+        self.stats = {"chat_completions": 0, "embeddings": 0, "embedded_inputs": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def completion_delay(self, prompt_tokens: int, completion_tokens: int) -> float:
+        delay = self.latency_s
+        if self.prefill_tokens_per_s:
+            delay += prompt_tokens / self.prefill_tokens_per_s
+        if self.tokens_per_s:
+            delay += completion_tokens / self.tokens_per_s
+        return delay
+
+    def handle_chat(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if body.get("stream"):
+            raise ValueError("streaming is not supported by the mock")
+        with self._lock:
+            self.stats["chat_completions"] += 1
+            completion_id = self.stats["chat_completions"]
+        result = chat_completion(body, completion_id)
+        usage = result["usage"]
+        self._count(prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+        time.sleep(self.completion_delay(usage["prompt_tokens"], usage["completion_tokens"]))
+        return result
+
+    def handle_embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        texts = embedding_inputs(body.get("input", ""))
+        self._count(embeddings=1, embedded_inputs=len(texts))
+        time.sleep(self.embedding_latency_s)
+        data = []
+        for i, text in enumerate(texts):
+            vector = self.embedder._embed(text)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(estimate_tokens(t) for t in texts)
+        return {
+            "object": "list",
+            "model": body.get("model", "mock-embedding"),
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/mock/stats":
+                    with mock._lock:
+                        self._send(200, dict(mock.stats))
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    path = self.path.split("?")[0].rstrip("/")
+                    if path.endswith("/chat/completions"):
+                        self._send(200, mock.handle_chat(body))
+                    elif path.endswith("/embeddings"):
+                        self._send(200, mock.handle_embeddings(body))
+                    else:
+                        self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                except Exception as e:
+                    mock._count(errors=1)
+                    self._send(400, {"error": {"message": str(e), "type": "invalid_request_error"}})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency-ms", type=float, default=300, help="fixed latency per completion")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=0, help="prompt processing rate (0 = free)")
+    parser.add_argument("--tokens-per-s", type=float, default=80, help="completion generation rate (0 = free)")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50, help="latency per embeddings call")
+    args = parser.parse_args()
+
+    mock = MockOpenAIServer(args.port, args.latency_ms, args.prefill_tokens_per_s,
+                            args.tokens_per_s, args.embedding_latency_ms)
+    print(f"Mock OpenAI server on {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
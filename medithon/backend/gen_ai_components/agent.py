@@ -1,18 +1,38 @@
 import os
 import json
-from typing import List, Dict, Any
-
-from openai import OpenAI
-
-from config import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, OPENAI_MODEL, OPENAI_API_KEY
-from tools import execute_tool
-from guardrails import GuardrailsFramework
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+# Package imports when run from backend/ (app, benchmarks), flat when run from
+# gen_ai_components/; never a mix, or the knowledge base, caches and metrics
+# registries would each exist twice
+try:
+    from gen_ai_components.config import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, OPENAI_MODEL, OPENAI_API_KEY, AGENT_PLANNER
+    from gen_ai_components.tools import execute_tool
+    from gen_ai_components.guardrails import GuardrailsFramework
+    from gen_ai_components.tool_memo import ToolResultMemo, ToolOutputCompactor, canonical_key
+    from gen_ai_components.planner import plan_tool_calls
+    from gen_ai_components.providers import get_openai_client
+    from gen_ai_components.metrics import metrics
+    from gen_ai_components.caches import register_cache
+    from gen_ai_components.kb import reload_all, start_watcher
+except ImportError:
+    from config import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, OPENAI_MODEL, OPENAI_API_KEY, AGENT_PLANNER
+    from tools import execute_tool
+    from guardrails import GuardrailsFramework
+    from tool_memo import ToolResultMemo, ToolOutputCompactor, canonical_key
+    from planner import plan_tool_calls
+    from providers import get_openai_client
+    from metrics import metrics
+    from caches import register_cache
+    from kb import reload_all, start_watcher
 
 
 # -------------------------------
 # OpenAI Client Setup
 # -------------------------------
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = get_openai_client(api_key=OPENAI_API_KEY)
 
 # Guardrails
 guardrails = GuardrailsFramework(audit_logfile="audit_log.jsonl")
@@ -89,6 +109,19 @@ TOOLS_OPENAI = [
 ]
 
 
+# -------------------------------
+# Planner Mode
+# -------------------------------
+PLANNER_MODES = (None, "rule", "llm")
+
+PLANNER_INSTRUCTION = (
+    "Plan the complete set of tool calls needed to answer the doctor's query "
+    "and issue them all now, in this single step. You will not get another "
+    "chance to call tools. If the query needs no tools (a greeting, or "
+    "nothing about drugs), answer it directly instead."
+)
+
+
 # =============================================================================
 # Medical Representative Agent
 # =============================================================================
@@ -103,11 +136,168 @@ class MedicalRepAgent:
     - Calls vector database tools
     - Applies input/output guardrails
     - Logs audit trail
+    - Memoizes tool results per session and compacts them before they
+      enter the message list
     """
 
-    def __init__(self):
+    def __init__(self, planner: Optional[str] = None):
+        """
+        Args:
+            planner: None runs the iterative tool-calling loop. "rule" plans all
+                tools up front from the drug name index (falling back to "llm"
+                when no drug is recognised); "llm" plans them in a single call.
+                Planner modes run the tools in parallel and then make exactly
+                one generation call.
+        """
+        if planner not in PLANNER_MODES:
+            raise ValueError(f"Unknown planner mode: {planner}")
+
         self.model = OPENAI_MODEL
         self.max_tool_iterations = 5
+        self.planner = planner
+        self.tool_memo = ToolResultMemo()
+        # Memoized results came from the old data after a knowledge-base reload
+        register_cache("tool_memo", self.tool_memo.clear)
+
+    def _complete(self, stage: str, **kwargs):
+        """Chat completion call recorded under stage (latency, tokens, errors)."""
+        with metrics.timer(stage):
+            response = client.chat.completions.create(model=self.model, **kwargs)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.record_tokens(stage, self.model, usage.prompt_tokens, usage.completion_tokens)
+        return response
+
+    def _run_tool(self, memo: ToolResultMemo, session_id: str, tool_name: str, tool_args: Dict) -> Any:
+        """
+        Executes a tool, reusing the session's earlier result for the same
+        (tool_name, canonical args) when available.
+        """
+        key = canonical_key(tool_name, tool_args)
+
+        cached = memo.get(session_id, key)
+        if cached is not None:
+            return cached
+
+        with metrics.timer(f"tool_{tool_name}"):
+            result = execute_tool(tool_name, tool_args)
+        memo.put(session_id, key, result)
+        return result
+
+    def _execute_calls(
+        self,
+        calls: List[Tuple[str, str, Dict]],
+        memo: ToolResultMemo,
+        memo_session: str,
+        compactor: ToolOutputCompactor,
+        messages: List[Dict],
+        tool_calls_log: List[Dict],
+        tool_outputs: List[Any],
+    ):
+        """
+        Runs (call_id, tool_name, tool_args) calls in parallel and appends
+        their compacted results to messages in call order.
+        """
+        with ThreadPoolExecutor(max_workers=max(len(calls), 1)) as pool:
+            results = list(pool.map(
+                lambda call: self._run_tool(memo, memo_session, call[1], call[2]),
+                calls
+            ))
+
+        for (call_id, tool_name, tool_args), tool_result in zip(calls, results):
+            tool_calls_log.append({
+                "tool_name": tool_name,
+                "tool_args": tool_args
+            })
+            tool_outputs.append(tool_result)
+
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call_id,
+                "content": json.dumps(compactor.compact(tool_result))
+            })
+
+    def _plan_and_execute(
+        self,
+        message: str,
+        messages: List[Dict],
+        memo: ToolResultMemo,
+        memo_session: str,
+        compactor: ToolOutputCompactor,
+        tool_calls_log: List[Dict],
+        tool_outputs: List[Any],
+    ) -> str:
+        """
+        Plan-then-execute: build the full tool plan (rule-based or one LLM
+        call), run every tool in parallel, then make one generation call.
+        A query the planner answers without tools gets that answer directly.
+        """
+        calls = []
+
+        if self.planner == "rule":
+            calls = [
+                (f"plan_{i}", step["tool_name"], step["tool_args"])
+                for i, step in enumerate(plan_tool_calls(message))
+            ]
+
+        if not calls:
+            response = self._complete(
+                "agent_plan",
+                messages=messages + [{"role": "system", "content": PLANNER_INSTRUCTION}],
+                tools=TOOLS_OPENAI,
+                tool_choice="auto",
+                parallel_tool_calls=True
+            )
+            planned = response.choices[0].message
+            calls = [
+                (tool_call.id, tool_call.function.name, json.loads(tool_call.function.arguments))
+                for tool_call in planned.tool_calls or []
+            ]
+            if not calls:
+                # No tools needed: no assistant/tool messages (an empty tool_calls list is rejected)
+                if planned.content:
+                    return planned.content
+                return self._complete("agent_generation", messages=messages).choices[0].message.content
+
+        messages.append({
+            "role": "assistant",
+            "tool_calls": [
+                {
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": tool_name, "arguments": json.dumps(tool_args)}
+                }
+                for call_id, tool_name, tool_args in calls
+            ]
+        })
+        self._execute_calls(calls, memo, memo_session, compactor, messages, tool_calls_log, tool_outputs)
+
+        response = self._complete(
+            "agent_generation",
+            messages=messages,
+            tools=TOOLS_OPENAI,
+            tool_choice="none"
+        )
+        return response.choices[0].message.content
+
+    def _finalize(self, message: str, draft_answer: str, tool_calls_log: List[Dict], tool_outputs: List[Any], started: float) -> str:
+        """
+        Applies output guardrails to the draft answer and writes the audit entry.
+        """
+        output_check = guardrails.validate_output(message, draft_answer, tool_outputs)
+
+        if output_check["status"] != "allowed":
+            final_answer = output_check["message"]
+        else:
+            final_answer = output_check["safe_response"]
+
+        # Audit
+        elapsed = time.perf_counter() - started
+        metrics.observe_stage("agent_turn", elapsed)
+        guardrails.audit(message, tool_calls_log, final_answer, latency_ms=elapsed * 1000)
+
+        return final_answer
 
     def _build_messages(self, history: List[Dict], current_message: str) -> List[Dict]:
         """
@@ -132,18 +322,22 @@ class MedicalRepAgent:
 
         return messages
 
-    def process_message(self, message: str, history: List[Dict]) -> str:
+    def process_message(self, message: str, history: List[Dict], session_id: Optional[str] = None) -> str:
         """
         Main entrypoint: processes user message with history.
 
         Args:
             message: current user query
             history: list of dicts [{"role": "user", "content": ...}, {"role":"assistant", ...}]
+            session_id: conversation id; tool results are memoized per session.
+                Without it, results are only reused within this turn.
 
         Returns:
             agent response text
         """
 
+        started = time.perf_counter()
+
         # ---------------------------
         # Input Guardrails
         # ---------------------------
@@ -157,6 +351,17 @@ class MedicalRepAgent:
         tool_calls_log = []
         tool_outputs = []
 
+        # Without a session id, results are only reused within this turn
+        memo = self.tool_memo if session_id else ToolResultMemo(max_sessions=1)
+        memo_session = session_id or "turn"
+        compactor = ToolOutputCompactor()
+
+        if self.planner:
+            draft_answer = self._plan_and_execute(
+                message, messages, memo, memo_session, compactor, tool_calls_log, tool_outputs
+            )
+            return self._finalize(message, draft_answer, tool_calls_log, tool_outputs, started)
+
         # ---------------------------
         # Tool Calling Loop
         # ---------------------------
@@ -165,8 +370,8 @@ class MedicalRepAgent:
         while iteration < self.max_tool_iterations:
             iteration += 1
 
-            response = client.chat.completions.create(
-                model=self.model,
+            response = self._complete(
+                "agent_loop_llm",
                 messages=messages,
                 tools=TOOLS_OPENAI,
                 tool_choice="auto"
@@ -176,20 +381,7 @@ class MedicalRepAgent:
 
             # If no tools called, final answer is generated
             if not assistant_msg.tool_calls:
-                draft_answer = assistant_msg.content
-
-                # Output guardrails
-                output_check = guardrails.validate_output(message, draft_answer, tool_outputs)
-
-                if output_check["status"] != "allowed":
-                    final_answer = output_check["message"]
-                else:
-                    final_answer = output_check["safe_response"]
-
-                # Audit
-                guardrails.audit(message, tool_calls_log, final_answer)
-
-                return final_answer
+                return self._finalize(message, assistant_msg.content, tool_calls_log, tool_outputs, started)
 
             # Add assistant tool-call message to history
             messages.append({
@@ -198,23 +390,11 @@ class MedicalRepAgent:
             })
 
             # Execute each tool
-            for tool_call in assistant_msg.tool_calls:
-                tool_name = tool_call.function.name
-                tool_args = json.loads(tool_call.function.arguments)
-
-                tool_calls_log.append({
-                    "tool_name": tool_name,
-                    "tool_args": tool_args
-                })
-
-                tool_result = execute_tool(tool_name, tool_args)
-                tool_outputs.append(tool_result)
-
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps(tool_result)
-                })
+            calls = [
+                (tool_call.id, tool_call.function.name, json.loads(tool_call.function.arguments))
+                for tool_call in assistant_msg.tool_calls
+            ]
+            self._execute_calls(calls, memo, memo_session, compactor, messages, tool_calls_log, tool_outputs)
 
         # If loop ends without final answer
         return (
@@ -239,8 +419,8 @@ class MedicalRepAgent:
 # Synchronous Wrapper (like your InsuranceAgent)
 # =============================================================================
 
-def process_message_sync(agent: MedicalRepAgent, message: str, history: List[Dict]) -> str:
-    return agent.process_message(message, history)
+def process_message_sync(agent: MedicalRepAgent, message: str, history: List[Dict], session_id: Optional[str] = None) -> str:
+    return agent.process_message(message, history, session_id=session_id)
 
 
 # =============================================================================
@@ -252,10 +432,14 @@ if __name__ == "__main__":
     print("Testing Medical Representative Agent (OpenAI + Chroma + Guardrails)")
     print("=" * 60)
 
-    agent = MedicalRepAgent()
+    agent = MedicalRepAgent(planner=AGENT_PLANNER)
     print(agent.get_welcome_message())
 
+    # Same reload paths as the server: KB_WATCH_INTERVAL_S, or typing "reload"
+    start_watcher()
+
     history = []
+    session_id = "cli_session"
 
     while True:
         msg = input("\nDoctor Query > ")
@@ -264,7 +448,11 @@ if __name__ == "__main__":
             print("\nExiting agent...")
             break
 
-        response = process_message_sync(agent, msg, history)
+        if msg.lower() == "reload":
+            print("Reloading knowledge base..." if reload_all(force=True) else "A reload is already running.")
+            continue
+
+        response = process_message_sync(agent, msg, history, session_id=session_id)
 
         print("\nAGENT RESPONSE:\n")
         print(response)
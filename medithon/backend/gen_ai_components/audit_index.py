@@ -0,0 +1,332 @@
+"""
+Indexed analytics over the audit log.
+
+ingest() reads audit_log.jsonl from the last ingested byte offset and
+appends compact rows to a SQLite index (timestamp, query hash, tool calls,
+drugs mentioned, response length, latency). Aggregates are answered from
+the index, never by re-parsing the raw log. Log rotation by the audit
+writer is detected and the rotated segment is finished before the new file
+is read.
+
+Run from backend/:
+    python -m gen_ai_components.audit_index ingest
+    python -m gen_ai_components.audit_index top queries -n 20
+    python -m gen_ai_components.audit_index top tools
+    python -m gen_ai_components.audit_index top drugs
+    python -m gen_ai_components.audit_index buckets --bucket hour
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from gen_ai_components.drug_index import get_drug_index
+except ImportError:
+    from drug_index import get_drug_index
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "audit_log.jsonl")
+AUDIT_INDEX_PATH = os.getenv("AUDIT_INDEX_PATH", "audit_index.sqlite3")
+
+BUCKET_FORMATS = {
+    "minute": "%Y-%m-%dT%H:%M",
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queries (
+        query_hash TEXT PRIMARY KEY,
+        query TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TEXT NOT NULL,
+        query_hash TEXT NOT NULL,
+        response_len INTEGER NOT NULL,
+        latency_ms REAL,
+        tool_count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tool_calls (
+        entry_id INTEGER NOT NULL,
+        tool_name TEXT NOT NULL,
+        tool_args TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS drug_mentions (
+        entry_id INTEGER NOT NULL,
+        drug_id TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        logfile TEXT PRIMARY KEY,
+        inode INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        head_hash TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_ts ON entries(ts);
+    CREATE INDEX IF NOT EXISTS idx_entries_query ON entries(query_hash);
+    CREATE INDEX IF NOT EXISTS idx_tool_calls_name ON tool_calls(tool_name);
+    CREATE INDEX IF NOT EXISTS idx_drug_mentions_drug ON drug_mentions(drug_id);
+"""
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()[:16]
+
+
+def _head_hash(first_line: bytes) -> str:
+    return hashlib.sha1(first_line).hexdigest()
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class AuditIndex:
+
+    def __init__(self, path: str = AUDIT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    # -------------------------------------------------------------------------
+    # Ingest
+    # -------------------------------------------------------------------------
+
+    def ingest(self, logfile: str = AUDIT_LOG_PATH) -> int:
+        """Indexes entries appended since the last call. Returns the count."""
+        # Rows and the offset they advance to commit together: a crash in
+        # between would otherwise re-ingest the rows on the next call
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self._ingest(logfile)
+
+    def _ingest(self, logfile: str) -> int:
+        key = os.path.abspath(logfile)
+        state = self.conn.execute(
+            "SELECT inode, offset, head_hash FROM ingest_state WHERE logfile = ?", (key,)
+        ).fetchone()
+
+        if not os.path.exists(logfile):
+            return 0
+
+        inode = os.stat(logfile).st_ino
+        with open(logfile, "rb") as f:
+            first_line = f.readline()
+        if not first_line.endswith(b"\n"):
+            # Empty, or its first entry is still being written: there is no head
+            # to recognize the file by later, so wait (rotated segments included)
+            return 0
+        head = _head_hash(first_line)
+
+        count = 0
+        offset = 0
+        if state and state[0] == inode and state[2] == head and state[1] <= os.path.getsize(logfile):
+            offset = state[1]
+        else:
+            # First ingest, or rotated since the last one: finish the segment
+            # we were reading, then every newer segment, oldest first
+            segments = self._segments(logfile)
+            newer = segments
+            if state:
+                _, old_offset, old_head = state
+                for i, segment in enumerate(segments):
+                    with _open_segment(segment) as f:
+                        if _head_hash(f.readline()) == old_head:
+                            count += self._ingest_stream(f, old_offset)[0]
+                            newer = segments[:i]
+                            break
+            for segment in reversed(newer):
+                with _open_segment(segment) as f:
+                    count += self._ingest_stream(f, 0)[0]
+
+        with open(logfile, "rb") as f:
+            added, offset = self._ingest_stream(f, offset)
+            count += added
+
+        self.conn.execute(
+            "INSERT INTO ingest_state(logfile, inode, offset, head_hash) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(logfile) DO UPDATE SET inode = excluded.inode, offset = excluded.offset, "
+            "head_hash = excluded.head_hash",
+            (key, inode, offset, head)
+        )
+        return count
+
+    @staticmethod
+    def _segments(logfile: str) -> List[str]:
+        """Rotated segments of logfile, newest (.1) first."""
+        directory = os.path.dirname(os.path.abspath(logfile))
+        prefix = os.path.basename(logfile) + "."
+        indexed = []
+        for name in os.listdir(directory):
+            number = name[len(prefix):].split(".")[0]
+            if name.startswith(prefix) and number.isdigit():
+                indexed.append((int(number), os.path.join(directory, name)))
+        return [path for _, path in sorted(indexed)]
+
+    def _ingest_stream(self, f, offset: int) -> Tuple[int, int]:
+        """Indexes complete lines from offset on. Returns (entries, new offset)."""
+        f.seek(offset)
+        drug_index = get_drug_index()
+        count = 0
+
+        for line in f:
+            # A partial last line is still being written; pick it up next time
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._insert(entry, drug_index)
+            count += 1
+        return count, offset
+
+    def _insert(self, entry: Dict, drug_index):
+        query = entry.get("query", "")
+        qhash = query_hash(query)
+        tool_calls = entry.get("tool_calls") or []
+
+        self.conn.execute(
+            "INSERT OR IGNORE INTO queries(query_hash, query) VALUES (?, ?)", (qhash, query.strip())
+        )
+        entry_id = self.conn.execute(
+            "INSERT INTO entries(ts, query_hash, response_len, latency_ms, tool_count) VALUES (?, ?, ?, ?, ?)",
+            (entry.get("timestamp", ""), qhash, len(entry.get("response") or ""), entry.get("latency_ms"), len(tool_calls))
+        ).lastrowid
+        self.conn.executemany(
+            "INSERT INTO tool_calls(entry_id, tool_name, tool_args) VALUES (?, ?, ?)",
+            [(entry_id, c.get("tool_name", ""), json.dumps(c.get("tool_args", {}), sort_keys=True)) for c in tool_calls]
+        )
+        self.conn.executemany(
+            "INSERT INTO drug_mentions(entry_id, drug_id) VALUES (?, ?)",
+            [(entry_id, drug_id) for drug_id in drug_index.find(query)]
+        )
+
+    # -------------------------------------------------------------------------
+    # Aggregates
+    # -------------------------------------------------------------------------
+
+    def _since_clause(self, since: Optional[str], column: str = "e.ts") -> Tuple[str, tuple]:
+        return (f" WHERE {column} >= ?", (since,)) if since else ("", ())
+
+    def top_queries(self, n: int = 10, since: Optional[str] = None) -> List[Dict]:
+        where, params = self._since_clause(since)
+        rows = self.conn.execute(
+            "SELECT q.query, COUNT(*) AS hits, AVG(e.latency_ms) FROM entries e "
+            f"JOIN queries q ON q.query_hash = e.query_hash{where} "
+            "GROUP BY e.query_hash ORDER BY hits DESC, q.query LIMIT ?", params + (n,)
+        ).fetchall()
+        return [{"query": q, "count": c, "avg_latency_ms": _round(lat)} for q, c, lat in rows]
+
+    def top_tools(self, n: int = 10, since: Optional[str] = None, with_args: bool = False) -> List[Dict]:
+        where, params = self._since_clause(since)
+        columns = "t.tool_name, t.tool_args" if with_args else "t.tool_name"
+        rows = self.conn.execute(
+            f"SELECT {columns}, COUNT(*) AS calls FROM tool_calls t "
+            f"JOIN entries e ON e.id = t.entry_id{where} "
+            f"GROUP BY {columns} ORDER BY calls DESC LIMIT ?", params + (n,)
+        ).fetchall()
+        if with_args:
+            return [{"tool_name": name, "tool_args": json.loads(args), "count": c} for name, args, c in rows]
+        return [{"tool_name": name, "count": c} for name, c in rows]
+
+    def top_drugs(self, n: int = 10, since: Optional[str] = None) -> List[Dict]:
+        where, params = self._since_clause(since)
+        rows = self.conn.execute(
+            "SELECT d.drug_id, COUNT(*) AS mentions FROM drug_mentions d "
+            f"JOIN entries e ON e.id = d.entry_id{where} "
+            "GROUP BY d.drug_id ORDER BY mentions DESC LIMIT ?", params + (n,)
+        ).fetchall()
+        return [{"drug_id": d, "count": c} for d, c in rows]
+
+    def time_buckets(self, bucket: str = "hour", since: Optional[str] = None) -> List[Dict]:
+        """Entries, distinct queries, tool calls and latency per time bucket."""
+        fmt = BUCKET_FORMATS[bucket]
+        where, params = self._since_clause(since)
+        rows = self.conn.execute(
+            f"SELECT strftime('{fmt}', e.ts) AS b, COUNT(*), COUNT(DISTINCT e.query_hash), "
+            f"SUM(e.tool_count), AVG(e.latency_ms), MAX(e.latency_ms), AVG(e.response_len) "
+            f"FROM entries e{where} GROUP BY b ORDER BY b", params
+        ).fetchall()
+        return [
+            {
+                "bucket": b, "entries": n, "distinct_queries": distinct, "tool_calls": tools,
+                "avg_latency_ms": _round(avg_lat), "max_latency_ms": _round(max_lat),
+                "avg_response_chars": _round(avg_len),
+            }
+            for b, n, distinct, tools, avg_lat, max_lat, avg_len in rows
+        ]
+
+    def repeat_rate(self) -> float:
+        """Share of entries whose query was already seen (upper bound for a response cache)."""
+        total, distinct = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT query_hash) FROM entries").fetchone()
+        return round(1 - distinct / total, 4) if total else 0.0
+
+
+def _open_segment(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=AUDIT_INDEX_PATH, help="SQLite index path")
+    parser.add_argument("--log", default=AUDIT_LOG_PATH, help="audit log to ingest")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("ingest", help="index entries appended since the last ingest")
+
+    top = sub.add_parser("top", help="top-N aggregates")
+    top.add_argument("what", choices=["queries", "tools", "tool-args", "drugs"])
+    top.add_argument("-n", type=int, default=10)
+    top.add_argument("--since", help="ISO timestamp lower bound")
+
+    buckets = sub.add_parser("buckets", help="time-bucketed aggregates")
+    buckets.add_argument("--bucket", choices=list(BUCKET_FORMATS), default="hour")
+    buckets.add_argument("--since", help="ISO timestamp lower bound")
+
+    args = parser.parse_args()
+    index = AuditIndex(args.db)
+
+    if args.command == "ingest":
+        start = datetime.now()
+        added = index.ingest(args.log)
+        print(f"✅ Indexed {added} new entries in {(datetime.now() - start).total_seconds():.2f}s "
+              f"(repeat rate {index.repeat_rate():.1%})")
+    elif args.command == "top":
+        if args.what == "queries":
+            rows = index.top_queries(args.n, args.since)
+        elif args.what == "drugs":
+            rows = index.top_drugs(args.n, args.since)
+        else:
+            rows = index.top_tools(args.n, args.since, with_args=args.what == "tool-args")
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    elif args.command == "buckets":
+        for row in index.time_buckets(args.bucket, args.since):
+            print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    from gen_ai_components.metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_MAX_BYTES = int(os.getenv("AUDIT_MAX_BYTES", str(50 * 2**20)))
+AUDIT_BACKUP_COUNT = int(os.getenv("AUDIT_BACKUP_COUNT", "5"))
+AUDIT_COMPRESS = os.getenv("AUDIT_COMPRESS", "1") == "1"
+
+# "never": leave it to the OS; "batch": fsync after every flushed batch;
+# "rotate": fsync only when a segment is closed
+AUDIT_FSYNC = os.getenv("AUDIT_FSYNC", "rotate")
+FSYNC_POLICIES = ("never", "batch", "rotate")
+
+_STOP = object()
+
+
+# =============================================================================
+# AUDIT LOGGER
+# =============================================================================
+
+class AuditLogger:
+    """
+    Append-only JSONL audit log written by a background thread.
+
+    log() only enqueues, so request threads never touch the disk. The writer
+    flushes in batches (every batch_size entries or flush_interval seconds),
+    rotates the file once it exceeds max_bytes (keeping backup_count
+    segments, gzipped if compress), and fsyncs according to the fsync policy.
+    When the queue is full, entries are dropped and counted rather than
+    blocking the request.
+    """
+
+    def __init__(
+        self,
+        logfile: str = "audit_log.jsonl",
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        max_bytes: int = AUDIT_MAX_BYTES,
+        backup_count: int = AUDIT_BACKUP_COUNT,
+        compress: bool = AUDIT_COMPRESS,
+        fsync: str = AUDIT_FSYNC,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}. Use one of {FSYNC_POLICIES}")
+
+        self.logfile = logfile
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.fsync = fsync
+
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._size = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------------------------------------------------------------------------
+    # Request side
+    # -------------------------------------------------------------------------
+
+    def log(self, query: str, tool_calls: List[Dict[str, Any]], response: str, latency_ms: Optional[float] = None):
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "query": query,
+            "tool_calls": tool_calls,
+            "response": response
+        }
+        if latency_ms is not None:
+            entry["latency_ms"] = round(latency_ms, 1)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("audit_log_dropped_total")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything queued so far is on disk (or timeout)."""
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self._thread.is_alive():
+            self._queue.put(_STOP, timeout=timeout)
+            self._thread.join(timeout)
+
+    # -------------------------------------------------------------------------
+    # Writer thread
+    # -------------------------------------------------------------------------
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size and time.monotonic() < deadline:
+                    continue
+
+            # Batch full, interval elapsed, flush request or shutdown
+            if batch:
+                self._write(batch)
+                batch = []
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                self._close_file()
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            data = "".join(json.dumps(entry) + "\n" for entry in batch).encode("utf-8")
+            # Open first so a log left by an earlier run counts towards max_bytes
+            f = self._open()
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+                f = self._open()
+
+            f.write(data)
+            f.flush()
+            if self.fsync == "batch":
+                os.fsync(f.fileno())
+
+            self._size += len(data)
+            self.written += len(batch)
+        except Exception as e:
+            # Never let a disk problem kill the writer; the batch is lost
+            self.write_errors += 1
+            metrics.inc("audit_log_write_errors_total")
+            print(f"Audit log write failed: {e}")
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.logfile, "ab")
+            self._size = os.path.getsize(self.logfile)
+        return self._file
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.flush()
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def segment_path(self, index: int) -> str:
+        path = f"{self.logfile}.{index}"
+        return path + ".gz" if self.compress else path
+
+    def _rotate(self):
+        """audit_log.jsonl -> .1(.gz) -> .2(.gz) ...; the oldest segment is deleted."""
+        self._close_file()
+
+        for index in range(self.backup_count, 0, -1):
+            for suffix in ("", ".gz"):
+                src = f"{self.logfile}.{index}{suffix}"
+                if not os.path.exists(src):
+                    continue
+                if index == self.backup_count:
+                    os.remove(src)
+                else:
+                    os.replace(src, f"{self.logfile}.{index + 1}{suffix}")
+
+        if self.backup_count == 0:
+            os.remove(self.logfile)
+        elif self.compress:
+            with open(self.logfile, "rb") as src, gzip.open(self.segment_path(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.logfile)
+        else:
+            os.replace(self.logfile, self.segment_path(1))
+
+        self._size = 0
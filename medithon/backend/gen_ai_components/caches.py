@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+try:
+    from gen_ai_components.metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Entries and time-to-live per cache (0 entries or 0 seconds = disabled)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "3600"))
+
+
+# =============================================================================
+# DATA VERSION
+# =============================================================================
+
+_lock = threading.Lock()
+_version: Optional[str] = None
+_caches: Dict[str, List[Callable[[], None]]] = {}
+
+
+def data_version() -> Optional[str]:
+    """Knowledge-base generation the caches are currently filled from (None before the first load)."""
+    return _version
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+def register_cache(name: str, clear: Callable[[], None]):
+    """
+    Registers a cache whose entries were computed from knowledge-base data
+    (retrieved chunks, tool results, answers). `clear` drops every entry and
+    is called whenever a new generation is swapped in.
+    """
+    with _lock:
+        _caches.setdefault(name, []).append(clear)
+
+
+def registered_caches() -> List[str]:
+    with _lock:
+        return sorted(_caches)
+
+
+def invalidate(version: str):
+    """Marks `version` as current and clears every registered cache."""
+    global _version
+    with _lock:
+        previous, _version = _version, version
+        caches = [(name, clear) for name, clears in _caches.items() for clear in clears]
+    if previous is None or previous == version:
+        return
+    for name, clear in caches:
+        try:
+            clear()
+            metrics.inc("cache_invalidations_total", cache=name)
+        except Exception as e:
+            print(f"⚠️ Could not clear cache {name}: {e}")
+
+
+# =============================================================================
+# TTL CACHE
+# =============================================================================
+
+class TTLCache:
+    """
+    Thread-safe LRU with a time-to-live, counted under cache_requests_total.
+    Caches of data-derived values register themselves, so a knowledge-base
+    swap empties them.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_s: float = CACHE_TTL_S, data_dependent: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if data_dependent:
+            register_cache(name, self.clear)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_s > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.inc("cache_requests_total", cache=self.name, result="miss" if entry is None else "hit")
+        return None if entry is None else entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
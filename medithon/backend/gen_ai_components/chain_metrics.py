@@ -0,0 +1,99 @@
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from gen_ai_components.metrics import Metrics, metrics
+
+
+class StageMetricsCallback(BaseCallbackHandler):
+    """
+    Records latency, errors and token usage for named LCEL stages.
+
+    Stages are runnables given a run_name via .with_config(run_name=...);
+    only names listed in `stages` are timed, so the many anonymous lambdas
+    and prompts in a chain cost one dict insert and pop each. Token usage
+    of every LLM call is attributed to its closest enclosing stage.
+    """
+
+    def __init__(self, stages: Iterable[str], registry: Metrics = metrics):
+        self.stages = frozenset(stages)
+        self.registry = registry
+        # run_id -> (stage name or None, parent_run_id, start time)
+        self._runs: Dict[UUID, Tuple[Optional[str], Optional[UUID], float]] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: Optional[str]):
+        stage = name if name in self.stages else None
+        self._runs[run_id] = (stage, parent_run_id, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        run = self._runs.pop(run_id, None)
+        if run is None or run[0] is None:
+            return
+        stage, _, start = run
+        self.registry.observe_stage(stage, time.perf_counter() - start)
+        if error is not None:
+            self.registry.inc("stage_errors_total", stage=stage, error=type(error).__name__)
+
+    def _enclosing_stage(self, run_id: Optional[UUID]) -> str:
+        while run_id is not None:
+            run = self._runs.get(run_id)
+            if run is None:
+                break
+            if run[0] is not None:
+                return run[0]
+            run_id = run[1]
+        return "unknown"
+
+    # Chains (every runnable in a sequence reports as a chain run)
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id, error)
+
+    # Retrievers
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id, error)
+
+    # LLM calls: tokens go to the enclosing stage
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_end(self, response: LLMResult, *, run_id, parent_run_id=None, **kwargs: Any):
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+        if prompt_tokens is None:
+            # Providers without llm_output report usage on the message instead
+            generations = response.generations[0] if response.generations else []
+            message = getattr(generations[0], "message", None) if generations else None
+            usage_metadata = getattr(message, "usage_metadata", None) or {}
+            prompt_tokens, completion_tokens = usage_metadata.get("input_tokens"), usage_metadata.get("output_tokens")
+
+        if prompt_tokens is not None:
+            self.registry.record_tokens(
+                self._enclosing_stage(parent_run_id),
+                llm_output.get("model_name", "unknown"),
+                prompt_tokens,
+                completion_tokens or 0,
+            )
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id, error)
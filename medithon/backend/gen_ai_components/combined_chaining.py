@@ -1,13 +1,22 @@
 import os
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_chroma import Chroma
+from typing import Any, Dict, List
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.runnables import RunnablePassthrough, RunnableParallel, RunnableLambda
 from langchain_core.chat_history import BaseChatMessageHistory
 from gen_ai_components.refined_query import refined_query_prompt
 from gen_ai_components.structured_output import MedicalResponse
-from gen_ai_components.prompts import prompt, promt_user
+from gen_ai_components.prompts import prompt, promt_user, history_summary_prompt
+from gen_ai_components.session_store import build_session_store, session_lock
+from gen_ai_components.history_manager import HistoryManager
+from gen_ai_components.guardrails import InputGuardrails
+from gen_ai_components.drug_index import filtered_search, filtered_search_batch
+from gen_ai_components.kb import get_knowledge_base
+from gen_ai_components.metrics import metrics
+from gen_ai_components.chain_metrics import StageMetricsCallback
+from gen_ai_components.slow_requests import note, note_chunks
+from gen_ai_components.tool_memo import estimate_tokens
+from gen_ai_components.providers import CachedEmbeddings, get_chat_model, get_embeddings, vector_dir
+from gen_ai_components.caches import RETRIEVAL_CACHE_SIZE, TTLCache
 
 from dotenv import load_dotenv
 
@@ -17,13 +26,12 @@ load_dotenv()
 # MEMORY SETUP
 # =============================================================================
 
-store = {}
+# Bounded LRU/TTL store in memory, or SQLite shared by all workers (SESSION_STORE)
+store = build_session_store()
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """Returns the chat history for a given session ID."""
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 def format_chat_history(history):
     """Formats chat history list into a string for the refinement prompt."""
@@ -35,33 +43,77 @@ def format_chat_history(history):
 # =============================================================================
 
 # Initialize Embedding Model (Must match what you used to create the vector stores)
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+# Query embeddings are cached: the 4 retrievers embed the same refined query
+embedding_model = CachedEmbeddings(get_embeddings(model="text-embedding-3-small"))
+
+# ./Vector unless VECTOR_DIR is set
+VECTOR_ROOT = vector_dir("./Vector")
 
 print("🔄 Loading Vector Databases...")
 
+# The 4 stores and the drug index, swappable at runtime (see kb.py)
+knowledge_base = get_knowledge_base(VECTOR_ROOT, embedding_model)
+
+
+def chunk_ref(doc) -> str:
+    """Stable reference to a stored chunk: its Chroma id, else source + seq_num."""
+    return doc.id or f"{doc.metadata.get('source')}#{doc.metadata.get('seq_num')}"
+
+
+# (store, query, k, generation) -> (doc, score) pairs
+retrieval_cache = TTLCache("retrieval", RETRIEVAL_CACHE_SIZE)
+
+
+def scored_retriever(store: str, collection: str, k: int = 2):
+    """
+    Top-k retriever that notes each chunk's id and distance on the request trace.
+    Searches only chunks tagged with the drugs named in the query, if any.
+    The store is looked up per call in the request's knowledge-base generation.
+    """
+    def retrieve(query: str):
+        generation = knowledge_base.active()
+        key = (store, query, k, generation.version)
+        cached = retrieval_cache.get(key)
+        if cached is not None:
+            results = cached
+        else:
+            # Drug names in the (refined) query narrow each search to that drug's chunks
+            results, mode = filtered_search(generation.store(store), query, k, generation.drug_index.find(query))
+            metrics.inc("retrieval_filter_total", collection=collection, mode=mode)
+            retrieval_cache.put(key, results)
+        note_chunks(collection, [{"id": chunk_ref(doc), "score": round(score, 4)} for doc, score in results])
+        return [doc for doc, _ in results]
+
+    return RunnableLambda(retrieve).with_config(run_name=f"retriever_{collection}")
+
+
 # =============================================================================
 # 2. LOAD YOUR 4 SPECIFIC VECTOR STORES
 # =============================================================================
 
 # DB 1: Drugs Master (General Info)
 # Path: ./Vector/Vector_drugs_master
-db_drugs = Chroma(persist_directory="./Vector/Vector_drugs_master", embedding_function=embedding_model)
-retriever_drugs = db_drugs.as_retriever(search_kwargs={"k": 2})
+retriever_drugs = scored_retriever("Vector_drugs_master", "drugs")
 
 # DB 2: Interactions (The specific interaction matrix)
 # Path: ./Vector/Vector_interactions
-db_interactions = Chroma(persist_directory="./Vector/Vector_interactions", embedding_function=embedding_model)
-retriever_interactions = db_interactions.as_retriever(search_kwargs={"k": 2})
+retriever_interactions = scored_retriever("Vector_interactions", "interactions")
 
 # DB 3: Reimbursement (CGHS/Pricing)
 # Path: ./Vector/Vector_reimbursement
-db_reimbursement = Chroma(persist_directory="./Vector/Vector_reimbursement", embedding_function=embedding_model)
-retriever_reimbursement = db_reimbursement.as_retriever(search_kwargs={"k": 2})
+retriever_reimbursement = scored_retriever("Vector_reimbursement", "reimbursement")
 
 # DB 4: Comparisons (Safety & Alternatives)
 # Path: ./Vector/Vector_comparisons
-db_comparisons = Chroma(persist_directory="./Vector/Vector_comparisons", embedding_function=embedding_model)
-retriever_comparisons = db_comparisons.as_retriever(search_kwargs={"k": 2})
+retriever_comparisons = scored_retriever("Vector_comparisons", "comparisons")
+
+# Collection label -> store, for the batch path's per-collection searches
+COLLECTION_STORES = {
+    "drugs": "Vector_drugs_master",
+    "interactions": "Vector_interactions",
+    "reimbursement": "Vector_reimbursement",
+    "comparisons": "Vector_comparisons",
+}
 
 print("✅ All 4 Databases Loaded.")
 
@@ -88,11 +140,75 @@ def combine_retrieved_docs(docs_map):
     # 4. Comparison/Safety Data
     combined_text += "\n--- COMPARISONS & SAFETY ---\n"
     combined_text += "\n".join([doc.page_content for doc in docs_map["comparisons"]])
-    
+
+    note("context_tokens", estimate_tokens(combined_text))
     return combined_text
 
 # =============================================================================
-# 4. BUILD THE CHAIN WITH STRUCTURED OUTPUT
+# 4. GUARDRAILS STAGE
+# =============================================================================
+
+input_guardrails = InputGuardrails()
+
+# Named stages timed by the metrics callback (see .with_config(run_name=...))
+STAGES = (
+    "rag_chain", "chain_user", "refinement", "retrieval",
+    "retriever_drugs", "retriever_interactions", "retriever_reimbursement", "retriever_comparisons",
+    "generation", "patient_generation", "history_summary",
+)
+stage_metrics = StageMetricsCallback(STAGES)
+
+# Estimated spend a short-circuited request avoids (USD), from typical token
+# counts at gpt-4o ($2.50/M in, $10/M out) and text-embedding-3-small prices:
+#   rag_chain:  refinement (~400 in / 50 out) + 4 embeddings
+#               + generation (~3000 in / 600 out)
+#   chain_user: generation (~600 in / 600 out)
+AVOIDED_COST_USD = {
+    "rag_chain": 0.0150,
+    "chain_user": 0.0075,
+}
+
+
+def guardrail_response(verdict) -> MedicalResponse:
+    """Turns a blocked / clarify guardrail verdict into a MedicalResponse."""
+    if verdict["status"] == "blocked":
+        return MedicalResponse(
+            summary=verdict["message"],
+            data_limitations=f"Request not processed: blocked by input guardrails ({verdict['category']}).",
+        )
+    return MedicalResponse(summary=verdict["message"])
+
+
+def short_circuit(verdict, chain_name: str) -> MedicalResponse:
+    """Counts a blocked / clarify verdict and returns its response."""
+    metrics.inc(
+        "guardrail_short_circuits_total",
+        chain=chain_name, status=verdict["status"], category=verdict.get("category", "clarify"),
+    )
+    metrics.inc("guardrail_avoided_cost_usd_total", AVOIDED_COST_USD[chain_name], chain=chain_name)
+    return guardrail_response(verdict)
+
+
+def with_guardrails(runnable, query_key: str, chain_name: str):
+    """
+    Prepends the input guardrails to a chain. Allowed queries continue into
+    the chain; blocked or clarify queries return a MedicalResponse at once,
+    before any embedding or LLM call.
+    """
+    def route(inputs):
+        with metrics.timer("guardrails"):
+            verdict = input_guardrails.run(inputs[query_key])
+        if verdict["status"] == "allowed":
+            return runnable
+        return short_circuit(verdict, chain_name)
+
+    return RunnableLambda(route, name=f"{chain_name}_guardrails").with_config(
+        run_name=chain_name, callbacks=[stage_metrics]
+    )
+
+
+# =============================================================================
+# 5. BUILD THE CHAIN WITH STRUCTURED OUTPUT
 # =============================================================================
 
 # LCEL Parallel Execution (Keys must match the function above)
@@ -101,9 +217,9 @@ parallel_retriever = RunnableParallel({
     "interactions": retriever_interactions,
     "reimbursement": retriever_reimbursement,
     "comparisons": retriever_comparisons
-})
+}).with_config(run_name="retrieval")
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0) # GPT-4 is best for medical logic
+llm = get_chat_model(model="gpt-4o", temperature=0) # GPT-4 is best for medical logic
 
 # --- Step 1: Query Refinement Chain ---
 refinement_chain = (
@@ -114,11 +230,18 @@ refinement_chain = (
     | refined_query_prompt
     | llm
     | StrOutputParser()
-)
+).with_config(run_name="refinement")
 
 # --- Step 2: Main RAG Chain ---
 # Uses the refined query for both retrieval and final generation
 structured_llm = llm.with_structured_output(MedicalResponse)
+generation_chain = (prompt | structured_llm).with_config(run_name="generation")
+
+
+def take_refined_query(x):
+    note("refined_query", x["refined_query"])
+    return x["refined_query"]
+
 
 rag_chain = (
     # 1. Refine the query
@@ -126,21 +249,114 @@ rag_chain = (
     
     # 2. Retrieve context based on REFINED query
     | RunnableParallel({
-        "context": (lambda x: x["refined_query"]) | parallel_retriever | combine_retrieved_docs,
+        "context": RunnableLambda(take_refined_query) | parallel_retriever | combine_retrieved_docs,
         "query": lambda x: x["refined_query"], # Pass refined query to generation logic for prompt
         "history": lambda x: x["history"] # Pass history through
     })
     
     # 3. Generate Answer
-    | prompt
-    | structured_llm
+    | generation_chain
 )
 
+rag_chain = with_guardrails(rag_chain, "user_query", "rag_chain")
+
 chain = rag_chain
-chain_user = promt_user | structured_llm
+chain_user = with_guardrails(
+    (promt_user | structured_llm).with_config(run_name="patient_generation"), "query", "chain_user"
+)
+
+# --- Step 3: Rolling history summary (runs in the background) ---
+summary_llm = get_chat_model(model=os.getenv("SUMMARY_MODEL", "gpt-4o-mini"), temperature=0)
+history_manager = HistoryManager(
+    (history_summary_prompt | summary_llm | StrOutputParser()).with_config(
+        run_name="history_summary", callbacks=[stage_metrics]
+    )
+)
+
+# =============================================================================
+# 6. BATCH
+# =============================================================================
+
+# Upper bound on concurrent LLM calls within one batch (refinement and generation)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+
+def batch_retrieve(queries: List[str], k: int = 2) -> List[Dict[str, list]]:
+    """
+    parallel_retriever for many queries at once: one embeddings call for all
+    of them, then one search per collection (per distinct drug filter).
+    """
+    generation = knowledge_base.active()
+    with metrics.timer("query_embedding"):
+        vectors = embedding_model.embed_documents(queries)
+    drug_ids = [generation.drug_index.find(query) for query in queries]
+
+    docs_maps: List[Dict[str, list]] = [{} for _ in queries]
+    with metrics.timer("retrieval"):
+        for collection, store in COLLECTION_STORES.items():
+            searches = filtered_search_batch(generation.store(store), vectors, k, drug_ids)
+            for docs_map, (results, mode) in zip(docs_maps, searches):
+                metrics.inc("retrieval_filter_total", collection=collection, mode=mode)
+                docs_map[collection] = [doc for doc, _ in results]
+    return docs_maps
+
+
+def answer_batch(queries: List[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> List[Any]:
+    """
+    Doctor-mode answers to independent queries (no history), in input order.
+
+    Guardrails run per query. The allowed ones are refined in one batched
+    pass, retrieved with batch_retrieve and generated with
+    generation_chain.batch, at most max_concurrency LLM calls at a time.
+    A failed item is returned in place as its exception.
+    """
+    config = {"max_concurrency": max_concurrency, "callbacks": [stage_metrics]}
+    results: List[Any] = [None] * len(queries)
+
+    allowed = []
+    for i, query in enumerate(queries):
+        try:
+            with metrics.timer("guardrails"):
+                verdict = input_guardrails.run(query)
+        except Exception as e:
+            results[i] = e
+            continue
+        if verdict["status"] == "allowed":
+            allowed.append(i)
+        else:
+            results[i] = short_circuit(verdict, "rag_chain")
+
+    refined = refinement_chain.batch(
+        [{"user_query": queries[i], "history": []} for i in allowed], config, return_exceptions=True,
+    )
+    ready = []
+    for i, refined_query in zip(allowed, refined):
+        if isinstance(refined_query, Exception):
+            results[i] = refined_query
+        else:
+            ready.append((i, refined_query))
+    if not ready:
+        return results
+
+    try:
+        docs_maps = batch_retrieve([refined_query for _, refined_query in ready])
+    except Exception as e:
+        for i, _ in ready:
+            results[i] = e
+        return results
+
+    answers = generation_chain.batch(
+        [{"context": combine_retrieved_docs(docs_map), "query": refined_query, "history": []}
+         for (_, refined_query), docs_map in zip(ready, docs_maps)],
+        config, return_exceptions=True,
+    )
+    for (i, _), answer in zip(ready, answers):
+        results[i] = answer
+    return results
+
 
 # =============================================================================
-# 6. EXECUTION
+# 7. EXECUTION
 # =============================================================================
 
 if __name__ == '__main__':
@@ -42,6 +42,9 @@ if not OPENAI_API_KEY:
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+# Agent planner mode: unset = iterative tool loop, "rule" or "llm" = plan-then-execute
+AGENT_PLANNER = os.getenv("AGENT_PLANNER") or None
+
 
 # =============================================================================
 # CHROMA VECTOR DB PATHS
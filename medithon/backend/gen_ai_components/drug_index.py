@@ -0,0 +1,322 @@
+import csv
+import difflib
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# =============================================================================
+# PATHS
+# =============================================================================
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DRUGS_MASTER_PATH = DATA_DIR / "drugs_master.json"
+JAN_AUSHADHI_PRICES_PATH = DATA_DIR / "jan_aushadhi_prices.csv"
+
+# A name only matches as a whole word: not inside a longer word or hyphenated brand
+NAME_START = r"(?<![\w-])"
+NAME_END = r"(?![\w-])"
+
+# Closest spelling a price-list name may have to a known name to be attached to its drug
+FUZZY_CUTOFF = 0.85
+
+# Distance (Chroma's squared L2; 2 - 2*cosine for normalized embeddings) beyond
+# which a drug-filtered hit counts as weak and unfiltered hits are merged in
+FILTER_MAX_DISTANCE = float(os.getenv("FILTER_MAX_DISTANCE", "1.2"))
+
+# Shortest leading brand token ("augmentin" of "Augmentin 625 Duo") indexed on its own
+MIN_BRAND_TOKEN = 4
+
+
+def normalize_name(text: str) -> str:
+    """
+    Matching form of a name or of query text, applied to both sides:
+    "Zerodol-P" -> "zerodol p", "Amoxicillin + Clavulanate" -> "amoxicillin and clavulanate".
+    """
+    text = re.sub(r"\s*[+&]\s*", " and ", text.lower().replace("-", " "))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# =============================================================================
+# DRUG ENTITY RECOGNIZER
+# =============================================================================
+
+class DrugNameIndex:
+    """
+    Medication entity recognizer: maps every known surface form of a drug
+    (internal id, generic name, brands, OpenFDA name, Jan Aushadhi group and
+    variant names) to canonical ids in drugs_master.json.
+
+    The names are compiled into a trie-shaped regex, so one scan of the text
+    finds every mention, longest name first, whatever the number of names.
+    """
+
+    def __init__(self, drugs: List[Dict], price_rows: Iterable[Dict] = ()):
+        self.drugs = {d["id"]: d for d in drugs}
+        self.names: Dict[str, Tuple[str, ...]] = {}
+        # Price-list names attached by approximate match (name -> id), and those left out
+        self.fuzzy_matches: Dict[str, str] = {}
+        self.unresolved: List[str] = []
+
+        for drug in drugs:
+            surface_forms = [drug["id"], drug["id"].replace("_", " "), drug["generic_name"], drug.get("openfda_name", "")]
+            surface_forms += drug.get("brands", [])
+            if "+" in drug["generic_name"]:
+                # "amoxicillin_clavulanate" -> "amoxicillin and clavulanate", as combinations are written
+                surface_forms.append(drug["id"].replace("_", " and "))
+            for name in surface_forms:
+                self._add(name, (drug["id"],))
+        self._add_brand_tokens(drugs)
+
+        # Jan Aushadhi rows use their own spellings ("Amoxycillin", "Insulin")
+        # in the group column; variant names list every ingredient of a product
+        variant_ids: Dict[str, List[str]] = {}
+        for row in price_rows:
+            drug_id = self._resolve(row.get("Drug", ""))
+            if drug_id is None:
+                continue
+            self._add(row["Drug"], (drug_id,))
+            ids = variant_ids.setdefault(row.get("Variant Name", ""), [])
+            if drug_id not in ids:
+                ids.append(drug_id)
+        for variant, ids in variant_ids.items():
+            # Ingredients in the order the product name lists them
+            ids.sort(key=lambda d: _position(variant, self.generic_name(d)))
+            self._add(variant, tuple(ids))
+
+        trie: Dict = {}
+        for name in self.names:
+            node = trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node[None] = True
+        self.pattern = NAME_START + self._emit(trie)
+        self._pattern = re.compile(self.pattern)
+
+    @classmethod
+    def from_tables(cls, drugs: List[Dict], names: Dict[str, Tuple[str, ...]], pattern: str) -> "DrugNameIndex":
+        """Rebuilds an index from its name table and regex (as stored in the knowledge pack)."""
+        index = cls.__new__(cls)
+        index.drugs = {d["id"]: d for d in drugs}
+        index.names = names
+        index.pattern = pattern
+        index._pattern = re.compile(pattern)
+        index.fuzzy_matches, index.unresolved = {}, []
+        return index
+
+    def _add(self, name: str, drug_ids: Tuple[str, ...]):
+        name = normalize_name(name)
+        if name:
+            self.names.setdefault(name, drug_ids)
+
+    def _add_brand_tokens(self, drugs: List[Dict]):
+        """
+        "Augmentin" alone for "Augmentin 625 Duo": the first word of a brand,
+        when only one drug's brands start with it and it is not a word of
+        any generic name ("Human" of "Human Mixtard 30/70" stays out).
+        """
+        generic_words = set()
+        for drug in drugs:
+            for name in (drug["id"].replace("_", " "), drug["generic_name"], drug.get("openfda_name", "")):
+                generic_words.update(normalize_name(name).split())
+
+        owners: Dict[str, set] = {}
+        for drug in drugs:
+            for brand in drug.get("brands", []):
+                words = normalize_name(brand).split()
+                if len(words) > 1:
+                    owners.setdefault(words[0], set()).add(drug["id"])
+        for token, ids in owners.items():
+            if (len(ids) == 1 and len(token) >= MIN_BRAND_TOKEN and token.isalpha()
+                    and token not in generic_words and token not in self.names):
+                self.names[token] = (next(iter(ids)),)
+
+    def _resolve(self, name: str):
+        """
+        Canonical id for a name from another source: an exact name, else the
+        one drug whose generic name contains all its words ("Insulin"), else
+        a close spelling ("Amoxycillin"). Approximate matches are recorded in
+        fuzzy_matches and names with no safe match in unresolved.
+        """
+        name = normalize_name(name)
+        if name in self.names:
+            return self.names[name][0]
+
+        words = set(name.split())
+        containing = [drug_id for drug_id, drug in self.drugs.items()
+                      if words <= set(normalize_name(drug["generic_name"]).split())]
+        if len(containing) == 1:
+            drug_id = containing[0]
+        else:
+            close = difflib.get_close_matches(name, self.names, n=1, cutoff=FUZZY_CUTOFF)
+            drug_id = self.names[close[0]][0] if close else None
+
+        if drug_id is None:
+            if name not in self.unresolved:
+                self.unresolved.append(name)
+        else:
+            self.fuzzy_matches[name] = drug_id
+        return drug_id
+
+    def _emit(self, node: Dict) -> str:
+        # Longer names are tried first; the end-of-name check comes last
+        branches = [re.escape(char) + self._emit(node[char]) for char in sorted(c for c in node if c is not None)]
+        if None in node:
+            branches.append(NAME_END)
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    def find(self, text: str) -> List[str]:
+        """Returns canonical drug ids mentioned in text, in order of first mention."""
+        found = []
+        for match in self._pattern.finditer(normalize_name(text)):
+            for drug_id in self.names[match.group(0)]:
+                if drug_id not in found:
+                    found.append(drug_id)
+        return found
+
+    def mentions_drug(self, text: str) -> bool:
+        return self._pattern.search(normalize_name(text)) is not None
+
+    def generic_name(self, drug_id: str) -> str:
+        return self.drugs[drug_id]["generic_name"]
+
+
+def _position(text: str, name: str) -> int:
+    index = text.lower().find(name.lower().split()[0])
+    return index if index >= 0 else len(text)
+
+
+def load_drug_index() -> DrugNameIndex:
+    """
+    Builds a fresh index: from the knowledge pack when it is up to date
+    (see knowledge_pack.py), else from drugs_master.json and the price list.
+    """
+    try:
+        from gen_ai_components.knowledge_pack import load_current_pack
+    except ImportError:
+        from knowledge_pack import load_current_pack
+    pack = load_current_pack()
+    if pack is not None:
+        return pack.drug_index()
+
+    with open(DRUGS_MASTER_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    with open(JAN_AUSHADHI_PRICES_PATH, encoding="utf-8", newline="") as f:
+        price_rows = list(csv.DictReader(f))
+    return DrugNameIndex(data["drugs"], price_rows)
+
+
+@lru_cache(maxsize=1)
+def get_drug_index() -> DrugNameIndex:
+    """The index, built once per process (until a knowledge-base reload clears it)."""
+    return load_drug_index()
+
+
+# =============================================================================
+# METADATA FILTERS
+# =============================================================================
+
+def drug_key(drug_id: str) -> str:
+    """Boolean chunk-metadata key marking a chunk as about drug_id (Chroma cannot filter on list membership)."""
+    return f"drug_{drug_id}"
+
+
+def drug_filter(drug_ids: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Chroma `where` clause for chunks about any of drug_ids; None when there are none."""
+    clauses = [{drug_key(drug_id): True} for drug_id in dict.fromkeys(drug_ids)]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _chunk_key(doc) -> str:
+    return doc.id or f"{doc.metadata.get('source')}#{doc.metadata.get('seq_num')}"
+
+
+def is_weak(results: List[Tuple[Any, float]], k: int, max_distance: float = FILTER_MAX_DISTANCE) -> bool:
+    """Filtered hits too few to fill k, or whose best distance is beyond max_distance."""
+    return len(results) < k or min(score for _, score in results) > max_distance
+
+
+def merge_results(filtered: List[Tuple[Any, float]], unfiltered: List[Tuple[Any, float]],
+                  k: int) -> List[Tuple[Any, float]]:
+    """Top k of both lists by distance, each chunk once."""
+    merged: Dict[str, Tuple[Any, float]] = {}
+    for doc, score in filtered + unfiltered:
+        key = _chunk_key(doc)
+        if key not in merged or score < merged[key][1]:
+            merged[key] = (doc, score)
+    return sorted(merged.values(), key=lambda pair: pair[1])[:k]
+
+
+def filtered_search(db, query: str, k: int, drug_ids: Iterable[str]) -> Tuple[List[Tuple[Any, float]], str]:
+    """
+    similarity_search_with_score over the chunks tagged with drug_ids.
+
+    The recognizer can be wrong, so the filter is not trusted blindly: when
+    the filtered hits are weak (fewer than k, or the best one further than
+    FILTER_MAX_DISTANCE) an unfiltered search is run too and the two are
+    merged by distance. No hits at all (e.g. a store built before tagging)
+    falls back to the unfiltered results. Returns the (doc, score) pairs and
+    the mode used: filtered, merged, fallback or unfiltered.
+    """
+    where = drug_filter(drug_ids)
+    if where is None:
+        return db.similarity_search_with_score(query, k=k), "unfiltered"
+    results = db.similarity_search_with_score(query, k=k, filter=where)
+    if results and not is_weak(results, k):
+        return results, "filtered"
+    unfiltered = db.similarity_search_with_score(query, k=k)
+    if not results:
+        return unfiltered, "fallback"
+    return merge_results(results, unfiltered, k), "merged"
+
+
+def search_by_vectors(db, vectors: List[List[float]], k: int,
+                      where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[Any, float]]]:
+    """
+    One top-k (doc, distance) list per query vector, in a single store call:
+    a matrix product for snapshot stores, a multi-embedding query for Chroma.
+    """
+    if hasattr(db, "similarity_search_by_vectors_with_score"):
+        return db.similarity_search_by_vectors_with_score(vectors, k, where)
+
+    from langchain_core.documents import Document
+    raw = db._collection.query(
+        query_embeddings=vectors, n_results=k, where=where, include=["documents", "metadatas", "distances"],
+    )
+    return [
+        [(Document(id=id_, page_content=text, metadata=metadata or {}), distance)
+         for id_, text, metadata, distance in zip(ids, texts, metadatas, distances)]
+        for ids, texts, metadatas, distances in zip(raw["ids"], raw["documents"], raw["metadatas"], raw["distances"])
+    ]
+
+
+def filtered_search_batch(db, vectors: List[List[float]], k: int,
+                          drug_ids: List[List[str]]) -> List[Tuple[List[Tuple[Any, float]], str]]:
+    """
+    filtered_search for many pre-embedded queries. Queries naming the same
+    drugs share one `where` and one store call; those whose filtered hits
+    are weak or empty share a single unfiltered call.
+    """
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for i, ids in enumerate(drug_ids):
+        groups.setdefault(tuple(dict.fromkeys(ids)), []).append(i)
+
+    out: List[Tuple[List[Tuple[Any, float]], str]] = [([], "unfiltered")] * len(vectors)
+    for ids, members in groups.items():
+        where = drug_filter(ids)
+        results = search_by_vectors(db, [vectors[i] for i in members], k, where)
+        for i, result in zip(members, results):
+            out[i] = (result, "filtered" if where else "unfiltered")
+
+    weak = [i for i, (result, mode) in enumerate(out) if mode == "filtered" and (not result or is_weak(result, k))]
+    if weak:
+        for i, unfiltered in zip(weak, search_by_vectors(db, [vectors[i] for i in weak], k)):
+            filtered = out[i][0]
+            out[i] = (merge_results(filtered, unfiltered, k), "merged") if filtered else (unfiltered, "fallback")
+    return out
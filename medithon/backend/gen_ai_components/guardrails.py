@@ -1,7 +1,12 @@
 import re
-import json
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+try:
+    from gen_ai_components.audit_writer import AuditLogger
+    from gen_ai_components.drug_index import DrugNameIndex, get_drug_index
+except ImportError:
+    from audit_writer import AuditLogger
+    from drug_index import DrugNameIndex, get_drug_index
 
 # =============================================================================
 # PATTERNS
@@ -71,18 +76,128 @@ DISEASE_PATTERNS = [
     r"\bcancer\b",
 ]
 
+# Dosage-form words; drug names themselves come from the drug entity recognizer
 MEDICATION_INDICATORS = [
     r"\bmg\b",
     r"\btablet\b",
     r"\bcapsule\b",
     r"\binjection\b",
     r"\bdose\b",
-    r"\bmetformin\b",
-    r"\binsulin\b",
-    r"\bparacetamol\b",
-    r"\baspirin\b",
 ]
 
+GUARDRAIL_CATEGORIES = {
+    "prompt_injection": PROMPT_INJECTION_PATTERNS,
+    "non_medical": NON_MEDICAL_PATTERNS,
+    "creative": CREATIVE_PATTERNS,
+    "patient_specific": PATIENT_SPECIFIC_PATTERNS,
+    "diagnosis": DIAGNOSIS_PATTERNS,
+    "disease": DISEASE_PATTERNS,
+    "medication": MEDICATION_INDICATORS,
+}
+
+# =============================================================================
+# COMPILED MATCHER
+# =============================================================================
+
+WORD_BOUNDARY = "\\b"
+
+def expand_pattern(pattern: str) -> List[List[str]]:
+    """
+    Expands a guardrail pattern into token sequences (single characters and
+    word-boundary markers). Supports the syntax the pattern lists use:
+    literal text, \\b and (a|b) alternation groups.
+    """
+    sequences = [[]]
+    for part in re.split(r"(\\b|\([^()]*\))", pattern):
+        if not part:
+            continue
+        if part == WORD_BOUNDARY:
+            sequences = [seq + [WORD_BOUNDARY] for seq in sequences]
+        elif part.startswith("("):
+            alternatives = part[1:-1].split("|")
+            sequences = [seq + list(alt) for seq in sequences for alt in alternatives]
+        elif re.search(r"[\\.^$*+?{}\[\]|()]", part):
+            raise ValueError(f"Unsupported guardrail pattern syntax: {pattern}")
+        else:
+            sequences = [seq + list(part) for seq in sequences]
+    return sequences
+
+
+def _tokens_regex(tokens: List[str]) -> str:
+    return "".join(WORD_BOUNDARY if t == WORD_BOUNDARY else re.escape(t) for t in tokens)
+
+
+class GuardrailMatcher:
+    """
+    Every guardrail pattern list compiled into one trie-shaped regex.
+
+    A single scan of the query returns all categories that match, instead of
+    one re.search per pattern per list. Patterns sharing a prefix share regex
+    branches, so scan cost grows with query length, not pattern count.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        literals = {}  # token tuple -> set of categories
+        for category, patterns in categories.items():
+            for pattern in patterns:
+                for tokens in expand_pattern(pattern):
+                    literals.setdefault(tuple(tokens), set()).add(category)
+
+        trie = {}
+        for tokens in literals:
+            node = trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[None] = tokens
+
+        # The regex reports one literal per start position. Another literal can
+        # match at that position only if one of the two texts is a prefix of
+        # the other; whether it does depends on the word boundaries in the
+        # real text around it, so those are checked at scan time.
+        compiled = {tokens: re.compile(_tokens_regex(tokens)) for tokens in literals}
+        texts = {tokens: "".join(t for t in tokens if t != WORD_BOUNDARY) for tokens in literals}
+        self._leaf_categories: Dict[str, frozenset] = {}
+        self._leaf_candidates: Dict[str, List[Tuple[re.Pattern, frozenset]]] = {}
+        self._leaf_names = {}
+        for i, tokens in enumerate(literals):
+            text = texts[tokens]
+            self._leaf_names[tokens] = f"p{i}"
+            self._leaf_categories[f"p{i}"] = frozenset(literals[tokens])
+            self._leaf_candidates[f"p{i}"] = [
+                (compiled[other], frozenset(literals[other] - literals[tokens]))
+                for other in literals
+                if other != tokens and literals[other] - literals[tokens]
+                and (text.startswith(texts[other]) or texts[other].startswith(text))
+            ]
+
+        self.regex = re.compile(f"(?={self._emit(trie)})")
+
+    def _emit(self, node: Dict) -> str:
+        branches = []
+        # Character branches first and word boundaries last, so the longest
+        # literal at a position is the one reported
+        children = sorted((t for t in node if t is not None), key=lambda t: (t == WORD_BOUNDARY, t))
+        for token in children:
+            branches.append(_tokens_regex([token]) + self._emit(node[token]))
+        if None in node:
+            branches.append(f"(?P<{self._leaf_names[node[None]]}>)")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    def scan(self, text: str) -> Set[str]:
+        """Returns every guardrail category with at least one match in text."""
+        hits = set()
+        for match in self.regex.finditer(text):
+            hits |= self._leaf_categories[match.lastgroup]
+            for regex, categories in self._leaf_candidates[match.lastgroup]:
+                if not categories <= hits and regex.match(text, match.start()):
+                    hits |= categories
+        return hits
+
+
+guardrail_matcher = GuardrailMatcher(GUARDRAIL_CATEGORIES)
+
 # =============================================================================
 # GUARDRAIL RESPONSES
 # =============================================================================
@@ -110,14 +225,16 @@ def clarify(reason: str):
 
 class InputGuardrails:
 
-    def detect(self, patterns, query):
-        return any(re.search(p, query) for p in patterns)
+    def __init__(self, matcher: GuardrailMatcher = guardrail_matcher, drug_index: Optional[DrugNameIndex] = None):
+        self.matcher = matcher
+        self.drug_index = drug_index or get_drug_index()
 
-    def detect_creative_medical_conflict(self, query: str) -> bool:
-        q = query.lower()
-        creative = self.detect(CREATIVE_PATTERNS, q)
-        medical = self.detect(MEDICATION_INDICATORS + DISEASE_PATTERNS, q)
-        return creative and medical
+    def detect_creative_medical_conflict(self, query: str, hits: Optional[Set[str]] = None) -> bool:
+        if hits is None:
+            hits = self.matcher.scan(query.lower())
+        if "creative" not in hits:
+            return False
+        return "medication" in hits or "disease" in hits or self.drug_index.mentions_drug(query)
 
     def run(self, query: str) -> Dict[str, Any]:
         q = query.lower().strip()
@@ -126,27 +243,30 @@ class InputGuardrails:
         if q in ["hi", "hello", "hello doctor", "hi doctor"]:
             return {"status": "allowed"}
 
+        # One scan for every category; checks below keep their precedence
+        hits = self.matcher.scan(q)
+
         # 🚫 Prompt injection
-        if self.detect(PROMPT_INJECTION_PATTERNS, q):
+        if "prompt_injection" in hits:
             return block("Prompt injection attempt detected.", "prompt_injection")
 
         # 🚫 Creative + medical conflict
-        if self.detect_creative_medical_conflict(q):
+        if self.detect_creative_medical_conflict(q, hits):
             return block(
                 "Creative or entertainment-style requests involving medicines are not allowed.",
                 "creative_medical_conflict"
             )
 
         # 🚫 Out of scope
-        if self.detect(NON_MEDICAL_PATTERNS, q):
+        if "non_medical" in hits:
             return block("Non-medical query detected.", "out_of_scope")
 
         # 🚫 Diagnosis
-        if self.detect(DIAGNOSIS_PATTERNS, q):
+        if "diagnosis" in hits:
             return block("Diagnosis requests are not permitted.", "diagnosis_blocked")
 
         # ⚠️ Patient-specific → clarify
-        if self.detect(PATIENT_SPECIFIC_PATTERNS, q):
+        if "patient_specific" in hits:
             return clarify(
                 "Please consult a qualified doctor. I can only provide general medical information."
             )
@@ -183,24 +303,6 @@ class OutputGuardrails:
             "safe_response": response
         }
 
-# =============================================================================
-# AUDIT LOGGER
-# =============================================================================
-
-class AuditLogger:
-
-    def __init__(self, logfile="audit_log.jsonl"):
-        self.logfile = logfile
-
-    def log(self, query: str, response: str):
-        entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "query": query,
-            "response": response
-        }
-        with open(self.logfile, "a") as f:
-            f.write(json.dumps(entry) + "\n")
-
 # =============================================================================
 # FULL FRAMEWORK
 # =============================================================================
@@ -210,13 +312,13 @@ class GuardrailsFramework:
     def __init__(self, audit_logfile: str = "audit_log.jsonl"):
         self.input_guardrails = InputGuardrails()
         self.output_guardrails = OutputGuardrails()
-        self.logger = AuditLogger()
+        self.logger = AuditLogger(logfile=audit_logfile)
 
     def validate_input(self, query: str):
         return self.input_guardrails.run(query)
 
-    def validate_output(self, response: str, tool_outputs: List[Dict[str, Any]]):
+    def validate_output(self, query: str, response: str, tool_outputs: List[Dict[str, Any]]):
         return self.output_guardrails.run(response, tool_outputs)
 
-    def audit(self, query: str, response: str):
-        self.logger.log(query, response)
\ No newline at end of file
+    def audit(self, query: str, tool_calls: List[Dict[str, Any]], response: str, latency_ms: Optional[float] = None):
+        self.logger.log(query, tool_calls, response, latency_ms=latency_ms)
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.runnables import Runnable
+
+from gen_ai_components.session_store import session_lock
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Turns (user + assistant message pairs) kept verbatim in every prompt
+HISTORY_WINDOW_TURNS = int(os.getenv("HISTORY_WINDOW_TURNS", "4"))
+
+# Older turns are folded into the summary in batches of this many turns,
+# so the summarizer runs once every few turns instead of every turn
+HISTORY_FOLD_TURNS = int(os.getenv("HISTORY_FOLD_TURNS", "2"))
+
+SUMMARY_PREFIX = "Summary of earlier conversation:\n"
+
+
+def format_transcript(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{msg.type}: {msg.content}" for msg in messages)
+
+
+# =============================================================================
+# HISTORY MANAGER
+# =============================================================================
+
+class HistoryManager:
+    """
+    Keeps prompt history bounded: the last N turns stay verbatim and older
+    turns are folded into a rolling summary stored as the first message of
+    the session history.
+
+    Folding runs on a background executor after the response is sent, so the
+    summarization call never adds latency to a request.
+    """
+
+    def __init__(
+        self,
+        summarizer: Runnable,
+        window_turns: int = HISTORY_WINDOW_TURNS,
+        fold_turns: int = HISTORY_FOLD_TURNS,
+        max_workers: int = 2,
+    ):
+        self.summarizer = summarizer
+        self.window_turns = window_turns
+        self.fold_turns = fold_turns
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-fold")
+
+    @staticmethod
+    def split_summary(messages: List[BaseMessage]) -> Tuple[Optional[SystemMessage], List[BaseMessage]]:
+        if messages and isinstance(messages[0], SystemMessage) and messages[0].content.startswith(SUMMARY_PREFIX):
+            return messages[0], messages[1:]
+        return None, list(messages)
+
+    def window(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Returns the prompt view of a session: summary (if any) + recent turns.
+
+        Turns waiting to be folded are still included, so the view is bounded
+        by window_turns + fold_turns regardless of session length.
+        """
+        summary, turns = self.split_summary(messages)
+        recent = turns[-2 * (self.window_turns + self.fold_turns):]
+        return ([summary] if summary else []) + recent
+
+    def schedule_fold(self, session_id: str, get_history: Callable[[str], BaseChatMessageHistory]):
+        """Queues a background fold of the session's overflow turns."""
+        self._executor.submit(self._fold, session_id, get_history)
+
+    def _fold(self, session_id: str, get_history: Callable[[str], BaseChatMessageHistory]):
+        try:
+            history = get_history(session_id)
+            summary, turns = self.split_summary(history.messages)
+
+            keep = 2 * self.window_turns
+            if len(turns) < keep + 2 * self.fold_turns:
+                return
+
+            # Summarize outside the session lock so the next turn isn't blocked
+            overflow = turns[:-keep]
+            new_summary = self.summarizer.invoke({
+                "summary": summary.content[len(SUMMARY_PREFIX):] if summary else "(none)",
+                "transcript": format_transcript(overflow),
+            })
+
+            with session_lock(session_id):
+                current_summary, current_turns = self.split_summary(history.messages)
+
+                # Another fold got here first; this one is stale
+                if _contents(current_summary) != _contents(summary) or \
+                        [m.content for m in current_turns[:len(overflow)]] != [m.content for m in overflow]:
+                    return
+
+                messages = [SystemMessage(content=SUMMARY_PREFIX + new_summary.strip())] + current_turns[len(overflow):]
+                if hasattr(history, "replace_messages"):
+                    history.replace_messages(messages)
+                else:
+                    history.clear()
+                    history.add_messages(messages)
+        except Exception as e:
+            # A failed fold only leaves the session unsummarized until the next turn
+            print(f"History fold failed for {session_id}: {e}")
+
+
+def _contents(message: Optional[BaseMessage]) -> Optional[str]:
+    return message.content if message else None
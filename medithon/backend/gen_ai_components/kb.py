@@ -0,0 +1,372 @@
+"""
+Knowledge-base generations.
+
+A generation is one consistent view of the data: the four vector stores
+plus the drug-name index built from drugs_master.json. The chains and
+tools look their stores up through a KnowledgeBase instead of holding
+Chroma handles from import time, so new data is picked up without a
+restart:
+
+    1. reload() (POST /api/kb/reload, or the watcher when the stores'
+       files, the snapshot CURRENT file or the drug data change) opens the
+       new generation on a background thread while requests keep running;
+    2. the reference is swapped under a lock, so new requests see the new
+       generation and no request ever sees half of each;
+    3. caches registered in caches.py are cleared for the new data version;
+    4. requests pinned to the old generation (see pinned()) finish on it;
+       once they drain, its Chroma clients are stopped and Chroma versions
+       beyond VECTOR_KEEP_VERSIONS that this process no longer reads are
+       deleted.
+
+KB_WATCH_INTERVAL_S > 0 starts the watcher (see start_watcher()).
+"""
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    from gen_ai_components.caches import invalidate
+    from gen_ai_components.drug_index import (
+        DRUGS_MASTER_PATH, JAN_AUSHADHI_PRICES_PATH, DrugNameIndex, get_drug_index, load_drug_index,
+    )
+    from gen_ai_components.knowledge_pack import KNOWLEDGE_PACK
+    from gen_ai_components.metrics import metrics
+    from gen_ai_components.providers import (
+        KB_SNAPSHOT, close_vector_store, collection_dir, open_vector_store, prune_collection_versions,
+    )
+except ImportError:
+    from caches import invalidate
+    from drug_index import DRUGS_MASTER_PATH, JAN_AUSHADHI_PRICES_PATH, DrugNameIndex, get_drug_index, load_drug_index
+    from knowledge_pack import KNOWLEDGE_PACK
+    from metrics import metrics
+    from providers import (
+        KB_SNAPSHOT, close_vector_store, collection_dir, open_vector_store, prune_collection_versions,
+    )
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Seconds between checks for changed data (0 = no watcher; reload via the endpoint only)
+KB_WATCH_INTERVAL_S = float(os.getenv("KB_WATCH_INTERVAL_S", "0"))
+
+# How long a swap waits for requests still on the old generation
+KB_DRAIN_TIMEOUT_S = float(os.getenv("KB_DRAIN_TIMEOUT_S", "120"))
+
+COLLECTIONS = ("Vector_drugs_master", "Vector_interactions", "Vector_reimbursement", "Vector_comparisons")
+DATA_FILES = (DRUGS_MASTER_PATH, JAN_AUSHADHI_PRICES_PATH, KNOWLEDGE_PACK)
+
+
+def _resolve_snapshot(path: str) -> str:
+    try:
+        from gen_ai_components.snapshot import resolve
+    except ImportError:
+        from snapshot import resolve
+    return resolve(path)
+
+
+def _stat(path) -> str:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return f"{path}:missing"
+    return f"{path}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def fingerprint(source: str, snapshot: bool) -> str:
+    """
+    Changes whenever the data behind `source` does: the snapshot its CURRENT
+    file names, or the current version of each Chroma collection (populate_db
+    publishes every build as a new directory), plus the drug data files and
+    the knowledge pack.
+    """
+    if snapshot:
+        parts = [_resolve_snapshot(source)]
+    else:
+        parts = [_stat(os.path.join(collection_dir(source, name), "chroma.sqlite3")) for name in COLLECTIONS]
+    parts += [_stat(path) for path in DATA_FILES]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def _forget_chroma_client(path: str):
+    """
+    Chroma shares one client per persist directory for the life of the
+    process, so reopening a rebuilt directory would return the old data.
+    Dropping the cached client makes the next open read what is on disk;
+    the old generation keeps its own until it is released.
+    """
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        SharedSystemClient._identifier_to_system.pop(path, None)
+    except (ImportError, AttributeError):
+        pass
+
+
+# =============================================================================
+# GENERATION
+# =============================================================================
+
+class Generation:
+    """One loaded version of the stores and drug index, with a count of the requests using it."""
+
+    def __init__(self, version: str, source: str, stores: Dict[str, Any], drug_index: DrugNameIndex,
+                 paths: Optional[Dict[str, str]] = None):
+        self.version = version
+        self.source = source
+        self.stores = stores
+        # Collection name -> Chroma version directory read (none for snapshots)
+        self.paths = paths or {}
+        self.drug_index = drug_index
+        self.loaded_at = time.time()
+        self.active = 0
+        self._idle = threading.Condition()
+
+    def store(self, name: str):
+        return self.stores[name]
+
+    def enter(self):
+        with self._idle:
+            self.active += 1
+
+    def exit(self):
+        with self._idle:
+            self.active -= 1
+            if self.active == 0:
+                self._idle.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """Waits until no request uses this generation; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
+
+    def close(self):
+        """Stops the Chroma clients behind the stores; only once nothing uses them."""
+        for store in self.stores.values():
+            close_vector_store(store)
+
+
+# The generation each knowledge base is pinned to for the current request
+_pinned: contextvars.ContextVar[Optional[Dict[int, Generation]]] = contextvars.ContextVar("kb_pinned", default=None)
+
+
+# =============================================================================
+# KNOWLEDGE BASE
+# =============================================================================
+
+class KnowledgeBase:
+    """The current generation for one vector root (or KB_SNAPSHOT), and how to replace it."""
+
+    def __init__(self, root: str, embedding_function: Embeddings):
+        self.root = root
+        self.embedding_function = embedding_function
+        self.snapshot = bool(KB_SNAPSHOT)
+        self.source = KB_SNAPSHOT or root
+        self.last_reload: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._reloading: Optional[threading.Thread] = None
+        self._current = self._open(self.source)
+
+    def _open(self, source: str) -> Generation:
+        version = fingerprint(source, self.snapshot)
+        if self.snapshot:
+            path = _resolve_snapshot(source)
+            stores = {name: open_vector_store(name, self.embedding_function, self.root, snapshot=path)
+                      for name in COLLECTIONS}
+        else:
+            stores, paths = {}, {}
+            for name in COLLECTIONS:
+                paths[name] = collection_dir(source, name)
+                _forget_chroma_client(paths[name])
+                stores[name] = open_vector_store(name, self.embedding_function, source, snapshot=None)
+            return Generation(version, source, stores, load_drug_index(), paths)
+        return Generation(version, source, stores, load_drug_index())
+
+    @property
+    def current(self) -> Generation:
+        return self._current
+
+    def acquire(self) -> Generation:
+        """The current generation, counted as in use until its exit()."""
+        with self._lock:
+            generation = self._current
+            generation.enter()
+        return generation
+
+    def active(self) -> Generation:
+        """The generation pinned for this request, else the current one."""
+        pinned = _pinned.get()
+        return (pinned or {}).get(id(self)) or self._current
+
+    @property
+    def reloading(self) -> bool:
+        return self._reloading is not None
+
+    def reload(self, source: Optional[str] = None, force: bool = False) -> bool:
+        """Starts loading a new generation in the background; False if a reload is already running."""
+        with self._lock:
+            if self._reloading is not None:
+                return False
+            self._reloading = threading.Thread(target=self._reload, args=(source, force), daemon=True)
+            self._reloading.start()
+        return True
+
+    def _reload(self, source: Optional[str], force: bool):
+        start = time.perf_counter()
+        source = source or self.source
+        try:
+            if not force and source == self.source and fingerprint(source, self.snapshot) == self._current.version:
+                self.last_reload = {"result": "unchanged", "version": self._current.version}
+                metrics.inc("kb_reloads_total", result="unchanged")
+                return
+
+            new = self._open(source)
+            with self._lock:
+                old, self._current = self._current, new
+                self.source = source
+            get_drug_index.cache_clear()
+            invalidate(data_version())
+        except Exception as e:
+            print(f"⚠️ Knowledge base reload failed, keeping {self._current.version}: {e}")
+            self.last_reload = {"result": "error", "error": str(e), "version": self._current.version}
+            metrics.inc("kb_reloads_total", result="error")
+            with self._lock:
+                self._reloading = None
+            return
+
+        # The swap is done: releasing the old generation cannot undo or fail it
+        try:
+            print(f"🔄 Knowledge base {old.version} -> {new.version} ({old.active} requests draining)")
+            self.last_reload = {
+                "result": "swapped", "from": old.version, "version": new.version, "drained": False,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+            metrics.inc("kb_reloads_total", result="swapped")
+            metrics.observe("kb_reload_seconds", time.perf_counter() - start)
+
+            if not old.drain(KB_DRAIN_TIMEOUT_S):
+                print(f"⚠️ Knowledge base {old.version} still in use after {KB_DRAIN_TIMEOUT_S}s; left open")
+                return
+            self.last_reload["drained"] = True
+            errors = self._retire(old, new)
+            if errors:
+                self.last_reload["cleanup_errors"] = errors
+        finally:
+            with self._lock:
+                self._reloading = None
+
+    def _retire(self, old: Generation, new: Generation) -> List[str]:
+        """Closes a drained generation, then prunes versions neither reads; returns the errors instead of raising."""
+        errors = []
+        try:
+            old.close()
+        except Exception as e:
+            errors.append(f"close {old.version}: {e}")
+        errors += self._prune(new)
+        for error in errors:
+            print(f"⚠️ Knowledge base cleanup: {error}")
+        return errors
+
+    def _prune(self, keep: Generation) -> List[str]:
+        """Deletes old Chroma versions once nothing here reads them; never the ones `keep` has open."""
+        errors = []
+        for name, path in keep.paths.items():
+            try:
+                removed = prune_collection_versions(keep.source, name, protect=[path])
+                if removed:
+                    print(f"🧹 {name}: removed versions {', '.join(removed)}")
+            except OSError as e:
+                errors.append(f"prune {name}: {e}")
+        return errors
+
+    def status(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            "source": self.source,
+            "version": current.version,
+            "loaded_at": current.loaded_at,
+            "active_requests": current.active,
+            "reloading": self.reloading,
+            "last_reload": self.last_reload,
+        }
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+_bases: Dict[str, KnowledgeBase] = {}
+_bases_lock = threading.Lock()
+
+
+def get_knowledge_base(root: str, embedding_function: Embeddings) -> KnowledgeBase:
+    """One knowledge base per vector root, shared by every module that reads it."""
+    with _bases_lock:
+        base = _bases.get(root)
+        if base is None:
+            base = _bases[root] = KnowledgeBase(root, embedding_function)
+            invalidate(data_version(locked=True))
+        return base
+
+
+def knowledge_bases() -> List[KnowledgeBase]:
+    with _bases_lock:
+        return list(_bases.values())
+
+
+def data_version(locked: bool = False) -> str:
+    """Version of all loaded knowledge bases together."""
+    bases = _bases.values() if locked else knowledge_bases()
+    return "+".join(base.current.version for base in bases)
+
+
+@contextmanager
+def pinned() -> Iterator[None]:
+    """
+    Pins the current generation of every knowledge base for the duration
+    of a request, so all its retrievals read one version and a swap waits
+    for it to finish.
+    """
+    generations = {id(base): base.acquire() for base in knowledge_bases()}
+    token = _pinned.set(generations)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+        for generation in generations.values():
+            generation.exit()
+
+
+def reload_all(source: Optional[str] = None, force: bool = False) -> bool:
+    """Reloads every knowledge base in the background; True if any reload started."""
+    started = [base.reload(source, force) for base in knowledge_bases()]
+    return any(started)
+
+
+def status() -> List[Dict[str, Any]]:
+    return [base.status() for base in knowledge_bases()]
+
+
+def start_watcher(interval_s: float = KB_WATCH_INTERVAL_S) -> Optional[threading.Thread]:
+    """Polls each knowledge base's fingerprint and reloads the ones whose data changed."""
+    if interval_s <= 0:
+        return None
+
+    def watch():
+        while True:
+            time.sleep(interval_s)
+            for base in knowledge_bases():
+                try:
+                    if not base.reloading and fingerprint(base.source, base.snapshot) != base.current.version:
+                        base.reload()
+                except Exception as e:
+                    print(f"⚠️ Knowledge base watcher: {e}")
+
+    watcher = threading.Thread(target=watch, name="kb-watcher", daemon=True)
+    watcher.start()
+    return watcher
@@ -0,0 +1,358 @@
+"""
+Knowledge pack: the data files validated and compiled into one binary file.
+
+    python -m gen_ai_components.knowledge_pack build    # validate data/ and write data/knowledge.pack
+    python -m gen_ai_components.knowledge_pack check    # validate only (exit 1 on errors)
+    python -m gen_ai_components.knowledge_pack info     # header, sources and index sizes
+
+Building checks drugs_master.json, interactions.json, comparisons.json,
+reimbursement.json and jan_aushadhi_prices.csv against the schemas below,
+plus cross-references (every drug id a scenario, comparison or interaction
+pair names must exist), and refuses to write a pack if anything fails.
+
+The pack is a fixed header followed by a marshal payload:
+
+    magic "MRKPACK\\0" | format u16 | marshal version u16 | sha256 of payload | payload length u64
+
+The payload holds the parsed records, the drug-name table and regex of
+DrugNameIndex (so the price list is not fuzzy-resolved again), and the
+sha256, size and mtime of every source file. Loading is one read, a hash
+and marshal.loads. A pack whose sources no longer match the files in data/
+is ignored, so a stale pack never shadows an edit; only a file whose size
+or mtime moved is hashed again to find out.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from gen_ai_components.drug_index import DATA_DIR, DRUGS_MASTER_PATH, JAN_AUSHADHI_PRICES_PATH, DrugNameIndex
+except ImportError:
+    from drug_index import DATA_DIR, DRUGS_MASTER_PATH, JAN_AUSHADHI_PRICES_PATH, DrugNameIndex
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+KNOWLEDGE_PACK = os.getenv("KNOWLEDGE_PACK") or str(DATA_DIR / "knowledge.pack")
+
+MAGIC = b"MRKPACK\0"
+FORMAT_VERSION = 3
+HEADER = struct.Struct(">8sHH32sQ")
+
+SOURCES = {
+    "drugs_master": DRUGS_MASTER_PATH,
+    "interactions": DATA_DIR / "interactions.json",
+    "comparisons": DATA_DIR / "comparisons.json",
+    "reimbursement": DATA_DIR / "reimbursement.json",
+    "prices": JAN_AUSHADHI_PRICES_PATH,
+}
+
+SEVERITIES = ("low", "moderate", "high", "critical")
+ESIC_STATUSES = ("yes", "fdc_only", "kit_only", "no", "not_verified")
+
+
+# =============================================================================
+# SCHEMAS
+# =============================================================================
+
+class MapOf:
+    """Schema for a dict with arbitrary keys whose values all match `schema`."""
+
+    def __init__(self, schema: Any):
+        self.schema = schema
+
+
+NoneType = type(None)
+
+# A schema is a type (or tuple of types), [item schema], MapOf(value schema),
+# or a dict of field -> schema; a field ending in "?" may be missing.
+DRUG_SCHEMA = {
+    "id": str, "generic_name": str, "openfda_name?": str, "category": str, "primary_strength?": str,
+    "brands": [str], "brand_mrp?": (dict, NoneType), "jan_aushadhi_mrp?": (dict, NoneType),
+    "savings_percent?": (int, float, NoneType), "cghs_codes?": [str], "cghs_entry?": str,
+    "esic_status": str, "esic_detail?": str,
+    "has_manual_comparisons?": bool, "has_manual_interactions?": bool,
+}
+SCENARIO_DRUG_SCHEMA = {"name": str, "id": (str, NoneType), "category?": str}
+SCENARIO_SCHEMA = {
+    "id": int, "title": str, "patient_profile": str, "drug_a": SCENARIO_DRUG_SCHEMA, "drug_b": SCENARIO_DRUG_SCHEMA,
+    "severity": str, "risk": str, "mechanism": str, "recommendation": str,
+    "safer_alternative?": (dict, NoneType), "source": str, "demo_query?": str,
+}
+FLAG_SCHEMA = {"severity": str, "risk": str, "recommendation": str, "source?": str}
+COMPARISON_SCHEMA = {
+    "id": int, "title": str, "category": str, "drugs": [str], "parameters": [{"param": str}],
+    "evidence?": [str], "key_takeaway": str, "critical_warning?": str,
+}
+SCHEME_SCHEMA = {"full_name?": str, "type?": str, "coverage_model": str, "key_rule": str}
+COVERAGE_SCHEMA = {
+    "drugs": [str], "pmjay": str, "cghs": str, "esic": str, "private": str, "jan_aushadhi": str,
+    "agent_questions?": [str], "clinical_note?": str,
+}
+PRICE_ROW_SCHEMA = {"Drug": str, "Variant Name": str, "Unit Size": str, "MRP": str, "Group Name": str}
+
+FILE_SCHEMAS = {
+    "drugs_master": {"meta": dict, "drugs": [DRUG_SCHEMA]},
+    "interactions": {
+        "meta": dict, "scenarios": [SCENARIO_SCHEMA], "interaction_pairs": MapOf(int),
+        "additional_flags": MapOf(FLAG_SCHEMA),
+    },
+    "comparisons": {"meta": dict, "comparisons": [COMPARISON_SCHEMA]},
+    "reimbursement": {"meta": dict, "schemes": MapOf(SCHEME_SCHEMA), "drug_coverage": MapOf(COVERAGE_SCHEMA)},
+    "prices": [PRICE_ROW_SCHEMA],
+}
+
+
+def check(value: Any, schema: Any, where: str, errors: List[str]):
+    """Appends a message to errors for every place value does not match schema."""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            errors.append(f"{where}: expected an object, got {type(value).__name__}")
+            return
+        for field, sub in schema.items():
+            optional = field.endswith("?")
+            field = field.rstrip("?")
+            if field in value:
+                check(value[field], sub, f"{where}.{field}", errors)
+            elif not optional:
+                errors.append(f"{where}: missing field {field!r}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            errors.append(f"{where}: expected a list, got {type(value).__name__}")
+            return
+        for i, item in enumerate(value):
+            check(item, schema[0], f"{where}[{i}]", errors)
+    elif isinstance(schema, MapOf):
+        if not isinstance(value, dict):
+            errors.append(f"{where}: expected an object, got {type(value).__name__}")
+            return
+        for key, item in value.items():
+            check(item, schema.schema, f"{where}.{key}", errors)
+    elif not isinstance(value, schema):
+        expected = " or ".join(t.__name__ for t in (schema if isinstance(schema, tuple) else (schema,)))
+        errors.append(f"{where}: expected {expected}, got {type(value).__name__}")
+
+
+def validate(data: Dict[str, Any]) -> List[str]:
+    """Schema and cross-reference errors across all sources (empty when the data is consistent)."""
+    errors: List[str] = []
+    for name, schema in FILE_SCHEMAS.items():
+        check(data[name], schema, SOURCES[name].name, errors)
+    if errors:
+        return errors
+
+    drugs = data["drugs_master"]["drugs"]
+    drug_ids = {d["id"] for d in drugs}
+    if len(drug_ids) != len(drugs):
+        errors.append("drugs_master.json: duplicate drug ids")
+    for drug in drugs:
+        if drug["esic_status"] not in ESIC_STATUSES:
+            errors.append(f"drugs_master.json: {drug['id']}: unknown esic_status {drug['esic_status']!r}")
+
+    interactions = data["interactions"]
+    scenario_ids = {s["id"] for s in interactions["scenarios"]}
+    for scenario in interactions["scenarios"]:
+        where = f"interactions.json: scenario {scenario['id']}"
+        if scenario["severity"] not in SEVERITIES:
+            errors.append(f"{where}: unknown severity {scenario['severity']!r}")
+        for role in ("drug_a", "drug_b", "safer_alternative"):
+            drug_id = (scenario.get(role) or {}).get("id")
+            if drug_id is not None and drug_id not in drug_ids:
+                errors.append(f"{where}: {role} id {drug_id!r} is not in drugs_master.json")
+    for pair, target in interactions["interaction_pairs"].items():
+        if target == 0:
+            if pair not in interactions["additional_flags"]:
+                errors.append(f"interactions.json: pair {pair!r} points at a flag that does not exist")
+        elif target not in scenario_ids:
+            errors.append(f"interactions.json: pair {pair!r} points at unknown scenario {target}")
+    for flag, entry in interactions["additional_flags"].items():
+        if entry["severity"] not in SEVERITIES:
+            errors.append(f"interactions.json: flag {flag!r}: unknown severity {entry['severity']!r}")
+
+    for comparison in data["comparisons"]["comparisons"]:
+        for drug_id in comparison["drugs"]:
+            if drug_id not in drug_ids:
+                errors.append(f"comparisons.json: comparison {comparison['id']}: "
+                              f"drug {drug_id!r} is not in drugs_master.json")
+
+    for i, row in enumerate(data["prices"]):
+        try:
+            if float(row["MRP"]) <= 0:
+                raise ValueError
+        except ValueError:
+            errors.append(f"{SOURCES['prices'].name}[{i}]: MRP {row['MRP']!r} is not a positive number")
+    return errors
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _stat(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def read_sources() -> Dict[str, Any]:
+    data = {}
+    for name, path in SOURCES.items():
+        with open(path, encoding="utf-8", newline="" if path.suffix == ".csv" else None) as f:
+            data[name] = list(csv.DictReader(f)) if path.suffix == ".csv" else json.load(f)
+    return data
+
+
+def build_payload(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Records plus the drug-name index tables, ready for marshal."""
+    index = DrugNameIndex(data["drugs_master"]["drugs"], data["prices"])
+    sources = {name: _sha256(path) for name, path in SOURCES.items()}
+    return {
+        "version": hashlib.sha256(json.dumps(sources, sort_keys=True).encode("utf-8")).hexdigest()[:12],
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sources": sources,
+        "stats": {name: _stat(path) for name, path in SOURCES.items()},
+        "data": data,
+        "indexes": {"names": index.names, "pattern": index.pattern},
+    }
+
+
+def write_pack(payload: Dict[str, Any], path: str):
+    body = marshal.dumps(payload)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, hashlib.sha256(body).digest(), len(body))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + body)
+    os.replace(tmp, path)
+
+
+def build(path: str = KNOWLEDGE_PACK) -> "KnowledgePack":
+    """Validates the data files and writes the pack; raises ValueError listing every problem."""
+    data = read_sources()
+    errors = validate(data)
+    if errors:
+        raise ValueError("Invalid knowledge data:\n  " + "\n  ".join(errors))
+    payload = build_payload(data)
+    write_pack(payload, path)
+    return KnowledgePack(payload)
+
+
+# =============================================================================
+# LOAD
+# =============================================================================
+
+class KnowledgePack:
+    """Parsed records and the prebuilt drug-name index from a pack."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self.data = payload["data"]
+        self.indexes = payload["indexes"]
+        self._drug_index: Optional[DrugNameIndex] = None
+
+    @property
+    def version(self) -> str:
+        return self.payload["version"]
+
+    def is_current(self) -> bool:
+        """
+        True unless a source file present in data/ differs from the one the
+        pack was built from. A file with the recorded size and mtime is taken
+        as unchanged; only one that moved (an edit, or a checkout or copy
+        that only touched it) is hashed.
+        """
+        return all(_stat(path) == self.payload["stats"][name]
+                   or _sha256(path) == self.payload["sources"][name]
+                   for name, path in SOURCES.items() if path.exists())
+
+    def drug_index(self) -> DrugNameIndex:
+        if self._drug_index is None:
+            self._drug_index = DrugNameIndex.from_tables(
+                self.data["drugs_master"]["drugs"], self.indexes["names"], self.indexes["pattern"],
+            )
+        return self._drug_index
+
+
+def load_pack(path: str = KNOWLEDGE_PACK) -> KnowledgePack:
+    with open(path, "rb") as f:
+        raw = f.read()
+    magic, fmt, marshal_version, digest, length = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a knowledge pack")
+    if fmt != FORMAT_VERSION or marshal_version != marshal.version:
+        raise ValueError(f"{path}: pack format {fmt}/marshal {marshal_version}, "
+                         f"this build reads {FORMAT_VERSION}/{marshal.version}; rebuild it")
+    body = memoryview(raw)[HEADER.size:]
+    if len(body) != length or hashlib.sha256(body).digest() != digest:
+        raise ValueError(f"{path}: payload is truncated or corrupt")
+    return KnowledgePack(marshal.loads(body))
+
+
+def load_current_pack(path: str = KNOWLEDGE_PACK) -> Optional[KnowledgePack]:
+    """The pack if it exists, is readable and matches data/; None means parse the raw files."""
+    if not os.path.exists(path):
+        return None
+    try:
+        pack = load_pack(path)
+    except (OSError, ValueError, EOFError, struct.error) as e:
+        print(f"⚠️ Ignoring knowledge pack: {e}")
+        return None
+    if not pack.is_current():
+        print(f"⚠️ Ignoring stale knowledge pack {path}: data/ changed since it was built")
+        return None
+    return pack
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "check", "info"])
+    parser.add_argument("--pack", default=KNOWLEDGE_PACK, help="pack path")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        data = read_sources()
+        errors = validate(data)
+        for error in errors:
+            print(f"❌ {error}")
+        if errors:
+            sys.exit(1)
+        # Price-list names the recognizer attached by approximate match: review these
+        index = DrugNameIndex(data["drugs_master"]["drugs"], data["prices"])
+        for name, drug_id in index.fuzzy_matches.items():
+            print(f"≈ price list {name!r} -> {drug_id}")
+        for name in index.unresolved:
+            print(f"⚠️ price list {name!r} matches no drug; its rows are not indexed")
+        print("✅ Data files are valid")
+    elif args.command == "build":
+        start = time.perf_counter()
+        try:
+            pack = build(args.pack)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ Wrote {args.pack} ({os.path.getsize(args.pack) / 1024:.0f} KB, version {pack.version}) "
+              f"in {time.perf_counter() - start:.2f}s")
+    else:
+        start = time.perf_counter()
+        pack = load_pack(args.pack)
+        load_ms = (time.perf_counter() - start) * 1000
+        indexes = pack.indexes
+        print(json.dumps({"version": pack.version, "built": pack.payload["built"], "sources": pack.payload["sources"]},
+                         indent=2))
+        print(f"{len(pack.data['drugs_master']['drugs'])} drugs, {len(indexes['names'])} names; "
+              f"loaded in {load_ms:.1f} ms; {'current' if pack.is_current() else 'STALE'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+# Latency histogram buckets (seconds): guardrails and cache hits on the
+# left, LLM calls and Whisper transcriptions on the right
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_HELP = {
+    "stage_latency_seconds": "Latency of a pipeline stage.",
+    "stage_errors_total": "Exceptions raised by a pipeline stage.",
+    "llm_tokens_total": "Prompt and completion tokens reported by the LLM provider.",
+    "cache_requests_total": "Cache lookups by cache and result (hit or miss).",
+    "cache_invalidations_total": "Caches cleared because a new knowledge-base generation was swapped in.",
+    "single_flight_requests_total": "Stateless queries by single-flight role: leader (ran the chain) or follower (shared its result).",
+    "kb_reloads_total": "Knowledge-base reloads by result (swapped, unchanged, error).",
+    "kb_reload_seconds": "Time to open a new knowledge-base generation, swap it in and drain the old one.",
+    "warmup_queries_total": "Warm-up queries run after startup by result (ok, error).",
+    "warmup_seconds": "Time for one warm-up pass over the demo and most frequent queries.",
+    "retrieval_filter_total": "Vector searches by drug-filter mode (filtered, merged, fallback, unfiltered).",
+    "guardrail_short_circuits_total": "Queries answered by the guardrails stage without calling the chain.",
+    "guardrail_avoided_cost_usd_total": "Estimated LLM and embedding spend avoided by guardrail short circuits.",
+    "audit_log_dropped_total": "Audit entries dropped because the writer queue was full.",
+    "audit_log_write_errors_total": "Audit batches lost to write errors.",
+}
+
+
+def _labels(labels: Dict[str, str]) -> LabelSet:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+# =============================================================================
+# METRICS REGISTRY
+# =============================================================================
+
+class Metrics:
+    """
+    Process-wide counters and histograms keyed by metric name and label set.
+
+    Thread-safe and dependency-free, so any component (chains, agent,
+    guardrails) can record without caring who reads the numbers. Recording
+    is a dict update under a lock; formatting only happens in render_prometheus().
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        # name -> labels -> [per-bucket counts..., +Inf count, sum]
+        self._histograms: Dict[str, Dict[LabelSet, List[float]]] = {}
+        self._lock = threading.Lock()
+        # Called as listener(kind, stage, value) for every stage timing and token count
+        self._listeners: List[Callable[[str, str, Any], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str, Any], None]):
+        """Subscribes to per-stage events ("stage" seconds, "tokens" usage dicts)."""
+        self._listeners.append(listener)
+
+    def _notify(self, kind: str, stage: str, value: Any):
+        for listener in self._listeners:
+            listener(kind, stage, value)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = _labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Records the block's latency under stage_latency_seconds and counts its exceptions."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc("stage_errors_total", stage=stage, error=type(e).__name__)
+            raise
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.observe("stage_latency_seconds", seconds, stage=stage)
+        self._notify("stage", stage, seconds)
+
+    def record_tokens(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int):
+        self.inc("llm_tokens_total", prompt_tokens, stage=stage, model=model, kind="prompt")
+        self.inc("llm_tokens_total", completion_tokens, stage=stage, model=model, kind="completion")
+        self._notify("tokens", stage, {
+            "model": model, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+        })
+
+    def value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def snapshot(self) -> Dict[str, Dict[LabelSet, float]]:
+        with self._lock:
+            return {name: dict(series) for name, series in self._counters.items()}
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and mean latency (ms) per stage, for benchmarks and debugging."""
+        with self._lock:
+            series = dict(self._histograms.get("stage_latency_seconds", {}))
+        summary = {}
+        for labels, counts in series.items():
+            count = sum(counts[:-1])
+            summary[dict(labels)["stage"]] = {"count": count, "mean_ms": round(counts[-1] / count * 1000, 2)}
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted(counters):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name in sorted(histograms):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, counts in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                cumulative += counts[len(self.buckets)]
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {counts[-1]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,73 @@
+import re
+from typing import Dict, List
+
+try:
+    from gen_ai_components.drug_index import get_drug_index
+except ImportError:
+    from drug_index import get_drug_index
+
+# =============================================================================
+# INTENT PATTERNS
+# =============================================================================
+
+COMPARISON_PATTERN = re.compile(
+    r"\b(compare|comparison|vs|versus|better|prefer|preferred|difference|alternative|alternatives|instead)\b"
+)
+
+INTERACTION_PATTERN = re.compile(
+    r"\b(interact|interaction|interactions|together|along with|combine|combination|safe with|already on|co-prescribe)\b"
+)
+
+REIMBURSEMENT_PATTERN = re.compile(
+    r"\b(price|prices|cost|costs|cheap|cheaper|mrp|cghs|esic|pm-?jay|jan aushadhi|insurance|reimburse\w*|covered|coverage|formulary|scheme)\b"
+)
+
+# Upper bound on per-drug lookups a single plan may fan out to
+MAX_PLANNED_DRUGS = 4
+
+
+# =============================================================================
+# RULE-BASED PLANNER
+# =============================================================================
+
+def plan_tool_calls(query: str) -> List[Dict]:
+    """
+    Builds the complete tool plan for a query without an LLM call.
+
+    Returns a list of {"tool_name", "tool_args"} dicts, or an empty list when
+    no known drug is mentioned (the caller should fall back to LLM planning).
+    """
+    index = get_drug_index()
+    q = query.lower()
+
+    drug_ids = index.find(q)[:MAX_PLANNED_DRUGS]
+    if not drug_ids:
+        return []
+
+    names = [index.generic_name(d) for d in drug_ids]
+    plan = [
+        {"tool_name": "drug_information_retrieval", "tool_args": {"drug_name": name}}
+        for name in names
+    ]
+
+    if len(names) >= 2:
+        # Interactions are always checked when several drugs are involved
+        plan.append({"tool_name": "drug_interaction_checker", "tool_args": {"drug_list": names}})
+
+        if COMPARISON_PATTERN.search(q):
+            plan.append({"tool_name": "comparative_analysis", "tool_args": {"drug_names": names}})
+
+    elif INTERACTION_PATTERN.search(q) or COMPARISON_PATTERN.search(q):
+        # Single drug + "alternatives"/"interactions": the comparison tables
+        # and interaction scenarios are both keyed by drug, so a plain lookup
+        # on each collection covers it
+        plan.append({"tool_name": "drug_interaction_checker", "tool_args": {"drug_list": names}})
+        plan.append({"tool_name": "comparative_analysis", "tool_args": {"drug_names": names}})
+
+    if REIMBURSEMENT_PATTERN.search(q):
+        plan += [
+            {"tool_name": "reimbursement_navigator", "tool_args": {"drug_name": name}}
+            for name in names
+        ]
+
+    return plan
@@ -1,4 +1,4 @@
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
 
 SYSTEM_PROMPT = """
 You are a Medical Representative AI Assistant (Project DMR) designed for healthcare professionals.
@@ -119,3 +119,29 @@ promt_user = ChatPromptTemplate.from_messages([
     ("human", USER_PROMPT_TEMPLATE_USER)
 ])
 
+
+HISTORY_SUMMARY_TEMPLATE = """
+You maintain a running summary of a conversation between a doctor and a Medical Representative AI assistant.
+
+Fold the new conversation turns into the existing summary.
+
+Guidelines:
+- Keep every drug, dose, patient attribute (age, comorbidities, current medications) and scheme (CGHS, ESIC, PM-JAY, Jan Aushadhi) that was mentioned.
+- Keep conclusions reached about interactions, coverage and prices.
+- Drop greetings, filler and repeated information.
+- Write compact factual sentences, at most 150 words.
+- Output only the updated summary.
+
+Existing Summary:
+{summary}
+
+New Conversation Turns:
+{transcript}
+
+Updated Summary:
+"""
+
+history_summary_prompt = PromptTemplate(
+    template=HISTORY_SUMMARY_TEMPLATE,
+    input_variables=["summary", "transcript"],
+)
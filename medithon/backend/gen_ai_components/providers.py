@@ -0,0 +1,257 @@
+import os
+import shutil
+import time
+import uuid
+import weakref
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from openai import OpenAI
+
+try:
+    from gen_ai_components.caches import EMBEDDING_CACHE_SIZE, TTLCache
+except ImportError:
+    from caches import EMBEDDING_CACHE_SIZE, TTLCache
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Point every OpenAI client at another OpenAI-compatible server (e.g. a local
+# mock for load tests). Unset = api.openai.com.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Vector store root shared by the chains, the agent tools and populate_db.
+# Unset = each caller's historical default.
+VECTOR_DIR = os.getenv("VECTOR_DIR") or None
+
+# Serve retrieval from a memory-mapped snapshot (see snapshot.py) instead of
+# the Chroma stores. A snapshot directory or a root with a CURRENT file.
+KB_SNAPSHOT = os.getenv("KB_SNAPSHOT") or None
+
+# Newest versions of each Chroma collection kept when old ones are pruned
+# (see publish_collection and prune_collection_versions)
+VECTOR_KEEP_VERSIONS = int(os.getenv("VECTOR_KEEP_VERSIONS", "3"))
+
+
+# =============================================================================
+# MODEL FACTORIES
+# =============================================================================
+
+_chat_factory: Optional[Callable[..., BaseChatModel]] = None
+_embeddings_factory: Optional[Callable[..., Embeddings]] = None
+
+
+def override(chat: Optional[Callable[..., BaseChatModel]] = None, embeddings: Optional[Callable[..., Embeddings]] = None):
+    """
+    Replaces the model factories (benchmarks, offline runs). Must be called
+    before the chain modules are imported, since they build models at import.
+    """
+    global _chat_factory, _embeddings_factory
+    _chat_factory = chat
+    _embeddings_factory = embeddings
+
+
+def get_chat_model(model: str, temperature: float = 0, **kwargs) -> BaseChatModel:
+    if _chat_factory is not None:
+        return _chat_factory(model=model, temperature=temperature, **kwargs)
+    return ChatOpenAI(model=model, temperature=temperature, base_url=OPENAI_BASE_URL, **kwargs)
+
+
+def get_embeddings(model: str = "text-embedding-3-small", **kwargs) -> Embeddings:
+    if _embeddings_factory is not None:
+        return _embeddings_factory(model=model, **kwargs)
+    return OpenAIEmbeddings(model=model, base_url=OPENAI_BASE_URL, **kwargs)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Remembers embeddings of recent texts, so the same query is embedded once
+    across the four retrievers, repeated questions and warm-up. Embeddings
+    depend only on the text, so knowledge-base swaps leave the cache alone.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.cache = TTLCache("embedding", max_entries, data_dependent=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [self.cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # One call for every text not seen yet
+            for i, vector in zip(missing, self.embeddings.embed_documents([texts[i] for i in missing])):
+                vectors[i] = vector
+                self.cache.put(texts[i], vector)
+        return vectors
+
+
+def get_openai_client(**kwargs) -> OpenAI:
+    """Raw OpenAI client for the tool-calling agent."""
+    return OpenAI(base_url=OPENAI_BASE_URL, **kwargs)
+
+
+def vector_dir(default: str) -> str:
+    return VECTOR_DIR or default
+
+
+# =============================================================================
+# VECTOR STORES
+# =============================================================================
+
+@lru_cache(maxsize=4)
+def _load_snapshot(path: str):
+    try:
+        from gen_ai_components.snapshot import Snapshot
+    except ImportError:
+        from snapshot import Snapshot
+    return Snapshot(path)
+
+
+# Chroma store -> (client identifier, System) it was opened on. The client
+# looks its System up by identifier on every use, so once the directory is
+# reopened (or dropped from Chroma's cache) only this reference still
+# reaches the original.
+_chroma_systems: "weakref.WeakKeyDictionary[Chroma, tuple]" = weakref.WeakKeyDictionary()
+
+
+def open_chroma(persist_directory: str, embedding_function: Optional[Embeddings] = None) -> Chroma:
+    """Chroma store at persist_directory, remembering its System for close_vector_store()."""
+    store = Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
+    try:
+        client = store._client
+        _chroma_systems[store] = (client._identifier, client._system)
+    except (AttributeError, KeyError):
+        pass
+    return store
+
+
+def open_vector_store(name: str, embedding_function: Embeddings, root: str, snapshot: Optional[str] = KB_SNAPSHOT):
+    """Chroma store root/name, or the same collection from a snapshot (KB_SNAPSHOT by default)."""
+    if snapshot:
+        return _load_snapshot(snapshot).collection(name, embedding_function)
+    return open_chroma(collection_dir(root, name), embedding_function)
+
+
+def close_vector_store(store):
+    """
+    Stops the Chroma System a store was opened on (see open_chroma) and,
+    if Chroma's per-directory cache still maps to it, drops it from there.
+    A newer System for the same directory is left alone. Snapshot stores
+    hold nothing to release.
+    """
+    entry = _chroma_systems.pop(store, None)
+    if entry is None:
+        return
+    identifier, system = entry
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        systems = SharedSystemClient._identifier_to_system
+        if systems.get(identifier) is system:
+            del systems[identifier]
+        system.stop()
+    except (ImportError, AttributeError, KeyError) as e:
+        print(f"⚠️ Could not release Chroma store: {e}")
+
+
+# =============================================================================
+# COLLECTION VERSIONS
+# =============================================================================
+#
+# populate_db writes each collection as a new directory <root>/<name>/v<stamp>
+# and then points <root>/<name>/CURRENT at it, the way snapshot.py publishes
+# snapshots: readers open the old version or the new one, never a gap or a
+# partial build. A <root>/<name> holding chroma.sqlite3 directly (built before
+# versioning) is read as is until the first versioned build replaces it.
+
+CURRENT_FILE = "CURRENT"
+VERSION_PREFIX = "v"
+LEGACY_VERSION = "legacy"
+
+
+def collection_dir(root: str, name: str) -> str:
+    """The directory of the current version of collection `name`."""
+    container = os.path.join(root, name)
+    current = os.path.join(container, CURRENT_FILE)
+    if os.path.exists(current):
+        with open(current, encoding="utf-8") as f:
+            return os.path.join(container, f.read().strip())
+    return container
+
+
+def new_collection_version() -> str:
+    """A version name that sorts by build time."""
+    ns = time.time_ns()
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(ns // 10**9))
+    return f"{VERSION_PREFIX}{stamp}.{ns % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+
+
+def publish_collection(root: str, name: str, build_dir: str) -> str:
+    """Moves a finished build into the collection as a new version and makes it current."""
+    container = os.path.join(root, name)
+    os.makedirs(container, exist_ok=True)
+    version = new_collection_version()
+    os.rename(build_dir, os.path.join(container, version))
+    tmp = os.path.join(container, f"{CURRENT_FILE}.tmp-{uuid.uuid4().hex[:8]}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(container, CURRENT_FILE))
+    return os.path.join(container, version)
+
+
+def collection_versions(root: str, name: str) -> List[str]:
+    """Versions on disk, oldest first; LEGACY_VERSION stands for an unversioned store in the container."""
+    container = os.path.join(root, name)
+    if not os.path.isdir(container):
+        return []
+    entries = os.listdir(container)
+    versions = sorted(e for e in entries if e.startswith(VERSION_PREFIX) and os.path.isdir(os.path.join(container, e)))
+    if "chroma.sqlite3" in entries:
+        versions.insert(0, LEGACY_VERSION)
+    return versions
+
+
+def _remove_version(container: str, version: str):
+    if version != LEGACY_VERSION:
+        shutil.rmtree(os.path.join(container, version), ignore_errors=True)
+        return
+    # The pre-versioning store: Chroma's database file and its segment directories
+    for entry in os.listdir(container):
+        path = os.path.join(container, entry)
+        if entry.startswith("chroma.sqlite3"):
+            os.remove(path)
+        elif os.path.isdir(path) and not entry.startswith(VERSION_PREFIX):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def prune_collection_versions(root: str, name: str, keep: int = VECTOR_KEEP_VERSIONS,
+                              protect: Optional[List[str]] = None) -> List[str]:
+    """
+    Deletes all but the newest `keep` versions of a collection. The current
+    version and any in `protect` (directories a process still reads) are
+    never deleted. Returns the versions removed.
+    """
+    container = os.path.join(root, name)
+    if not os.path.exists(os.path.join(container, CURRENT_FILE)):
+        return []
+    current = os.path.basename(collection_dir(root, name))
+    protected = {current}
+    for path in protect or ():
+        path = os.path.normpath(path)
+        protected.add(LEGACY_VERSION if path == os.path.normpath(container) else os.path.basename(path))
+    versions = collection_versions(root, name)
+    removed = [v for v in versions[:max(0, len(versions) - keep)] if v not in protected]
+    for version in removed:
+        _remove_version(container, version)
+    return removed
@@ -1,12 +1,16 @@
 import os
+import time
 import requests
 from dotenv import load_dotenv
 
+from gen_ai_components.metrics import metrics
+
 # Find .env in the same directory as this file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
 
 def serp_search(query: str, num: int = 7, gl: str = "in", hl: str = "en"):
     """
@@ -24,8 +28,9 @@ def serp_search(query: str, num: int = 7, gl: str = "in", hl: str = "en"):
         "hl": hl,
     }
 
+    start = time.perf_counter()
     try:
-        r = requests.get("https://serpapi.com/search.json", params=params, timeout=20)
+        r = requests.get(SERPAPI_URL, params=params, timeout=20)
         r.raise_for_status()
         data = r.json()
 
@@ -41,4 +46,8 @@ def serp_search(query: str, num: int = 7, gl: str = "in", hl: str = "en"):
         ]
         return results
     except Exception as e:
+        # Errors are returned, not raised, so they are counted here
+        metrics.inc("stage_errors_total", stage="serp_search", error=type(e).__name__)
         return {"error": str(e)}
+    finally:
+        metrics.observe_stage("serp_search", time.perf_counter() - start)
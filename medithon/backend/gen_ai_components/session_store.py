@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are locked within a process only
+    fcntl = None
+
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "./sessions.sqlite3")
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+# Histories each worker keeps in memory in front of SQLite (0 = always read the file)
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "1000"))
+
+# Number of lock stripes used to serialize requests per session_id
+LOCK_STRIPES = 256
+
+
+# =============================================================================
+# PER-SESSION LOCKING
+# =============================================================================
+
+_session_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_lock_file = None
+_lock_file_guard = threading.Lock()
+
+
+def _stripe_lock_fd() -> int:
+    """Lock file beside the SQLite database; stripe i is byte i. Opened once per process."""
+    global _lock_file
+    with _lock_file_guard:
+        if _lock_file is None:
+            _lock_file = open(SESSION_DB_PATH + ".lock", "a+b")
+        return _lock_file.fileno()
+
+
+@contextmanager
+def session_lock(session_id: str):
+    """
+    Serializes concurrent requests on the same session_id.
+
+    Locks are striped, so memory stays constant however many sessions exist
+    and different sessions almost always proceed in parallel. With the
+    sqlite store several worker processes share the histories, so the
+    stripe is also held as a byte-range lock on a shared lock file (released
+    by the OS if a worker dies mid-request). POSIX record locks belong to the
+    process, which is why the thread lock is taken first.
+    """
+    stripe = zlib.crc32(session_id.encode("utf-8")) % LOCK_STRIPES
+    with _session_locks[stripe]:
+        if fcntl is None or SESSION_STORE != "sqlite":
+            yield
+            return
+        fd = _stripe_lock_fd()
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, stripe)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, stripe)
+
+
+# =============================================================================
+# IN-MEMORY TIER (LRU + IDLE TTL)
+# =============================================================================
+
+class InMemorySessionStore:
+    """
+    Bounded session store: least recently used sessions are evicted once
+    max_sessions is reached, and sessions idle for longer than idle_ttl
+    seconds are dropped.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX, idle_ttl: float = SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        # session_id -> [history, last_access]; order = least recently used first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _evict(self, now: float):
+        # Access order == LRU order, so expired sessions are always at the front
+        while self._sessions:
+            _, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = [ChatMessageHistory(), now]
+            else:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return entry[0]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# =============================================================================
+# SQLITE TIER (SHARED ACROSS WORKER PROCESSES)
+# =============================================================================
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    """Chat history backed by a SQLiteSessionStore row set."""
+
+    def __init__(self, store: "SQLiteSessionStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.store.load_messages(self.session_id)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.append_messages(self.session_id, messages)
+
+    def replace_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Atomically swaps the whole history (used when folding old turns)."""
+        self.store.append_messages(self.session_id, messages, replace=True)
+
+    def clear(self) -> None:
+        self.store.delete(self.session_id)
+
+
+class SQLiteSessionStore:
+    """
+    Session store in a WAL-mode SQLite file, so every worker process sees
+    the same history. Appends are single transactions; idle sessions are
+    purged periodically.
+
+    Each worker keeps up to cache_max recently read histories in memory,
+    tagged with the session's newest message id. Message ids are never
+    reused and every write inserts new rows, so a read costs one indexed
+    lookup while the history is unchanged, and another worker's turn is
+    picked up on the next read.
+    """
+
+    # Run the idle-session purge every N lookups
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str = SESSION_DB_PATH, idle_ttl: float = SESSION_TTL_SECONDS,
+                 cache_max: int = SESSION_CACHE_MAX):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.cache_max = cache_max
+        self._local = threading.local()
+        self._lookups = 0
+        # session_id -> (version, messages); order = least recently used first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> BaseChatMessageHistory:
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO sessions(session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time())
+        )
+
+        self._lookups += 1
+        if self._lookups % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+        return SQLiteChatMessageHistory(self, session_id)
+
+    @staticmethod
+    def _version(conn: sqlite3.Connection, session_id: str) -> int:
+        row = conn.execute("SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] or 0
+
+    def _cached(self, session_id: str, version: int) -> Optional[List[BaseMessage]]:
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._cache.move_to_end(session_id)
+            return list(entry[1])
+
+    def _remember(self, session_id: str, version: int, messages: List[BaseMessage]):
+        if self.cache_max <= 0:
+            return
+        with self._cache_lock:
+            self._cache[session_id] = (version, list(messages))
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+
+    def _forget(self, session_id: str):
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
+
+    def load_messages(self, session_id: str) -> List[BaseMessage]:
+        conn = self._conn()
+        with conn:
+            # One read transaction: the version and the rows come from the same snapshot
+            conn.execute("BEGIN")
+            version = self._version(conn, session_id)
+            messages = self._cached(session_id, version)
+            if messages is not None:
+                return messages
+            rows = conn.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        messages = messages_from_dict([json.loads(row[0]) for row in rows])
+        self._remember(session_id, version, messages)
+        return messages
+
+    def append_messages(self, session_id: str, messages: Sequence[BaseMessage], replace: bool = False):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = self._version(conn, session_id)
+            if replace:
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO messages(session_id, message) VALUES (?, ?)",
+                [(session_id, json.dumps(message_to_dict(m))) for m in messages]
+            )
+            written = self._version(conn, session_id)
+        # Keep the cached copy current when it was the version just written over
+        if replace:
+            self._remember(session_id, written, list(messages))
+        else:
+            previous = self._cached(session_id, version)
+            if previous is None:
+                self._forget(session_id)
+            else:
+                self._remember(session_id, written, previous + list(messages))
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._forget(session_id)
+
+    def purge_expired(self) -> int:
+        """Deletes sessions idle for longer than idle_ttl. Returns the count."""
+        cutoff = time.time() - self.idle_ttl
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE last_access < ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,)).rowcount
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+# =============================================================================
+# FACTORY
+# =============================================================================
+
+def build_session_store(kind: Optional[str] = None):
+    """Returns the session store selected by SESSION_STORE ("memory" or "sqlite")."""
+    kind = kind or SESSION_STORE
+    if kind == "memory":
+        return InMemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
@@ -0,0 +1,77 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    from gen_ai_components.metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question, for coalescing."""
+    return " ".join((text or "").lower().split())
+
+
+def query_key(mode: str, query: str, version: str) -> Tuple[str, str, str]:
+    """
+    Coalescing key of a stateless query. `version` is the knowledge-base
+    generation the request is pinned to, so answers never cross versions,
+    even while a request that started before a swap is still finishing.
+    """
+    return mode, normalize_query(query), version
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller (the leader) runs fn; callers arriving while it runs
+    wait and receive the same result, or the same exception. Nothing is kept
+    once the call finishes, so this deduplicates bursts without caching.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared); shared is True when another request computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            metrics.inc("single_flight_requests_total", flight=self.name, role="follower")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.inc("single_flight_requests_total", flight=self.name, role="leader")
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
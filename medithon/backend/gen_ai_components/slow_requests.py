@@ -0,0 +1,242 @@
+"""
+Slow-request recorder.
+
+Every traced request collects per-stage timings, token usage and whatever
+the pipeline notes along the way (refined query, retrieved chunk ids and
+scores per collection, context tokens). Requests slower than
+SLOW_REQUEST_MS are written to a size-capped ring file: two segments of
+at most SLOW_REQUEST_MAX_BYTES / 2 each, the older one overwritten on
+rotation.
+
+Run from backend/:
+    python -m gen_ai_components.slow_requests list -n 20
+    python -m gen_ai_components.slow_requests show <record id>
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from gen_ai_components.metrics import metrics
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "slow_requests.jsonl")
+SLOW_REQUEST_MAX_BYTES = int(os.getenv("SLOW_REQUEST_MAX_BYTES", str(10 * 2**20)))
+
+
+# =============================================================================
+# REQUEST TRACE
+# =============================================================================
+
+class RequestTrace:
+    """What one request did: stage timings, usage and notes from the pipeline."""
+
+    def __init__(self, endpoint: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.timestamp = datetime.utcnow().isoformat()
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.usage: List[Dict[str, Any]] = []
+        self.notes: Dict[str, Any] = {}
+        # Retrievers for different collections run in parallel threads
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages.append({"stage": stage, "ms": round(seconds * 1000, 1)})
+
+    def add_usage(self, stage: str, usage: Dict[str, Any]):
+        with self._lock:
+            self.usage.append({"stage": stage, **usage})
+
+    def note(self, key: str, value: Any):
+        with self._lock:
+            self.notes[key] = value
+
+    def note_chunks(self, collection: str, chunks: List[Dict[str, Any]]):
+        with self._lock:
+            self.notes.setdefault("chunks", {})[collection] = chunks
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self, status: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "timestamp": self.timestamp,
+            "endpoint": self.endpoint,
+            "status": status,
+            "total_ms": round(self.elapsed_ms(), 1),
+            "stages": self.stages,
+            "usage": self.usage,
+            **self.notes,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def note(key: str, value: Any):
+    """Attaches a value to the current request's trace (no-op outside a request)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.note(key, value)
+
+
+def note_chunks(collection: str, chunks: List[Dict[str, Any]]):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.note_chunks(collection, chunks)
+
+
+def _on_metric(kind: str, stage: str, value: Any):
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    if kind == "stage":
+        trace.add_stage(stage, value)
+    elif kind == "tokens":
+        trace.add_usage(stage, value)
+
+
+metrics.add_listener(_on_metric)
+
+
+# =============================================================================
+# RING FILE
+# =============================================================================
+
+class SlowRequestLog:
+    """Append-only JSONL in two segments; total size stays under max_bytes."""
+
+    def __init__(self, path: str = SLOW_REQUEST_LOG, max_bytes: int = SLOW_REQUEST_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def previous_path(self) -> str:
+        return self.path + ".1"
+
+    def append(self, record: Dict[str, Any]):
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if size and size + len(line) > self.max_bytes // 2:
+                os.replace(self.path, self.previous_path)
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """All records, oldest first."""
+        for path in (self.previous_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+slow_request_log = SlowRequestLog()
+
+
+# =============================================================================
+# TRACING
+# =============================================================================
+
+@contextmanager
+def trace_request(endpoint: str, threshold_ms: Optional[float] = None, log: Optional[SlowRequestLog] = None):
+    """Traces the block; writes the trace to the ring file if it took >= threshold_ms."""
+    threshold_ms = SLOW_REQUEST_MS if threshold_ms is None else threshold_ms
+    log = log or slow_request_log
+    trace = RequestTrace(endpoint)
+    token = _current_trace.set(trace)
+    status = {"code": 200}
+    try:
+        yield status
+    except Exception:
+        status["code"] = 500
+        raise
+    finally:
+        _current_trace.reset(token)
+        if trace.elapsed_ms() >= threshold_ms:
+            try:
+                log.append(trace.to_dict(status["code"]))
+            except Exception as e:
+                print(f"Slow-request record failed: {e}")
+
+
+def record_slow_requests(view):
+    """Flask view decorator: traces the request and records it when slow."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with trace_request(view.__name__) as status:
+            result = view(*args, **kwargs)
+            if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+                status["code"] = result[1]
+            return result
+    return wrapper
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def _slowest_stage(record: Dict[str, Any]) -> str:
+    if not record.get("stages"):
+        return "-"
+    stage = max(record["stages"], key=lambda s: s["ms"])
+    return f"{stage['stage']} ({stage['ms']:.0f} ms)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=SLOW_REQUEST_LOG, help="slow-request ring file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = sub.add_parser("list", help="most recent slow requests")
+    list_parser.add_argument("-n", type=int, default=20)
+    list_parser.add_argument("--endpoint", help="only this endpoint (query, transcribe, search)")
+    list_parser.add_argument("--sort", choices=["recent", "slowest"], default="recent")
+
+    show_parser = sub.add_parser("show", help="full record")
+    show_parser.add_argument("id")
+
+    args = parser.parse_args()
+    records = list(SlowRequestLog(args.log).records())
+
+    if args.command == "list":
+        if args.endpoint:
+            records = [r for r in records if r["endpoint"] == args.endpoint]
+        if args.sort == "slowest":
+            records.sort(key=lambda r: r["total_ms"])
+        print(f"{'id':<13} {'timestamp':<20} {'endpoint':<11} {'status':>6} {'total ms':>9}  slowest stage")
+        for r in records[-args.n:][::-1]:
+            print(f"{r['id']:<13} {r['timestamp'][:19]:<20} {r['endpoint']:<11} {str(r['status']):>6} "
+                  f"{r['total_ms']:>9.0f}  {_slowest_stage(r)}")
+    else:
+        matches = [r for r in records if r["id"].startswith(args.id)]
+        if not matches:
+            raise SystemExit(f"No slow request with id {args.id}")
+        print(json.dumps(matches[-1], indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
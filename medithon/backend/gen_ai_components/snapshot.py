@@ -0,0 +1,408 @@
+"""
+Compact, versioned snapshot of the vector stores.
+
+A snapshot is a directory holding every collection in three flat files:
+
+    embeddings.npy   (rows x dim) float16 or float32, L2-normalized
+    records.jsonl    one {"id", "text", "metadata"} per row, same order
+    manifest.json    format, dtype, dim, embedding model, per-collection
+                     row ranges and the sha256 of every file
+
+and optionally a compact search index built at export time:
+
+    index.npy        (rows x index_dim) int8 or float16: the first index_dim
+                     components of each embedding, renormalized
+    index_scale.npy  (rows,) float32 per-vector scale of the int8 codes
+
+text-embedding-3 vectors can be shortened by truncation (that is what the
+API's `dimensions` parameter does), so the query needs no second embedding
+call. With an index, a search scans only the index, then re-scores the best
+k * SNAPSHOT_RESCORE_FACTOR candidates against the full-precision rows; the
+full matrix stays on disk except for the rows it touches. At 256 dims int8
+a row is 260 bytes against 6144 for 1536 float32.
+
+Snapshots live side by side under a root directory (<root>/<version>/) with
+<root>/CURRENT naming the active one. Loading memory-maps the matrix
+(np.load(mmap_mode="r")), so every worker process shares one page-cached
+copy and starts without rebuilding an HNSW index.
+
+Run from backend/:
+    python -m gen_ai_components.snapshot export --out snapshots --dtype float16
+    python -m gen_ai_components.snapshot export --out snapshots --index-dim 256 --index-dtype int8
+    python -m gen_ai_components.snapshot info snapshots
+    python -m gen_ai_components.snapshot import snapshots --vector-dir ./Vector
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.jsonl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.npy"
+INDEX_SCALE_FILE = "index_scale.npy"
+
+# Candidates re-scored at full precision per requested result (0 = index scores only)
+RESCORE_FACTOR = int(os.getenv("SNAPSHOT_RESCORE_FACTOR", "8"))
+
+COLLECTIONS = ("Vector_drugs_master", "Vector_interactions", "Vector_reimbursement", "Vector_comparisons")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve(path: str) -> str:
+    """A snapshot directory, or a root whose CURRENT file names one."""
+    current = os.path.join(path, CURRENT_FILE)
+    if os.path.exists(current):
+        with open(current, encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    return path
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def build_index(matrix: np.ndarray, dim: Optional[int] = None,
+                dtype: str = "int8") -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Shortens the rows to `dim` components and stores them as `dtype`.
+    int8 uses a symmetric per-row scale (max |x| / 127); returns (codes, scales).
+    """
+    reduced = normalize(np.asarray(matrix, dtype=np.float32)[:, :dim or matrix.shape[1]])
+    if dtype != "int8":
+        return reduced.astype(dtype), None
+    scales = np.abs(reduced).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(reduced / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+# =============================================================================
+# METADATA FILTERS
+# =============================================================================
+
+def matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """The subset of Chroma's `where` syntax the retrievers use: equality, $eq, $ne, $in, $and, $or."""
+    for key, condition in where.items():
+        if key == "$or":
+            if not any(matches(metadata, c) for c in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            (op, value), = condition.items()
+            actual = metadata.get(key)
+            if op == "$eq" and actual != value:
+                return False
+            if op == "$ne" and actual == value:
+                return False
+            if op == "$in" and actual not in value:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+# =============================================================================
+# LOAD
+# =============================================================================
+
+class Snapshot:
+    """A loaded snapshot: memory-mapped matrix plus records, sliced per collection."""
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = resolve(path)
+        with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.manifest['format']} in {self.path}")
+        if verify:
+            for name, expected in self.manifest["sha256"].items():
+                if _sha256(os.path.join(self.path, name)) != expected:
+                    raise ValueError(f"Checksum mismatch for {name} in {self.path}")
+
+        self.matrix = np.load(os.path.join(self.path, EMBEDDINGS_FILE), mmap_mode="r")
+        self.index = self.index_scale = None
+        if self.manifest.get("index"):
+            self.index = np.load(os.path.join(self.path, INDEX_FILE), mmap_mode="r")
+            if self.manifest["index"]["dtype"] == "int8":
+                self.index_scale = np.load(os.path.join(self.path, INDEX_SCALE_FILE), mmap_mode="r")
+        with open(os.path.join(self.path, RECORDS_FILE), encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f]
+        if len(self.records) != self.matrix.shape[0]:
+            raise ValueError(f"{self.path}: {len(self.records)} records for {self.matrix.shape[0]} embeddings")
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @property
+    def index_bytes(self) -> int:
+        """Bytes a full scan reads: the index if there is one, else the matrix."""
+        if self.index is None:
+            return int(self.matrix.nbytes)
+        return int(self.index.nbytes + (self.index_scale.nbytes if self.index_scale is not None else 0))
+
+    def collection(self, name: str, embedding_function: Embeddings) -> "SnapshotRetriever":
+        start, end = self.manifest["collections"][name]
+        return SnapshotRetriever(self, name, start, end, embedding_function)
+
+
+class SnapshotRetriever:
+    """
+    Cosine top-k over one collection's rows. Exposes the Chroma methods the
+    chains and tools call (similarity_search[_with_score], with a `where`
+    filter) and scores on Chroma's scale, so it can stand in for a Chroma
+    store.
+
+    Exact over the full matrix, or, when the snapshot has an index, a scan
+    of the index followed by a full-precision re-score of the top
+    k * rescore_factor candidates.
+    """
+
+    def __init__(self, snapshot: Snapshot, name: str, start: int, end: int, embedding_function: Embeddings,
+                 rescore_factor: int = RESCORE_FACTOR):
+        self.snapshot = snapshot
+        self.name = name
+        self.start, self.end = start, end
+        self.embedding_function = embedding_function
+        self.rescore_factor = rescore_factor
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def _rows(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        rows = np.arange(self.start, self.end)
+        if where:
+            rows = np.array([i for i in rows if matches(self.snapshot.records[i]["metadata"], where)], dtype=np.int64)
+        return rows
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors_with_score([embedding], k, filter)[0]
+
+    def similarity_search_by_vectors_with_score(self, embeddings: List[List[float]], k: int = 4,
+                                                filter: Optional[Dict[str, Any]] = None
+                                                ) -> List[List[Tuple[Document, float]]]:
+        """One top-k per query vector; the scan is a single matrix product over the filtered rows."""
+        rows = self._rows(filter)
+        if rows.size == 0:
+            return [[] for _ in embeddings]
+        queries = normalize(embeddings)
+        k = min(k, rows.size)
+        index = self.snapshot.index
+        if index is None:
+            # float16 rows are widened per call; the mapped file itself is never copied whole
+            scores = np.asarray(self.snapshot.matrix[rows], dtype=np.float32) @ queries.T
+            return [self._top(rows, scores[:, j], k) for j in range(len(queries))]
+
+        # int8 codes are widened per call; the mapped file itself is never copied whole
+        coarse = np.asarray(index[rows], dtype=np.float32) @ normalize(queries[:, :index.shape[1]]).T
+        if self.snapshot.index_scale is not None:
+            coarse *= self.snapshot.index_scale[rows][:, None]
+        results = []
+        for j, query in enumerate(queries):
+            candidates, scores = rows, coarse[:, j]
+            if self.rescore_factor:
+                n = k * self.rescore_factor
+                if n < rows.size:
+                    candidates = rows[np.argpartition(-scores, n - 1)[:n]]
+                scores = np.asarray(self.snapshot.matrix[candidates], dtype=np.float32) @ query
+            results.append(self._top(candidates, scores, k))
+        return results
+
+    def _top(self, rows: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            record = self.snapshot.records[rows[i]]
+            doc = Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+            # Chroma's default metric, squared L2, which is 2 - 2*cosine on unit vectors
+            results.append((doc, float(2 - 2 * scores[i])))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+
+# =============================================================================
+# EXPORT / IMPORT
+# =============================================================================
+
+def export_snapshot(vector_root: str, out_root: str, dtype: str = "float16",
+                    embedding_model: str = "text-embedding-3-small",
+                    index_dim: Optional[int] = None, index_dtype: Optional[str] = None) -> str:
+    """
+    Writes every Chroma collection under vector_root into a new snapshot; returns its path.
+    index_dim and/or index_dtype add a reduced-dimension / quantized search index.
+    """
+    from langchain_chroma import Chroma
+    try:
+        from gen_ai_components.providers import collection_dir
+    except ImportError:
+        from providers import collection_dir
+
+    vectors, records, collections = [], [], {}
+    for name in COLLECTIONS:
+        persist_dir = collection_dir(vector_root, name)
+        if not os.path.exists(persist_dir):
+            print(f"⚠️ Missing collection: {persist_dir}")
+            continue
+        stored = Chroma(persist_directory=persist_dir).get(include=["embeddings", "documents", "metadatas"])
+        start = len(records)
+        for id_, embedding, text, metadata in zip(stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"]):
+            vectors.append(embedding)
+            records.append({"id": id_, "text": text, "metadata": metadata or {}})
+        collections[name] = [start, len(records)]
+        print(f"   {name}: {len(records) - start} rows")
+
+    if not records:
+        raise ValueError(f"No collections found under {vector_root}")
+    full = normalize(vectors)
+    matrix = full.astype(dtype)
+    index = None
+    if index_dim or index_dtype:
+        index_dtype = index_dtype or "int8"
+        if index_dim and not 0 < index_dim < full.shape[1]:
+            raise ValueError(f"index_dim must be between 1 and {full.shape[1] - 1}")
+        index, scales = build_index(full, index_dim, index_dtype)
+
+    digest = hashlib.sha256(matrix.tobytes() + json.dumps(records, sort_keys=True).encode("utf-8")
+                            + (index.tobytes() if index is not None else b"")).hexdigest()
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+    path = os.path.join(out_root, version)
+    os.makedirs(path)
+
+    np.save(os.path.join(path, EMBEDDINGS_FILE), matrix)
+    files = [EMBEDDINGS_FILE, RECORDS_FILE]
+    if index is not None:
+        np.save(os.path.join(path, INDEX_FILE), index)
+        files.append(INDEX_FILE)
+        if scales is not None:
+            np.save(os.path.join(path, INDEX_SCALE_FILE), scales)
+            files.append(INDEX_SCALE_FILE)
+    with open(os.path.join(path, RECORDS_FILE), "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": embedding_model,
+        "dtype": dtype,
+        "dim": int(matrix.shape[1]),
+        "rows": len(records),
+        "index": {"dim": int(index.shape[1]), "dtype": index_dtype} if index is not None else None,
+        "collections": collections,
+        "sha256": {name: _sha256(os.path.join(path, name)) for name in files},
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Point CURRENT at the new version atomically; a temp name of its own per export
+    fd, tmp = tempfile.mkstemp(prefix=CURRENT_FILE + ".", suffix=".tmp", dir=out_root)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(out_root, CURRENT_FILE))
+    return path
+
+
+def import_snapshot(path: str, vector_root: str):
+    """
+    Rebuilds the Chroma stores from a snapshot without calling the embeddings
+    API; each is published as a new collection version, like populate_db does.
+    """
+    import uuid
+
+    try:
+        from gen_ai_components.providers import close_vector_store, open_chroma, publish_collection
+    except ImportError:
+        from providers import close_vector_store, open_chroma, publish_collection
+
+    snapshot = Snapshot(path, verify=True)
+    for name, (start, end) in snapshot.manifest["collections"].items():
+        build_dir = os.path.join(vector_root, f"{name}.import-{uuid.uuid4().hex[:8]}")
+        db = open_chroma(build_dir)
+        try:
+            records = snapshot.records[start:end]
+            for i in range(0, len(records), 500):
+                batch = records[i:i + 500]
+                db._collection.upsert(
+                    ids=[r["id"] for r in batch],
+                    embeddings=np.asarray(snapshot.matrix[start + i:start + i + len(batch)],
+                                          dtype=np.float32).tolist(),
+                    documents=[r["text"] for r in batch],
+                    metadatas=[r["metadata"] or None for r in batch],
+                )
+            close_vector_store(db)
+            publish_collection(vector_root, name, build_dir)
+        finally:
+            # Published builds have been moved away; anything left here is a failed one
+            close_vector_store(db)
+            shutil.rmtree(build_dir, ignore_errors=True)
+        print(f"   {name}: {end - start} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="write the Chroma stores into a new snapshot")
+    export_parser.add_argument("--vector-dir", default=os.getenv("VECTOR_DIR") or "./Vector")
+    export_parser.add_argument("--out", default="snapshots", help="snapshot root directory")
+    export_parser.add_argument("--dtype", choices=["float16", "float32"], default="float16",
+                               help="precision of the full matrix (used for re-scoring)")
+    export_parser.add_argument("--index-dim", type=int, help="also build a search index at this many dims, e.g. 256")
+    export_parser.add_argument("--index-dtype", choices=["int8", "float16"],
+                               help="search index precision (default int8 when --index-dim is given)")
+
+    info_parser = sub.add_parser("info", help="print a snapshot's manifest and verify checksums")
+    info_parser.add_argument("path")
+
+    import_parser = sub.add_parser("import", help="rebuild Chroma stores from a snapshot")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--vector-dir", default=os.getenv("VECTOR_DIR") or "./Vector")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        path = export_snapshot(args.vector_dir, args.out, args.dtype,
+                               index_dim=args.index_dim, index_dtype=args.index_dtype)
+        print(f"✅ Snapshot written to {path}")
+    elif args.command == "info":
+        snapshot = Snapshot(args.path, verify=True)
+        size = sum(os.path.getsize(os.path.join(snapshot.path, n)) for n in snapshot.manifest["sha256"])
+        print(json.dumps(snapshot.manifest, indent=2))
+        print(f"{size / 2**20:.1f} MB on disk, {snapshot.index_bytes / 2**20:.2f} MB scanned per query, checksums OK")
+    else:
+        import_snapshot(args.path, args.vector_dir)
+        print("✅ Stores rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import whisper
 import tempfile
 import os
 
+from gen_ai_components.metrics import metrics
+
 # Load model once at import time (using "base" for a good speed/accuracy balance)
 _model = None
 
@@ -28,8 +30,9 @@ def transcribe_audio(audio_file) -> str:
         tmp_path = tmp.name
 
     try:
-        model = get_model()
-        result = model.transcribe(tmp_path, fp16=False)
+        with metrics.timer("transcribe_audio"):
+            model = get_model()
+            result = model.transcribe(tmp_path, fp16=False)
         return result["text"].strip()
     finally:
         os.unlink(tmp_path)
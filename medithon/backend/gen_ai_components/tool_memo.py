@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from gen_ai_components.metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+# Rough chars-per-token ratio for English medical text (good enough for budgeting)
+CHARS_PER_TOKEN = 4
+
+# Max tokens a single tool result may add to the message list
+TOOL_RESULT_TOKEN_BUDGET = 1200
+
+MAX_SESSIONS = 256
+MAX_ENTRIES_PER_SESSION = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting prompt size."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _canonical_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, (list, tuple)):
+        items = [_canonical_value(v) for v in value]
+        # Drug lists are sets: "A vs B" and "B vs A" resolve to the same data
+        if all(isinstance(v, str) for v in items):
+            return sorted(items)
+        return items
+    if isinstance(value, dict):
+        return {k: _canonical_value(v) for k, v in value.items()}
+    return value
+
+
+def canonical_key(tool_name: str, tool_args: Dict) -> Tuple[str, str]:
+    """Memo key: (tool_name, canonicalized JSON args)."""
+    return tool_name, json.dumps(_canonical_value(tool_args), sort_keys=True)
+
+
+def chunk_id(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+
+
+# =============================================================================
+# PER-SESSION MEMO
+# =============================================================================
+
+class ToolResultMemo:
+    """
+    Remembers tool results per conversation so repeated lookups
+    (same tool, same canonical args) skip the vector search.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_entries: int = MAX_ENTRIES_PER_SESSION):
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self._sessions: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _session(self, session_id: str) -> OrderedDict:
+        entries = self._sessions.get(session_id)
+        if entries is None:
+            entries = self._sessions[session_id] = OrderedDict()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return entries
+
+    def get(self, session_id: str, key: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            entries = self._session(session_id)
+            hit = key in entries
+            if hit:
+                entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            result = entries.get(key)
+
+        metrics.inc("cache_requests_total", cache="tool_memo", result="hit" if hit else "miss")
+        return result
+
+    def put(self, session_id: str, key: Tuple[str, str], result: Any):
+        # Error results are not memoized so a transient failure can be retried
+        if isinstance(result, dict) and "error" in result:
+            return
+        with self._lock:
+            entries = self._session(session_id)
+            entries[key] = result
+            entries.move_to_end(key)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def clear(self, session_id: Optional[str] = None):
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+
+# =============================================================================
+# COMPACTION
+# =============================================================================
+
+class ToolOutputCompactor:
+    """
+    Shrinks tool results before they are appended to the message list.
+
+    One instance lives for one agent turn: chunks already sent earlier in the
+    same message list are replaced by their id, and new chunk text is truncated
+    so a single result never exceeds the token budget. Chunks that no longer
+    fit are listed by id under omitted_chunk_ids.
+    """
+
+    def __init__(self, token_budget: int = TOOL_RESULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.sent_ids = set()
+
+    def compact(self, result: Any) -> Any:
+        if not isinstance(result, dict) or "top_matches" not in result:
+            return result
+
+        compacted = {k: v for k, v in result.items() if k != "top_matches"}
+        matches = []
+        budget_chars = self.token_budget * CHARS_PER_TOKEN
+        repeated = []
+        omitted = []
+
+        for match in result["top_matches"]:
+            content = match.get("content", "")
+            cid = chunk_id(content)
+
+            if cid in self.sent_ids:
+                repeated.append(cid)
+                continue
+
+            if budget_chars <= 0:
+                # Not sent: listed so the model knows the result was cut
+                omitted.append(cid)
+                continue
+
+            text = content
+            if len(text) > budget_chars:
+                text = text[:budget_chars] + " …[truncated]"
+            budget_chars -= len(text)
+
+            self.sent_ids.add(cid)
+            matches.append({
+                "chunk_id": cid,
+                "content": text,
+                "metadata": dict(match.get("metadata") or {}),
+            })
+
+        compacted["top_matches"] = matches
+        if repeated:
+            compacted["already_provided_chunk_ids"] = repeated
+        if omitted:
+            compacted["omitted_chunk_ids"] = omitted
+        return compacted
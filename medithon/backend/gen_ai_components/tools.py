@@ -1,21 +1,27 @@
 from pathlib import Path
 from typing import Dict, List, Any
 
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-
-from config import OPENAI_API_KEY
+try:
+    from gen_ai_components.config import OPENAI_API_KEY
+    from gen_ai_components.providers import get_embeddings, vector_dir
+    from gen_ai_components.drug_index import filtered_search
+    from gen_ai_components.kb import get_knowledge_base
+except ImportError:
+    from config import OPENAI_API_KEY
+    from providers import get_embeddings, vector_dir
+    from drug_index import filtered_search
+    from kb import get_knowledge_base
 
 # -------------------------------
 # Paths
 # -------------------------------
 BASE_PATH = Path(__file__).parent
-VECTOR_PATH = BASE_PATH / "Vector"
+VECTOR_PATH = Path(vector_dir(str(BASE_PATH / "Vector")))
 
 # -------------------------------
 # Embedding Model
 # -------------------------------
-embedding_model = OpenAIEmbeddings(
+embedding_model = get_embeddings(
     model="text-embedding-3-small",
     api_key=OPENAI_API_KEY,
 )
@@ -23,25 +29,17 @@ embedding_model = OpenAIEmbeddings(
 # -------------------------------
 # Load Chroma Vectorstores
 # -------------------------------
-chroma_drugs_mastery = Chroma(
-    persist_directory=str(VECTOR_PATH / "Vector_drugs_master"),
-    embedding_function=embedding_model,
-)
+# Looked up per search, so a knowledge-base reload is picked up (see kb.py)
+knowledge_base = get_knowledge_base(str(VECTOR_PATH), embedding_model)
 
-chroma_comparisons = Chroma(
-    persist_directory=str(VECTOR_PATH / "Vector_comparisons"),
-    embedding_function=embedding_model,
-)
 
-chroma_interactions = Chroma(
-    persist_directory=str(VECTOR_PATH / "Vector_interactions"),
-    embedding_function=embedding_model,
-)
+def search(store: str, query: str, drug_names: List[str], k: int):
+    generation = knowledge_base.active()
+    # Tool arguments name the drugs, so searches are narrowed to their chunks
+    drug_ids = [i for name in drug_names for i in generation.drug_index.find(name)]
+    results, _ = filtered_search(generation.store(store), query, k, drug_ids)
+    return [doc for doc, _ in results]
 
-chroma_reimbursements = Chroma(
-    persist_directory=str(VECTOR_PATH / "Vector_reimbursement"),
-    embedding_function=embedding_model,
-)
 
 # ============================================================================
 # TOOL EXECUTION ROUTER
@@ -72,9 +70,9 @@ def execute_tool(tool_name: str, tool_input: Dict) -> Any:
 
 def drug_information_retrieval(drug_name: str, k: int = 5) -> Dict:
     """
-    Retrieve drug information from chroma_drugs_mastery using similarity search.
+    Retrieve drug information from Vector_drugs_master using similarity search.
     """
-    results = chroma_drugs_mastery.similarity_search(drug_name, k=k)
+    results = search("Vector_drugs_master", drug_name, [drug_name], k)
 
     if not results:
         return {"error": f"No drug information found for: {drug_name}"}
@@ -89,10 +87,10 @@ def drug_information_retrieval(drug_name: str, k: int = 5) -> Dict:
 
 def comparative_analysis(drug_names: List[str], k: int = 5) -> Dict:
     """
-    Retrieve comparison data from chroma_comparisons.
+    Retrieve comparison data from Vector_comparisons.
     """
     query = " comparison between ".join(drug_names)
-    results = chroma_comparisons.similarity_search(query, k=k)
+    results = search("Vector_comparisons", query, drug_names, k)
 
     if not results:
         return {"error": f"No comparison data found for: {drug_names}"}
@@ -108,10 +106,10 @@ def comparative_analysis(drug_names: List[str], k: int = 5) -> Dict:
 
 def drug_interaction_checker(drug_list: List[str], k: int = 5) -> Dict:
     """
-    Retrieve interaction information from chroma_interactions.
+    Retrieve interaction information from Vector_interactions.
     """
     query = " interaction between " + " and ".join(drug_list)
-    results = chroma_interactions.similarity_search(query, k=k)
+    results = search("Vector_interactions", query, drug_list, k)
 
     if not results:
         return {
@@ -132,10 +130,10 @@ def drug_interaction_checker(drug_list: List[str], k: int = 5) -> Dict:
 
 def reimbursement_navigator(drug_name: str, k: int = 5) -> Dict:
     """
-    Retrieve reimbursement information from chroma_reimbursements.
+    Retrieve reimbursement information from Vector_reimbursement.
     """
     query = f"reimbursement coverage insurance information for {drug_name}"
-    results = chroma_reimbursements.similarity_search(query, k=k)
+    results = search("Vector_reimbursement", query, [drug_name], k)
 
     if not results:
         return {"error": f"No reimbursement information found for: {drug_name}"}
@@ -0,0 +1,186 @@
+"""
+Cache pre-warming after a deploy.
+
+The first doctors after a restart would otherwise pay full latency for the
+most common questions. Warmup runs the demo_query of every scenario in
+interactions.json plus the top WARMUP_TOP_N normalized queries from the
+audit log through the pipeline on a background thread, a few at a time, so
+the embedding, retrieval and response caches are filled before they ask.
+
+Progress is reported by status() (GET /api/ready). WARMUP=0 disables it;
+WARMUP_INTERVAL_S > 0 repeats the pass on a schedule, which also refills
+the caches after a knowledge-base swap or once entries expire.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from gen_ai_components.audit_index import AUDIT_LOG_PATH, AuditIndex
+    from gen_ai_components.knowledge_pack import SOURCES, load_current_pack
+    from gen_ai_components.metrics import metrics
+    from gen_ai_components.single_flight import normalize_query
+except ImportError:
+    from audit_index import AUDIT_LOG_PATH, AuditIndex
+    from knowledge_pack import SOURCES, load_current_pack
+    from metrics import metrics
+    from single_flight import normalize_query
+
+# =============================================================================
+# CONFIG
+# =============================================================================
+
+WARMUP_ENABLED = os.getenv("WARMUP", "1") != "0"
+
+# Most frequent audit-log queries to warm, on top of the demo queries
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+
+# Queries run at the same time; kept low so warm-up never crowds out real traffic
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "2"))
+
+# Seconds between passes (0 = once, at startup)
+WARMUP_INTERVAL_S = float(os.getenv("WARMUP_INTERVAL_S", "0"))
+
+WARMUP_AUDIT_LOG = os.getenv("WARMUP_AUDIT_LOG") or AUDIT_LOG_PATH
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def demo_queries() -> List[str]:
+    """demo_query of every interactions.json scenario, from the knowledge pack when it is current."""
+    pack = load_current_pack()
+    if pack is not None:
+        interactions = pack.data["interactions"]
+    else:
+        with open(SOURCES["interactions"], "r", encoding="utf-8") as f:
+            interactions = json.load(f)
+    return [s["demo_query"] for s in interactions["scenarios"] if s.get("demo_query")]
+
+
+def top_audit_queries(n: int = WARMUP_TOP_N, logfile: str = WARMUP_AUDIT_LOG) -> List[str]:
+    """The n most frequent queries in the audit log (none if the log cannot be read)."""
+    if n <= 0:
+        return []
+    try:
+        index = AuditIndex()
+        index.ingest(logfile)
+        return [row["query"] for row in index.top_queries(n)]
+    except Exception as e:
+        print(f"⚠️ Warm-up could not read the audit log: {e}")
+        return []
+
+
+def warmup_queries(top_n: int = WARMUP_TOP_N) -> List[str]:
+    """Demo queries first, then the audit log's top queries; one per normalized form."""
+    queries, seen = [], set()
+    for query in demo_queries() + top_audit_queries(top_n):
+        key = normalize_query(query)
+        if key and key not in seen:
+            seen.add(key)
+            queries.append(query)
+    return queries
+
+
+# =============================================================================
+# WARMUP
+# =============================================================================
+
+class Warmup:
+    """
+    Runs warmup_queries() through `run` on a daemon thread. ready turns true
+    once the first pass has finished, whether or not every query succeeded;
+    a failed query only means that question starts cold.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[str], Any],
+        concurrency: int = WARMUP_CONCURRENCY,
+        interval_s: float = WARMUP_INTERVAL_S,
+        top_n: int = WARMUP_TOP_N,
+        enabled: bool = WARMUP_ENABLED,
+    ):
+        self.run = run
+        self.concurrency = max(1, concurrency)
+        self.interval_s = interval_s
+        self.top_n = top_n
+        self.enabled = enabled
+        self.state = "idle" if enabled else "disabled"
+        self.ready = False
+        self.runs = 0
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Optional[threading.Thread]:
+        if not self.enabled or self._thread is not None:
+            return None
+        self._thread = threading.Thread(target=self._loop, name="cache-warmup", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _loop(self):
+        while True:
+            self.warm()
+            if self.interval_s <= 0:
+                return
+            time.sleep(self.interval_s)
+
+    def warm(self):
+        """One pass over the warm-up queries."""
+        try:
+            queries = warmup_queries(self.top_n)
+        except Exception as e:
+            print(f"⚠️ Warm-up could not collect queries: {e}")
+            queries = []
+        with self._lock:
+            self.state = "warming"
+            self.total, self.done, self.failed = len(queries), 0, 0
+            self.started_at, self.finished_at = time.time(), None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as pool:
+            list(pool.map(self._warm_one, queries))
+
+        with self._lock:
+            self.state = "ready"
+            self.ready = True
+            self.runs += 1
+            self.finished_at = time.time()
+        metrics.observe("warmup_seconds", time.perf_counter() - start)
+        print(f"🔥 Warm-up pass {self.runs}: {self.done - self.failed}/{self.total} queries warmed")
+
+    def _warm_one(self, query: str):
+        try:
+            self.run(query)
+            metrics.inc("warmup_queries_total", result="ok")
+        except Exception as e:
+            print(f"⚠️ Warm-up query failed ({query[:60]!r}): {e}")
+            metrics.inc("warmup_queries_total", result="error")
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready or not self.enabled,
+                "state": self.state,
+                "total": self.total,
+                "done": self.done,
+                "failed": self.failed,
+                "runs": self.runs,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
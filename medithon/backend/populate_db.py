@@ -1,10 +1,23 @@
+import argparse
+import csv
+import hashlib
+import json
 import os
 import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from langchain_community.document_loaders import JSONLoader, CSVLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from gen_ai_components.drug_index import drug_key, get_drug_index
+from gen_ai_components.providers import (
+    close_vector_store, collection_dir, get_embeddings, open_chroma, prune_collection_versions, publish_collection,
+    vector_dir,
+)
+from gen_ai_components.tool_memo import estimate_tokens
 
 # -------------------------------
 # 0. Setup
@@ -15,84 +28,421 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("❌ OPENAI_API_KEY not found in .env file")
 
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+embedding_model = get_embeddings(model="text-embedding-3-small")
 DATA_DIR = "./data"
-VECTOR_DIR = "./Vector"
-
-def create_vector_db(json_filename, vector_db_name, jq_schema=".", chunk_size=2000, chunk_overlap=200):
-    print(f"\n🚀 Processing {json_filename} -> {vector_db_name}...")
-    
-    file_path = os.path.join(DATA_DIR, json_filename)
-    if not os.path.exists(file_path):
-        print(f"⚠️ File not found: {file_path}")
-        return
-
-    # 1. Load
-    loader = JSONLoader(
-        file_path=file_path,
-        jq_schema=jq_schema,
-        text_content=False
-    )
-    docs = loader.load()
-    print(f"   Loaded {len(docs)} documents.")
-
-    # 2. Split
+VECTOR_DIR = vector_dir("./Vector")
+
+# Embedding pipeline: texts per call, shared tokens-per-minute budget, retries per batch
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+# Collection -> source files, in load order
+COLLECTION_SOURCES = {
+    "Vector_drugs_master": ["drugs_master.json"],
+    "Vector_interactions": ["interactions.json"],
+    "Vector_reimbursement": ["reimbursement.json", "jan_aushadhi_prices.csv"],
+    "Vector_comparisons": ["comparisons.json"],
+}
+
+# -------------------------------
+# 1. Load: one chunk per record, stable ids
+# -------------------------------
+def content_hash(text, metadata):
+    payload = text + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def make_chunk(source, key, index, text, metadata=None):
+    """A chunk whose id depends only on where it comes from, so re-runs can diff by id."""
+    metadata = {"source": source, "chunk": index, **(metadata or {})}
+    metadata["content_hash"] = content_hash(text, metadata)
+    return Document(id=f"{source}:{key}:{index}", page_content=text, metadata=metadata)
+
+def record_metadata(record_id, record_type, drug_ids=(), **extra):
+    """Chroma metadata values must be scalars, so drug ids are comma-joined and also set as drug_<id> flags."""
+    drug_ids = list(dict.fromkeys(i for i in drug_ids if i))
+    metadata = {"record_id": record_id, "record_type": record_type, "drug_ids": ",".join(drug_ids)}
+    # One boolean per drug so retrieval can pre-filter with `where` (see drug_index.drug_filter)
+    metadata.update({drug_key(drug_id): True for drug_id in drug_ids})
+    metadata.update({k: v for k, v in extra.items() if v is not None})
+    return metadata
+
+def inline(value):
+    if isinstance(value, dict):
+        return ", ".join(f"{k}={inline(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return ", ".join(inline(v) for v in value)
+    return "-" if value is None else str(value)
+
+def render_fields(record, skip=()):
+    """Compact "field: value" lines; lists of objects get one "- ..." line per item."""
+    lines = []
+    for key, value in record.items():
+        if key in skip:
+            continue
+        if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+            lines.append(f"{key}:")
+            lines.extend(f"- {inline(v)}" for v in value)
+        else:
+            lines.append(f"{key}: {inline(value)}")
+    return "\n".join(lines)
+
+# Section renderers: (section value, chunk_size) -> [(record id, text, metadata)]
+def drug_records(drugs, chunk_size):
+    for d in drugs:
+        text = f"Drug: {d['generic_name']} ({d['id']})\n" + render_fields(d, skip=("id", "generic_name"))
+        yield f"drug:{d['id']}", text, record_metadata(f"drug:{d['id']}", "drug", [d["id"]], category=d.get("category"))
+
+def scenario_records(scenarios, chunk_size):
+    drug_index = get_drug_index()
+    for s in scenarios:
+        # Names like "Ibuprofen / Diclofenac" carry only the first id
+        drugs = [s[k] for k in ("drug_a", "drug_b", "safer_alternative") if isinstance(s.get(k), dict)]
+        drug_ids = [d.get("id") for d in drugs] + drug_index.find(", ".join(d.get("name", "") for d in drugs))
+        text = f"Interaction scenario {s['id']}: {s['title']}\n" + render_fields(s, skip=("id", "title"))
+        yield f"scenario:{s['id']}", text, record_metadata(
+            f"scenario:{s['id']}", "scenario", drug_ids, severity=s.get("severity"),
+            category=" + ".join(s[k]["category"] for k in ("drug_a", "drug_b") if "category" in s.get(k, {})),
+        )
+
+def comparison_records(comparisons, chunk_size):
+    """One record per table; tables longer than chunk_size split by parameter rows, each part with the header."""
+    for c in comparisons:
+        header = f"Comparison: {c['title']}\ncategory: {c.get('category')}\ndrugs: {inline(c.get('drugs', []))}"
+        rows = [f"- {inline(row)}" for row in c.get("parameters", [])]
+        tail = render_fields(c, skip=("id", "title", "category", "drugs", "parameters"))
+
+        parts, current = [], []
+        for row in rows:
+            if current and len("\n".join([header, *current, row])) > chunk_size:
+                parts.append(current)
+                current = []
+            current.append(row)
+        parts.append(current)
+        texts = ["\n".join([header, "parameters:", *part]) for part in parts]
+        if len(texts[-1]) + len(tail) + 1 <= chunk_size:
+            texts[-1] += "\n" + tail
+        else:
+            texts.append(header + "\n" + tail)
+
+        metadata = record_metadata(f"comparison:{c['id']}", "comparison", c.get("drugs", []), category=c.get("category"))
+        for text in texts:
+            yield f"comparison:{c['id']}", text, metadata
+
+def coverage_records(coverage, chunk_size):
+    drug_index = get_drug_index()
+    for group, entry in coverage.items():
+        schemes = [k for k in entry if k not in ("drugs", "agent_questions")]
+        text = f"Coverage: {group.replace('_', ' ')}\n" + render_fields(entry)
+        yield f"coverage:{group}", text, record_metadata(
+            f"coverage:{group}", "coverage", drug_index.find(", ".join(entry.get("drugs", []))),
+            category=group, scheme=",".join(schemes),
+        )
+
+def scheme_records(schemes, chunk_size):
+    for key, scheme in schemes.items():
+        text = f"Scheme: {scheme.get('full_name', key)} ({key})\n" + render_fields(scheme, skip=("full_name",))
+        yield f"scheme:{key}", text, record_metadata(f"scheme:{key}", "scheme", scheme=key)
+
+def flag_records(flags, chunk_size):
+    for pair, flag in flags.items():
+        text = f"Interaction flag: {pair.replace('+', ' + ')}\n" + render_fields(flag)
+        yield f"flag:{pair}", text, record_metadata(f"flag:{pair}", "flag", pair.split("+"), severity=flag.get("severity"))
+
+SECTION_RENDERERS = {
+    "drugs": drug_records,
+    "scenarios": scenario_records,
+    "comparisons": comparison_records,
+    "drug_coverage": coverage_records,
+    "schemes": scheme_records,
+    "additional_flags": flag_records,
+}
+
+def load_json_records(json_filename, chunk_size=1200, chunk_overlap=120):
+    """
+    One chunk per record (drug, scenario, comparison, coverage group, scheme,
+    flag), rendered as compact text with structured metadata. Other sections
+    (meta, interaction_pairs) are one record each, split only if longer than
+    chunk_size. An edit only re-embeds the chunks of its own record.
+    """
+    with open(os.path.join(DATA_DIR, json_filename), encoding="utf-8") as f:
+        data = json.load(f)
+
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    chunks = text_splitter.split_documents(docs)
-    print(f"   Split into {len(chunks)} chunks.")
-
-    # 3. Store
-    persist_dir = os.path.join(VECTOR_DIR, vector_db_name)
-    
-    # Delete existing if any (to start fresh)
-    if os.path.exists(persist_dir):
-        shutil.rmtree(persist_dir)
-        print(f"   Cleared existing DB at {persist_dir}")
-
-    Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_model,
-        persist_directory=persist_dir
-    )
-    print(f"✅ Created {vector_db_name}")
-
-def append_csv_to_db(csv_filename, vector_db_name):
-    print(f"\n➕ Appending {csv_filename} -> {vector_db_name}...")
-    
-    file_path = os.path.join(DATA_DIR, csv_filename)
-    if not os.path.exists(file_path):
-        print(f"⚠️ File not found: {file_path}")
-        return
-
-    # 1. Load
-    loader = CSVLoader(file_path=file_path)
-    docs = loader.load()
-    print(f"   Loaded {len(docs)} CSV rows.")
-
-    # 2. Store (Append to existing)
-    persist_dir = os.path.join(VECTOR_DIR, vector_db_name)
-    
-    db = Chroma(persist_directory=persist_dir, embedding_function=embedding_model)
-    db.add_documents(docs)
-    print(f"✅ Appended CSV data to {vector_db_name}")
+    chunks = []
+    for section, value in data.items():
+        renderer = SECTION_RENDERERS.get(section)
+        if renderer is None:
+            text = f"{section}:\n" + (render_fields(value) if isinstance(value, dict) else inline(value))
+            records = [(section, part, record_metadata(section, "section"))
+                       for part in text_splitter.split_text(text)]
+        else:
+            records = renderer(value, chunk_size)
+
+        seen = {}
+        for record_id, text, metadata in records:
+            seen[record_id] = seen.get(record_id, -1) + 1
+            chunks.append(make_chunk(json_filename, record_id, seen[record_id], text, metadata))
+    return chunks
+
+def load_csv_rows(csv_filename):
+    """One document per row ("Column: value" lines), keyed by the row's values rather than its position."""
+    drug_index = get_drug_index()
+    chunks = []
+    seen = {}
+    with open(os.path.join(DATA_DIR, csv_filename), encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            text = "\n".join(f"{k.strip()}: {(v or '').strip()}" for k, v in row.items())
+            key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+            # Identical rows get distinct ids
+            seen[key] = seen.get(key, -1) + 1
+            drug = (row.get("Drug") or "").strip()
+            metadata = record_metadata(f"price:{drug.lower()}", "price", drug_index.find(drug),
+                                       category=(row.get("Group Name") or "").strip() or None, scheme="jan_aushadhi")
+            chunks.append(make_chunk(csv_filename, f"row[{key}]", seen[key], text, metadata))
+    return chunks
+
+def load_collection(vector_db_name, chunk_size=1200, chunk_overlap=120):
+    chunks = []
+    for filename in COLLECTION_SOURCES[vector_db_name]:
+        if not os.path.exists(os.path.join(DATA_DIR, filename)):
+            print(f"⚠️ File not found: {os.path.join(DATA_DIR, filename)}")
+            continue
+        if filename.endswith(".csv"):
+            chunks.extend(load_csv_rows(filename))
+        else:
+            chunks.extend(load_json_records(filename, chunk_size, chunk_overlap))
+    return chunks
+
+# -------------------------------
+# 2. Embed: batched, rate-limited, checkpointed
+# -------------------------------
+class TokenRateLimiter:
+    """Token bucket shared by every collection's embedding calls (tokens per minute)."""
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.available = tokens_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # A batch bigger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) * 60 / self.capacity
+            time.sleep(wait)
+
+class EmbeddingCheckpoint:
+    """
+    Embeddings of finished batches, appended as JSONL and keyed by
+    (chunk id, content hash), so a rerun after a failure only embeds the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vectors = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn last line from a crash
+                    self.vectors[(entry["id"], entry["content_hash"])] = entry["embedding"]
+
+    def get(self, chunk):
+        return self.vectors.get((chunk.id, chunk.metadata["content_hash"]))
+
+    def save(self, chunks, vectors):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for chunk, vector in zip(chunks, vectors):
+                f.write(json.dumps({"id": chunk.id, "content_hash": chunk.metadata["content_hash"], "embedding": vector}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for chunk, vector in zip(chunks, vectors):
+            self.vectors[(chunk.id, chunk.metadata["content_hash"])] = vector
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def embed_with_retry(texts, limiter, max_retries):
+    limiter.acquire(sum(estimate_tokens(t) for t in texts))
+    for attempt in range(max_retries + 1):
+        try:
+            return embedding_model.embed_documents(texts)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = 2 ** attempt
+            print(f"   ⚠️ Embedding batch failed ({type(e).__name__}: {e}); retrying in {delay}s")
+            time.sleep(delay)
+
+def embed_chunks(chunks, checkpoint, limiter, batch_size, max_retries):
+    """Embeddings for chunks in order; checkpointed batches are not re-embedded."""
+    pending = [c for c in chunks if checkpoint.get(c) is None]
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        checkpoint.save(batch, embed_with_retry([c.page_content for c in batch], limiter, max_retries))
+    return [checkpoint.get(c) for c in chunks]
+
+# -------------------------------
+# 3. Sync: diff, build in staging, swap
+# -------------------------------
+def stored_hashes(db):
+    stored = db.get(include=["metadatas"])
+    return {id_: (meta or {}).get("content_hash") for id_, meta in zip(stored["ids"], stored["metadatas"])}
+
+def diff_chunks(existing, chunks):
+    """(added, changed, deleted ids) between stored {id: content_hash} and the chunks now in data/."""
+    current = {chunk.id: chunk for chunk in chunks}
+    added = [c for id_, c in current.items() if id_ not in existing]
+    changed = [c for id_, c in current.items() if id_ in existing and existing[id_] != c.metadata["content_hash"]]
+    deleted = [id_ for id_ in existing if id_ not in current]
+    return added, changed, deleted
+
+def sync_collection(vector_db_name, chunks, dry_run=False, full=False, vector_root=None,
+                    limiter=None, batch_size=EMBED_BATCH_SIZE, max_retries=EMBED_MAX_RETRIES, prune=False):
+    """
+    Upserts new and changed chunks and deletes chunks whose id disappeared.
+    Stores built before ids were stable have no content_hash, so their first
+    sync replaces everything once.
+
+    Changes are applied to a copy of the store (or an empty one with full=True)
+    that is published as a new version only once every batch succeeded (see
+    providers.publish_collection); a failed run leaves the live store
+    untouched and its checkpoint lets the next run resume.
+
+    Old versions stay on disk: a running server deletes them once its
+    requests have drained off them (kb.py). prune=True deletes all but the
+    newest VECTOR_KEEP_VERSIONS here, for when no server reads the stores.
+    """
+    root = vector_root or VECTOR_DIR
+    persist_dir = collection_dir(root, vector_db_name)
+    staging_dir = None
+    existing = {}
+    db = None
+    if not dry_run:
+        # A fresh name per run: Chroma caches clients by path
+        staging_dir = os.path.join(root, f"{vector_db_name}.staging-{uuid.uuid4().hex[:8]}")
+        if os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")) and not full:
+            # An unversioned store's container may also hold an unpublished version
+            shutil.copytree(persist_dir, staging_dir, ignore=shutil.ignore_patterns("v*", "CURRENT*"))
+        db = open_chroma(staging_dir, embedding_model)
+        existing = stored_hashes(db)
+    elif os.path.exists(os.path.join(persist_dir, "chroma.sqlite3")) and not full:
+        existing = stored_hashes(Chroma(persist_directory=persist_dir, embedding_function=embedding_model))
+
+    added, changed, deleted = diff_chunks(existing, chunks)
+    diff = {
+        "collection": vector_db_name,
+        "added": len(added),
+        "changed": len(changed),
+        "deleted": len(deleted),
+        "unchanged": len({c.id for c in chunks}) - len(added) - len(changed),
+        "embedded_tokens": sum(estimate_tokens(c.page_content) for c in added + changed),
+    }
+
+    if dry_run:
+        for label, items in (("+", added), ("~", changed)):
+            for c in items:
+                print(f"   {label} {c.id}")
+        for id_ in deleted:
+            print(f"   - {id_}")
+        return diff
+
+    try:
+        checkpoint = EmbeddingCheckpoint(os.path.join(root, ".ingest", f"{vector_db_name}.jsonl"))
+        upserts = added + changed
+        vectors = embed_chunks(upserts, checkpoint, limiter or TokenRateLimiter(EMBED_TPM), batch_size, max_retries)
+
+        if deleted:
+            db.delete(ids=deleted)
+        for i in range(0, len(upserts), batch_size):
+            batch = upserts[i:i + batch_size]
+            # Vectors are already computed, so write them straight to the collection
+            db._collection.upsert(
+                ids=[c.id for c in batch],
+                embeddings=vectors[i:i + batch_size],
+                documents=[c.page_content for c in batch],
+                metadatas=[c.metadata for c in batch],
+            )
+        close_vector_store(db)
+        db = None
+        publish_collection(root, vector_db_name, staging_dir)
+        if prune:
+            prune_collection_versions(root, vector_db_name)
+        checkpoint.remove()
+    except BaseException:
+        if db is not None:
+            close_vector_store(db)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return diff
 
 # -------------------------------
 # EXECUTION
 # -------------------------------
+def populate_all(dry_run=False, full=False, chunk_size=1200, chunk_overlap=120, vector_root=None,
+                 batch_size=EMBED_BATCH_SIZE, tokens_per_minute=EMBED_TPM, max_retries=EMBED_MAX_RETRIES,
+                 prune=False):
+    """
+    Brings every collection in line with data/, all four concurrently under
+    one shared token-rate limit; full=True rebuilds from scratch.
+    """
+    limiter = TokenRateLimiter(tokens_per_minute)
+
+    def run(vector_db_name):
+        start = time.perf_counter()
+        chunks = load_collection(vector_db_name, chunk_size, chunk_overlap)
+        diff = sync_collection(vector_db_name, chunks, dry_run=dry_run, full=full, vector_root=vector_root,
+                               limiter=limiter, batch_size=batch_size, max_retries=max_retries, prune=prune)
+        diff["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"\n{'🔎' if dry_run else '✅'} {vector_db_name}: {diff['added']} added, {diff['changed']} changed, "
+              f"{diff['deleted']} deleted, {diff['unchanged']} unchanged (~{diff['embedded_tokens']} tokens)")
+        return diff
+
+    with ThreadPoolExecutor(max_workers=len(COLLECTION_SOURCES)) as pool:
+        futures = {name: pool.submit(run, name) for name in COLLECTION_SOURCES}
+    failed = {name: f.exception() for name, f in futures.items() if f.exception() is not None}
+    for name, error in failed.items():
+        print(f"\n❌ {name} failed, live store unchanged: {type(error).__name__}: {error}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} collection(s) failed; rerun to resume from the checkpoint")
+    return [futures[name].result() for name in COLLECTION_SOURCES]
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync the Chroma stores with data/.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be embedded or deleted")
+    parser.add_argument("--full", action="store_true", help="rebuild every store from scratch")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="texts per embeddings call")
+    parser.add_argument("--tpm", type=int, default=EMBED_TPM, help="embedding tokens per minute across all collections")
+    parser.add_argument("--max-retries", type=int, default=EMBED_MAX_RETRIES, help="retries per failed batch")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete old store versions now (only when no server is reading them)")
+    args = parser.parse_args()
+
     print("🏥 Starting Vector Database Population...\n")
-    
-    # 1. Drugs Master
-    create_vector_db("drugs_master.json", "Vector_drugs_master")
-    
-    # 2. Interactions
-    create_vector_db("interactions.json", "Vector_interactions")
-    
-    # 3. Reimbursement (JSON + CSV)
-    create_vector_db("reimbursement.json", "Vector_reimbursement")
-    append_csv_to_db("jan_aushadhi_prices.csv", "Vector_reimbursement")
-    
-    # 4. Comparisons
-    create_vector_db("comparisons.json", "Vector_comparisons")
-    
-    print("\n🎉 All databases populated successfully!")
+
+    start = time.perf_counter()
+    diffs = populate_all(dry_run=args.dry_run, full=args.full, batch_size=args.batch_size,
+                         tokens_per_minute=args.tpm, max_retries=args.max_retries, prune=args.prune)
+    elapsed = time.perf_counter() - start
+
+    embedded = sum(d["added"] + d["changed"] for d in diffs)
+    tokens = sum(d["embedded_tokens"] for d in diffs)
+    if args.dry_run:
+        print(f"\n🔎 Dry run: {embedded} chunks (~{tokens} tokens) would be embedded, "
+              f"{sum(d['deleted'] for d in diffs)} deleted.")
+    else:
+        print(f"\n🎉 All databases populated successfully! {embedded} chunks in {elapsed:.1f}s "
+              f"({embedded / elapsed:.1f} docs/s, {tokens / elapsed:.0f} tokens/s)")
@@ -0,0 +1,63 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langchain_chroma")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("VECTOR_DIR", tempfile.mkdtemp(prefix="agent_test_"))
+from gen_ai_components import agent as agent_module  # noqa: E402
+from gen_ai_components.audit_writer import AuditLogger  # noqa: E402
+
+
+class ScriptedCompletions:
+    """Answers every call with the next scripted message and records the request."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def create(self, model, messages, **kwargs):
+        self.requests.append({"messages": list(messages), **kwargs})
+        message = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def completions(tmp_path, monkeypatch):
+    def install(*replies):
+        scripted = ScriptedCompletions(*replies)
+        monkeypatch.setattr(agent_module, "client", SimpleNamespace(chat=SimpleNamespace(completions=scripted)))
+        return scripted
+
+    monkeypatch.setattr(agent_module.guardrails, "logger", AuditLogger(str(tmp_path / "audit_log.jsonl")))
+    monkeypatch.setattr(agent_module, "execute_tool", lambda name, args: pytest.fail(f"ran {name}"))
+    return install
+
+
+def direct(content):
+    return SimpleNamespace(content=content, tool_calls=None)
+
+
+def test_llm_planner_handles_a_query_that_needs_no_tools_like_the_loop(completions):
+    # The tool loop's outcome for the same direct answer is the reference
+    completions(direct("Happy to help with any drug questions."))
+    expected = agent_module.MedicalRepAgent(planner=None).process_message("thanks for the help earlier", [])
+
+    scripted = completions(direct("Happy to help with any drug questions."))
+    answer = agent_module.MedicalRepAgent(planner="llm").process_message("thanks for the help earlier", [])
+
+    assert answer == expected
+    assert len(scripted.requests) == 1
+    assert scripted.requests[0]["tool_choice"] == "auto"
+
+
+def test_empty_plan_without_an_answer_generates_without_tool_messages(completions):
+    scripted = completions(SimpleNamespace(content=None, tool_calls=[]), direct("Good morning, doctor."))
+    agent_module.MedicalRepAgent(planner="llm").process_message("good morning", [])
+
+    assert len(scripted.requests) == 2
+    generation = scripted.requests[1]["messages"]
+    assert not any("tool_calls" in m or m.get("role") == "tool" for m in generation)
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from gen_ai_components.audit_index import AuditIndex
+
+
+def line(query, ts="2026-01-01T10:00:00"):
+    return (json.dumps({"timestamp": ts, "query": query, "tool_calls": [], "response": "ok"}) + "\n").encode("utf-8")
+
+
+def entries(index):
+    return index.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def test_appends_are_ingested_once(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    log.write_bytes(line("a") + line("b"))
+    index = AuditIndex(str(tmp_path / "index.sqlite3"))
+    assert index.ingest(str(log)) == 2
+    with open(log, "ab") as f:
+        f.write(line("c") + line("d")[:10])
+    assert index.ingest(str(log)) == 1
+    assert index.ingest(str(log)) == 0
+    assert entries(index) == 3
+
+
+def test_partial_first_line_is_not_used_as_the_head(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    with gzip.open(tmp_path / "audit_log.jsonl.1.gz", "wb") as f:
+        f.write(line("old 1") + line("old 2"))
+    log.write_bytes(line("new")[:15])
+
+    index = AuditIndex(str(tmp_path / "index.sqlite3"))
+    assert index.ingest(str(log)) == 0
+    assert index.ingest(str(log)) == 0
+
+    log.write_bytes(line("new"))
+    assert index.ingest(str(log)) == 3
+    assert index.ingest(str(log)) == 0
+    assert entries(index) == 3
+
+
+def test_rotation_into_a_partial_file_does_not_reingest_segments(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    with gzip.open(tmp_path / "audit_log.jsonl.2.gz", "wb") as f:
+        f.write(line("oldest"))
+    log.write_bytes(line("a") + line("b"))
+    index = AuditIndex(str(tmp_path / "index.sqlite3"))
+    assert index.ingest(str(log)) == 3
+
+    # The writer appends, rotates, and starts a new file whose first entry is half written
+    with open(log, "ab") as f:
+        f.write(line("c"))
+    os.replace(log, tmp_path / "audit_log.jsonl.1")
+    log.write_bytes(line("d")[:12])
+    assert index.ingest(str(log)) == 0
+    assert index.ingest(str(log)) == 0
+
+    log.write_bytes(line("d"))
+    assert index.ingest(str(log)) == 2
+    assert entries(index) == 5
+    assert sorted(row["query"] for row in index.top_queries(10)) == ["a", "b", "c", "d", "oldest"]
+
+
+def test_failed_ingest_commits_neither_rows_nor_offset(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    with gzip.open(tmp_path / "audit_log.jsonl.1.gz", "wb") as f:
+        f.write(line("old"))
+    log.write_bytes(line("a") + line("b"))
+    index = AuditIndex(str(tmp_path / "index.sqlite3"))
+
+    # The rotated segment is indexed, then reading the live file fails
+    ingest_stream = index._ingest_stream
+    streams = []
+
+    def failing_stream(f, offset):
+        streams.append(f)
+        if len(streams) == 2:
+            raise OSError("disk went away")
+        return ingest_stream(f, offset)
+
+    index._ingest_stream = failing_stream
+    with pytest.raises(OSError):
+        index.ingest(str(log))
+    assert entries(index) == 0
+    assert index.conn.execute("SELECT COUNT(*) FROM ingest_state").fetchone()[0] == 0
+
+    del index._ingest_stream
+    assert index.ingest(str(log)) == 3
+    assert index.ingest(str(log)) == 0
+    assert entries(index) == 3
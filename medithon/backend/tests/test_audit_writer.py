@@ -0,0 +1,31 @@
+import json
+
+from gen_ai_components.audit_writer import AuditLogger
+
+
+def test_existing_log_is_rotated_before_the_first_batch(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    old = (json.dumps({"query": "from an earlier run"}) + "\n").encode("utf-8") * 10
+    log.write_bytes(old)
+
+    logger = AuditLogger(str(log), max_bytes=len(old), compress=False, fsync="never")
+    logger.log("new", [], "ok")
+    assert logger.flush()
+    logger.close()
+
+    assert (tmp_path / "audit_log.jsonl.1").read_bytes() == old
+    assert [json.loads(l)["query"] for l in log.read_bytes().splitlines()] == ["new"]
+    assert logger.write_errors == 0
+
+
+def test_batches_within_max_bytes_append_to_the_existing_log(tmp_path):
+    log = tmp_path / "audit_log.jsonl"
+    log.write_bytes(b'{"query": "old"}\n')
+
+    logger = AuditLogger(str(log), max_bytes=10_000, compress=False, fsync="never")
+    logger.log("new", [], "ok")
+    assert logger.flush()
+    logger.close()
+
+    assert [json.loads(l)["query"] for l in log.read_bytes().splitlines()] == ["old", "new"]
+    assert not (tmp_path / "audit_log.jsonl.1").exists()
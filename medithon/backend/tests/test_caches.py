@@ -0,0 +1,61 @@
+import pytest
+
+from gen_ai_components import caches
+from gen_ai_components.caches import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(caches, "_caches", {})
+    monkeypatch.setattr(caches, "_version", None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(caches.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test", max_entries=2, ttl_s=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache("test", max_entries=10, ttl_s=60)
+    cache.put("a", 1)
+    clock[0] += 59
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("max_entries, ttl_s", [(0, 60), (10, 0)])
+def test_zero_size_or_ttl_disables_the_cache(max_entries, ttl_s):
+    cache = TTLCache("test", max_entries=max_entries, ttl_s=ttl_s)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert not cache.enabled
+
+
+def test_a_new_data_version_clears_data_dependent_caches():
+    derived = TTLCache("derived", max_entries=10, ttl_s=60)
+    independent = TTLCache("independent", max_entries=10, ttl_s=60, data_dependent=False)
+
+    caches.invalidate("v1")
+    derived.put("a", 1)
+    independent.put("a", 1)
+    caches.invalidate("v1")
+    assert derived.get("a") == 1
+
+    caches.invalidate("v2")
+    assert caches.data_version() == "v2"
+    assert (derived.get("a"), independent.get("a")) == (None, 1)
+    assert caches.registered_caches() == ["derived"]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+from gen_ai_components.providers import (  # noqa: E402
+    LEGACY_VERSION, collection_dir, collection_versions, prune_collection_versions, publish_collection,
+)
+
+
+def build(root, files=("chroma.sqlite3",)):
+    path = root / f"build-{len(os.listdir(root))}"
+    path.mkdir()
+    for name in files:
+        (path / name).write_text(name)
+    return str(path)
+
+
+def test_unversioned_store_is_read_in_place(tmp_path):
+    (tmp_path / "Vector_drugs").mkdir()
+    assert collection_dir(str(tmp_path), "Vector_drugs") == str(tmp_path / "Vector_drugs")
+
+
+def test_publish_switches_current_without_touching_the_old_version(tmp_path):
+    root = str(tmp_path)
+    first = publish_collection(root, "Vector_drugs", build(tmp_path))
+    assert collection_dir(root, "Vector_drugs") == first
+
+    second = publish_collection(root, "Vector_drugs", build(tmp_path))
+    assert collection_dir(root, "Vector_drugs") == second
+    assert os.path.exists(os.path.join(first, "chroma.sqlite3"))
+
+
+def test_prune_keeps_newest_current_and_protected(tmp_path):
+    root = str(tmp_path)
+    container = tmp_path / "Vector_drugs"
+    container.mkdir()
+    (container / "chroma.sqlite3").write_text("legacy")
+    (container / "0f3c2a1e-segment").mkdir()
+
+    versions = [publish_collection(root, "Vector_drugs", build(tmp_path)) for _ in range(4)]
+    assert collection_versions(root, "Vector_drugs")[0] == LEGACY_VERSION
+
+    removed = prune_collection_versions(root, "Vector_drugs", keep=2, protect=[versions[0]])
+    assert removed == [LEGACY_VERSION, os.path.basename(versions[1])]
+    assert collection_versions(root, "Vector_drugs") == [os.path.basename(v) for v in (versions[0], versions[2], versions[3])]
+    assert not (container / "chroma.sqlite3").exists() and not (container / "0f3c2a1e-segment").exists()
+    assert collection_dir(root, "Vector_drugs") == versions[3]
+
+
+def test_close_stops_only_the_system_the_store_was_opened_on(tmp_path):
+    from chromadb.api.shared_system_client import SharedSystemClient
+    from gen_ai_components.providers import close_vector_store, open_chroma
+
+    path = str(tmp_path / "store")
+    old = open_chroma(path)
+    old._collection.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"])
+    # What kb._forget_chroma_client does before reopening a directory
+    SharedSystemClient._identifier_to_system.pop(old._client._identifier)
+    new = open_chroma(path)
+
+    close_vector_store(old)
+    assert new._collection.count() == 1
+    close_vector_store(new)
+    assert old._client._identifier not in SharedSystemClient._identifier_to_system
@@ -0,0 +1,101 @@
+import pytest
+
+from gen_ai_components.drug_index import (
+    FILTER_MAX_DISTANCE, DrugNameIndex, drug_key, filtered_search, load_drug_index, normalize_name,
+)
+
+
+@pytest.fixture(scope="module")
+def index():
+    return load_drug_index()
+
+
+def test_names_and_queries_share_one_matching_form():
+    assert normalize_name("Zerodol-P") == "zerodol p"
+    assert normalize_name("Amoxicillin+Clavulanate") == normalize_name("amoxicillin  &  clavulanate")
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("amoxicillin + clavulanate", ["amoxicillin_clavulanate"]),
+    ("Amoxicillin-Clavulanate 625", ["amoxicillin_clavulanate"]),
+    ("Is augmentin covered?", ["amoxicillin_clavulanate"]),
+    ("Zerodol-P or Hifenac P?", ["aceclofenac"]),
+    ("Metformin with Amaryl", ["metformin", "glimepiride"]),
+    ("a human patient on no medication", []),
+])
+def test_find(index, query, expected):
+    assert index.find(query) == expected
+
+
+def test_leading_brand_token_is_skipped_when_ambiguous():
+    drugs = [
+        {"id": "a", "generic_name": "Alpha", "brands": ["Shared 10"]},
+        {"id": "b", "generic_name": "Beta", "brands": ["Shared 20", "Betaforte Plus"]},
+    ]
+    index = DrugNameIndex(drugs)
+    assert index.find("shared") == []
+    assert index.find("betaforte") == ["b"]
+
+
+def test_price_list_spellings_are_reported_not_guessed():
+    drugs = [{"id": "metformin", "generic_name": "Metformin"}, {"id": "insulin_human", "generic_name": "Human Insulin"}]
+    rows = [
+        {"Drug": "Metformine", "Variant Name": "Metformine 500"},
+        {"Drug": "Insulin", "Variant Name": "Insulin 40 IU"},
+        {"Drug": "Metoprolol", "Variant Name": "Metoprolol 25"},
+    ]
+    index = DrugNameIndex(drugs, rows)
+    assert index.fuzzy_matches == {"metformine": "metformin", "insulin": "insulin_human"}
+    assert index.unresolved == ["metoprolol"]
+    assert index.find("metoprolol 25") == []
+
+
+class Doc:
+    def __init__(self, id_):
+        self.id = id_
+        self.metadata = {}
+
+
+class FakeStore:
+    """similarity_search_with_score over canned (id, distance, drugs) rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def similarity_search_with_score(self, query, k, filter=None):
+        rows = self.rows
+        if filter is not None:
+            wanted = {key for clause in filter.get("$or", [filter]) for key in clause}
+            rows = [row for row in rows if any(drug_key(d) in wanted for d in row[2])]
+        return [(Doc(id_), score) for id_, score, _ in sorted(rows, key=lambda row: row[1])[:k]]
+
+
+def ids(results):
+    return [doc.id for doc, _ in results]
+
+
+def test_strong_filtered_hits_are_trusted():
+    store = FakeStore([("m1", 0.4, ["metformin"]), ("m2", 0.5, ["metformin"]), ("x", 0.1, ["aspirin"])])
+    results, mode = filtered_search(store, "q", 2, ["metformin"])
+    assert (ids(results), mode) == (["m1", "m2"], "filtered")
+
+
+def test_weak_filtered_hits_are_merged_with_unfiltered():
+    # The recognizer picked the wrong drug: its chunks are all far away
+    store = FakeStore([("m1", FILTER_MAX_DISTANCE + 0.3, ["metformin"]),
+                       ("m2", FILTER_MAX_DISTANCE + 0.4, ["metformin"]),
+                       ("a1", 0.3, ["aspirin"])])
+    results, mode = filtered_search(store, "q", 2, ["metformin"])
+    assert (ids(results), mode) == (["a1", "m1"], "merged")
+
+
+def test_short_filtered_hits_are_padded_without_duplicates():
+    store = FakeStore([("m1", 0.2, ["metformin"]), ("a1", 0.5, ["aspirin"])])
+    results, mode = filtered_search(store, "q", 2, ["metformin"])
+    assert (ids(results), mode) == (["m1", "a1"], "merged")
+
+
+def test_no_filtered_hits_fall_back():
+    store = FakeStore([("a1", 0.3, ["aspirin"]), ("a2", 0.4, ["aspirin"])])
+    assert filtered_search(store, "q", 2, ["metformin"])[1] == "fallback"
+    assert filtered_search(store, "q", 2, [])[1] == "unfiltered"
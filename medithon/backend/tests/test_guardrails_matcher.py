@@ -0,0 +1,63 @@
+import json
+import re
+
+import pytest
+
+from benchmarks.bench_guardrails import CORPUS_PATH, decision, legacy_decision
+from gen_ai_components.guardrails import GUARDRAIL_CATEGORIES, GuardrailMatcher, InputGuardrails, guardrail_matcher
+
+with open(CORPUS_PATH, encoding="utf-8") as f:
+    CORPUS = [json.loads(line) for line in f]
+
+
+@pytest.fixture(scope="module")
+def input_guardrails():
+    return InputGuardrails()
+
+
+def test_corpus_decisions_match_the_per_pattern_oracle(input_guardrails):
+    mismatches = [
+        (case["query"], decision(input_guardrails.run(case["query"])))
+        for case in CORPUS
+        if decision(input_guardrails.run(case["query"])) != legacy_decision(case["query"])
+    ]
+    assert mismatches == []
+
+
+def test_corpus_labels_are_current(input_guardrails):
+    stale = [case["query"] for case in CORPUS
+             if decision(input_guardrails.run(case["query"])) != (case["status"], case["category"])]
+    assert stale == []
+
+
+def test_scan_returns_exactly_the_categories_with_a_matching_pattern():
+    wrong = []
+    for case in CORPUS:
+        q = case["query"].lower().strip()
+        expected = {category for category, patterns in GUARDRAIL_CATEGORIES.items()
+                    if any(re.search(p, q) for p in patterns)}
+        if guardrail_matcher.scan(q) != expected:
+            wrong.append(q)
+    assert wrong == []
+
+
+def per_pattern(categories, text):
+    return {category for category, patterns in categories.items() if any(re.search(p, text) for p in patterns)}
+
+
+# Literals that share a start position and differ only in their word boundaries
+PATTERN_PAIRS = [
+    {"a": [r"\bdose\b"], "b": [r"\bdose"]},
+    {"a": [r"dose\b"], "b": [r"dose"]},
+    {"a": [r"\bdose\b"], "b": [r"\bdose for me\b"]},
+    {"a": [r"do"], "b": [r"\bdose"]},
+    {"a": [r"dose"], "b": [r"\bdose"]},
+    {"a": [r"\bdo\b"], "b": [r"dose"], "c": [r"\bdo"]},
+]
+TEXTS = ["doses", "dose", "the dose for me", "overdose", "do", "do se", "x dose\n", "ado doses dose"]
+
+
+@pytest.mark.parametrize("categories", PATTERN_PAIRS)
+def test_scan_matches_the_per_pattern_oracle_when_literals_overlap(categories):
+    matcher = GuardrailMatcher(categories)
+    assert {text: matcher.scan(text) for text in TEXTS} == {text: per_pattern(categories, text) for text in TEXTS}
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("openai")
+from gen_ai_components import kb  # noqa: E402
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    closed, opened = [], []
+
+    def open_store(name, embedding_function, root, snapshot=None):
+        opened.append(object())
+        return opened[-1]
+
+    monkeypatch.setattr(kb, "KB_SNAPSHOT", None)
+    monkeypatch.setattr(kb, "open_vector_store", open_store)
+    monkeypatch.setattr(kb, "close_vector_store", closed.append)
+    monkeypatch.setattr(kb, "prune_collection_versions", lambda root, name, protect: [])
+    monkeypatch.setattr(kb, "load_drug_index", lambda: None)
+    base = kb.KnowledgeBase(str(tmp_path), embedding_function=None)
+    base.closed = closed
+    return base
+
+
+def reload(base):
+    assert base.reload(force=True)
+    base._reloading.join()
+
+
+def test_old_generation_is_closed_after_it_drains(base):
+    old = base.current
+    reload(base)
+    assert base.current is not old
+    assert base.closed == list(old.stores.values())
+    assert base.last_reload["drained"] is True
+
+
+def test_generation_in_use_is_not_closed(base, monkeypatch):
+    monkeypatch.setattr(kb, "KB_DRAIN_TIMEOUT_S", 0.05)
+    done = threading.Event()
+
+    def request():
+        with kb.pinned():
+            done.wait()
+
+    monkeypatch.setitem(kb._bases, "test", base)
+    worker = threading.Thread(target=request)
+    worker.start()
+    while base.current.active == 0:
+        pass
+    reload(base)
+    done.set()
+    worker.join()
+    assert base.closed == []
+    assert base.last_reload["drained"] is False
+
+
+def test_forced_reload_of_the_same_stores_closes_only_the_old_ones(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    monkeypatch.setattr(kb, "KB_SNAPSHOT", None)
+    base = kb.KnowledgeBase(str(tmp_path), embedding_function=None)
+    name = kb.COLLECTIONS[0]
+    base.current.store(name)._collection.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"])
+
+    old = base.current
+    reload(base)
+
+    assert base.current is not old
+    assert base.current.paths == old.paths
+    assert base.last_reload["result"] == "swapped"
+    assert base.last_reload["drained"] is True
+    assert "cleanup_errors" not in base.last_reload
+    # Same directory, but the new generation's client was not the one stopped
+    assert base.current.store(name)._collection.count() == 1
+    base.current.close()
+
+
+def test_cleanup_failure_does_not_fail_the_swap(base, monkeypatch):
+    def broken_close(store):
+        raise RuntimeError("disk gone")
+
+    monkeypatch.setattr(kb, "close_vector_store", broken_close)
+    reload(base)
+    assert base.last_reload["result"] == "swapped"
+    assert base.last_reload["cleanup_errors"] == [f"close {base.last_reload['from']}: disk gone"]
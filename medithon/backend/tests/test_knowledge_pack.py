@@ -0,0 +1,70 @@
+import copy
+import os
+import shutil
+
+import pytest
+
+from gen_ai_components import knowledge_pack
+from gen_ai_components.knowledge_pack import build, load_current_pack, read_sources, validate
+
+
+@pytest.fixture(scope="module")
+def data():
+    return read_sources()
+
+
+def test_shipped_data_is_valid(data):
+    assert validate(data) == []
+
+
+def broken(data, edit):
+    data = copy.deepcopy(data)
+    edit(data)
+    return validate(data)
+
+
+def test_schema_errors_name_the_field(data):
+    def drop_category(d):
+        del d["drugs_master"]["drugs"][0]["category"]
+    assert broken(data, drop_category) == ["drugs_master.json.drugs[0]: missing field 'category'"]
+
+
+def test_cross_references_are_checked(data):
+    def edit(d):
+        d["comparisons"]["comparisons"][0]["drugs"].append("no_such_drug")
+        d["interactions"]["scenarios"][0]["severity"] = "extreme"
+        d["interactions"]["interaction_pairs"]["x+y"] = 999
+        d["prices"][0]["MRP"] = "free"
+    errors = broken(data, edit)
+    assert any("'no_such_drug' is not in drugs_master.json" in e for e in errors)
+    assert any("unknown severity 'extreme'" in e for e in errors)
+    assert any("pair 'x+y' points at unknown scenario 999" in e for e in errors)
+    assert any("MRP 'free' is not a positive number" in e for e in errors)
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    copies = {}
+    for name, path in knowledge_pack.SOURCES.items():
+        copies[name] = tmp_path / path.name
+        shutil.copy2(path, copies[name])
+    monkeypatch.setattr(knowledge_pack, "SOURCES", copies)
+    return copies
+
+
+def test_pack_goes_stale_only_when_a_source_changes(tmp_path, sources, monkeypatch):
+    path = str(tmp_path / "knowledge.pack")
+    build(path)
+    with monkeypatch.context() as m:
+        # Unchanged sizes and mtimes: nothing is hashed
+        m.setattr(knowledge_pack, "_sha256", lambda path: pytest.fail(f"hashed {path}"))
+        assert load_current_pack(path) is not None
+
+    # Touched but identical: still current
+    st = os.stat(sources["comparisons"])
+    os.utime(sources["comparisons"], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert load_current_pack(path) is not None
+
+    with open(sources["comparisons"], "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert load_current_pack(path) is None
@@ -0,0 +1,121 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("langchain_text_splitters")
+pytest.importorskip("langchain_chroma")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+import populate_db  # noqa: E402
+from gen_ai_components.providers import collection_dir  # noqa: E402
+from populate_db import (  # noqa: E402
+    EmbeddingCheckpoint, TokenRateLimiter, content_hash, diff_chunks, embed_chunks, make_chunk, sync_collection,
+)
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic 8-dim vectors; counts texts so tests can see what was re-embedded."""
+
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(t) % (i + 2)) for i in range(8)] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def chunks(**texts):
+    return [make_chunk("drugs_master.json", key, 0, text, {"drug_ids": key}) for key, text in texts.items()]
+
+
+def test_content_hash_covers_text_and_metadata():
+    assert content_hash("a", {"x": 1}) == content_hash("a", {"x": 1})
+    assert content_hash("a", {"x": 1}) != content_hash("b", {"x": 1})
+    assert content_hash("a", {"x": 1}) != content_hash("a", {"x": 2})
+
+
+def test_chunk_ids_depend_only_on_position():
+    first, second = chunks(metformin="v1")[0], chunks(metformin="v2")[0]
+    assert first.id == second.id == "drugs_master.json:metformin:0"
+    assert first.metadata["content_hash"] != second.metadata["content_hash"]
+
+
+def test_diff_chunks():
+    stored = {c.id: c.metadata["content_hash"] for c in chunks(a="same", b="old", c="gone")}
+    added, changed, deleted = diff_chunks(stored, chunks(a="same", b="new", d="added"))
+    assert [c.id for c in added] == ["drugs_master.json:d:0"]
+    assert [c.id for c in changed] == ["drugs_master.json:b:0"]
+    assert deleted == ["drugs_master.json:c:0"]
+
+
+def test_sync_only_embeds_what_changed(tmp_path, monkeypatch):
+    embeddings = CountingEmbeddings()
+    monkeypatch.setattr(populate_db, "embedding_model", embeddings)
+    root = str(tmp_path)
+
+    diff = sync_collection("Vector_test", chunks(a="alpha", b="beta"), vector_root=root)
+    assert (diff["added"], diff["changed"], diff["deleted"]) == (2, 0, 0)
+
+    embeddings.texts.clear()
+    diff = sync_collection("Vector_test", chunks(a="alpha", b="beta 2", c="gamma"), vector_root=root)
+    assert (diff["added"], diff["changed"], diff["deleted"], diff["unchanged"]) == (1, 1, 0, 1)
+    assert sorted(embeddings.texts) == ["beta 2", "gamma"]
+
+    embeddings.texts.clear()
+    diff = sync_collection("Vector_test", chunks(a="alpha", c="gamma"), vector_root=root, dry_run=True)
+    assert (diff["added"], diff["changed"], diff["deleted"]) == (0, 0, 1)
+    assert embeddings.texts == []
+
+
+def test_sync_publishes_a_new_version_and_keeps_the_old_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(populate_db, "embedding_model", CountingEmbeddings())
+    root = str(tmp_path)
+    sync_collection("Vector_test", chunks(a="alpha"), vector_root=root)
+    first = collection_dir(root, "Vector_test")
+    sync_collection("Vector_test", chunks(a="alpha 2"), vector_root=root)
+    assert collection_dir(root, "Vector_test") != first
+    assert os.path.exists(os.path.join(first, "chroma.sqlite3"))
+
+
+def test_checkpoint_resumes_and_skips_a_torn_last_line(tmp_path):
+    path = str(tmp_path / ".ingest" / "Vector_test.jsonl")
+    a, b, c = chunks(a="alpha", b="beta", c="gamma")
+    EmbeddingCheckpoint(path).save([a, b], [[1.0], [2.0]])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "drugs_master.json:c:0", "content_ha')
+
+    checkpoint = EmbeddingCheckpoint(path)
+    assert checkpoint.get(a) == [1.0] and checkpoint.get(c) is None
+    # A changed chunk keeps its id but not its hash, so it is embedded again
+    assert checkpoint.get(chunks(a="alpha 2")[0]) is None
+
+    embeddings = CountingEmbeddings()
+    populate_db.embedding_model, original = embeddings, populate_db.embedding_model
+    try:
+        vectors = embed_chunks([a, b, c], checkpoint, TokenRateLimiter(10**9), batch_size=2, max_retries=0)
+    finally:
+        populate_db.embedding_model = original
+    assert embeddings.texts == ["gamma"]
+    assert vectors[:2] == [[1.0], [2.0]] and len(vectors[2]) == 8
+
+
+def test_rate_limiter_waits_for_the_bucket_to_refill():
+    limiter = TokenRateLimiter(tokens_per_minute=6000)  # 100 tokens per second
+    limiter.acquire(6000)
+    start = time.monotonic()
+    limiter.acquire(20)
+    assert 0.15 <= time.monotonic() - start < 1.0
+
+
+def test_rate_limiter_caps_a_batch_larger_than_the_budget():
+    limiter = TokenRateLimiter(tokens_per_minute=60000)
+    start = time.monotonic()
+    limiter.acquire(10**6)
+    assert time.monotonic() - start < 0.1
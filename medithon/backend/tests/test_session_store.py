@@ -0,0 +1,71 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_community")
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from gen_ai_components import session_store  # noqa: E402
+from gen_ai_components.session_store import SQLiteSessionStore  # noqa: E402
+
+
+def contents(history):
+    return [m.content for m in history.messages]
+
+
+def test_reads_are_served_from_memory_until_another_worker_writes(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    worker_a, worker_b = SQLiteSessionStore(path=path), SQLiteSessionStore(path=path)
+
+    worker_a.get("s").add_messages([HumanMessage(content="q1"), AIMessage(content="a1")])
+    assert contents(worker_a.get("s")) == ["q1", "a1"]
+    assert "s" in worker_a._cache
+
+    # Another process appends: the newest message id changes, so worker A re-reads
+    worker_b.get("s").add_messages([HumanMessage(content="q2")])
+    assert contents(worker_a.get("s")) == ["q1", "a1", "q2"]
+
+    worker_a.get("s").replace_messages([AIMessage(content="summary")])
+    assert contents(worker_b.get("s")) == ["summary"]
+    assert contents(worker_a.get("s")) == ["summary"]
+
+
+def test_deleted_session_is_not_served_from_memory(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    worker_a, worker_b = SQLiteSessionStore(path=path), SQLiteSessionStore(path=path)
+    worker_a.get("s").add_messages([HumanMessage(content="q1")])
+    assert contents(worker_a.get("s")) == ["q1"]
+    worker_b.delete("s")
+    assert contents(worker_a.get("s")) == []
+
+
+def _hold_lock(db_path, session_id, held, release):
+    session_store.SESSION_STORE = "sqlite"
+    session_store.SESSION_DB_PATH = db_path
+    with session_store.session_lock(session_id):
+        held.set()
+        release.wait(10)
+
+
+@pytest.mark.skipif(session_store.fcntl is None, reason="cross-process session locks need fcntl")
+def test_session_lock_serializes_across_processes(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sessions.sqlite3")
+    monkeypatch.setattr(session_store, "SESSION_STORE", "sqlite")
+    monkeypatch.setattr(session_store, "SESSION_DB_PATH", db_path)
+    monkeypatch.setattr(session_store, "_lock_file", None)
+
+    ctx = multiprocessing.get_context("spawn")
+    held, release = ctx.Event(), ctx.Event()
+    other = ctx.Process(target=_hold_lock, args=(db_path, "doctor-1", held, release))
+    other.start()
+    try:
+        assert held.wait(10)
+        threading.Timer(0.3, release.set).start()
+        start = time.monotonic()
+        with session_store.session_lock("doctor-1"):
+            assert time.monotonic() - start >= 0.25
+    finally:
+        release.set()
+        other.join(10)
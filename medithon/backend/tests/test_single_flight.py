@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from gen_ai_components.single_flight import SingleFlight, normalize_query, query_key
+
+
+def run_together(flight, key, result, n):
+    """
+    n concurrent flight.do(key, ...) calls; the first to run holds the key
+    until the other n - 1 are waiting on it. Returns each caller's
+    (result, shared) or exception, and how many times fn ran.
+    """
+    outcomes, calls, release = [None] * n, [], threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with flight._lock:
+            pending = flight._calls.get(key)
+            if pending is not None and pending.waiters == n - 1:
+                break
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return outcomes, len(calls)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    outcomes, calls = run_together(flight, "k", "answer", 5)
+    assert calls == 1
+    assert sorted(outcomes, key=lambda o: o[1]) == [("answer", False)] + [("answer", True)] * 4
+    assert flight.in_flight() == 0
+
+
+def test_followers_receive_the_leaders_exception():
+    error = RuntimeError("upstream down")
+    outcomes, calls = run_together(SingleFlight("test"), "k", error, 3)
+    assert calls == 1
+    assert all(outcome is error for outcome in outcomes)
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight("test")
+    assert flight.do("k", lambda: "first") == ("first", False)
+    assert flight.do("k", lambda: "second") == ("second", False)
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_run_separately():
+    flight, release = SingleFlight("test"), threading.Event()
+    leader = threading.Thread(target=flight.do, args=("a", lambda: release.wait(5)))
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    # "a" is still running; "b" does not wait for it
+    assert flight.do("b", lambda: "b") == ("b", False)
+    release.set()
+    leader.join()
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Is Metformin  safe?", "is metformin safe?"),
+    ("  dose of\tamlodipine\n", "dose of amlodipine"),
+])
+def test_normalize_query(a, b):
+    assert normalize_query(a) == normalize_query(b)
+
+
+def test_normalize_query_keeps_wording():
+    assert normalize_query("metformin dose") != normalize_query("dose metformin")
+    assert normalize_query(None) == ""
+
+
+def test_query_key_separates_knowledge_base_versions():
+    assert query_key("doctor", "Is Metformin safe?", "v1") == query_key("doctor", "is metformin  safe?", "v1")
+    assert query_key("doctor", "q", "v1") != query_key("doctor", "q", "v2")
+    assert query_key("doctor", "q", "v1") != query_key("user", "q", "v1")
@@ -0,0 +1,147 @@
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from gen_ai_components.snapshot import FORMAT_VERSION, Snapshot, SnapshotRetriever, build_index, normalize
+
+
+def write_snapshot(path, vectors, index_dim=None, index_dtype=None):
+    """A one-collection snapshot ("c"), with a search index when index_dim or index_dtype is given."""
+    os.makedirs(path)
+    np.save(os.path.join(path, "embeddings.npy"), np.asarray(vectors, dtype=np.float32))
+    index = None
+    if index_dim or index_dtype:
+        index, scales = build_index(np.asarray(vectors, dtype=np.float32), index_dim, index_dtype or "int8")
+        np.save(os.path.join(path, "index.npy"), index)
+        if scales is not None:
+            np.save(os.path.join(path, "index_scale.npy"), scales)
+    with open(os.path.join(path, "records.jsonl"), "w", encoding="utf-8") as f:
+        for i in range(len(vectors)):
+            f.write(json.dumps({"id": f"c{i}", "text": f"chunk {i}", "metadata": {}}) + "\n")
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "format": FORMAT_VERSION, "version": "test", "collections": {"c": [0, len(vectors)]},
+            "index": {"dim": int(index.shape[1]), "dtype": index_dtype or "int8"} if index is not None else None,
+        }, f)
+
+
+def test_scores_are_chromas_squared_l2(tmp_path):
+    vectors = np.array([[1.0, 0.0], [0.6, 0.8], [0.0, 1.0]], dtype=np.float32)
+    write_snapshot(str(tmp_path / "snap"), vectors)
+    retriever = Snapshot(str(tmp_path / "snap")).collection("c", embedding_function=None)
+
+    query = np.array([0.8, 0.6], dtype=np.float32)
+    results = retriever.similarity_search_by_vector_with_score(query.tolist(), k=3)
+
+    expected = sorted((float(((v - query) ** 2).sum()), f"c{i}") for i, v in enumerate(vectors))
+    assert [doc.id for doc, _ in results] == [id_ for _, id_ in expected]
+    assert [score for _, score in results] == pytest.approx([d for d, _ in expected], abs=1e-5)
+
+
+# Matryoshka-like rows: most of the signal sits in the leading components,
+# which is what makes truncated indexes usable
+ROWS, DIM, K = 300, 64, 5
+rng = np.random.default_rng(0)
+MATRIX = normalize(rng.normal(size=(ROWS, DIM)) * 0.93 ** np.arange(DIM))
+QUERIES = normalize(MATRIX[rng.choice(ROWS, 20, replace=False)] + rng.normal(size=(20, DIM)) * 0.05)
+
+
+def exact_top(query, k=K):
+    """Ids and squared-L2 distances of the k nearest rows, from the float matrix."""
+    distances = ((MATRIX - query) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:k]
+    return [f"c{i}" for i in order], distances[order].tolist()
+
+
+def retriever(tmp_path, rescore_factor, **index):
+    path = str(tmp_path / "snap")
+    write_snapshot(path, MATRIX, **index)
+    return SnapshotRetriever(Snapshot(path), "c", 0, ROWS, None, rescore_factor=rescore_factor)
+
+
+@pytest.mark.parametrize("index", [
+    {},
+    {"index_dtype": "int8"},
+    {"index_dtype": "float16", "index_dim": 32},
+    {"index_dtype": "int8", "index_dim": 32},
+], ids=["exact", "int8", "float16-32d", "int8-32d"])
+def test_rescored_top_k_matches_the_exact_ranking(tmp_path, index):
+    store = retriever(tmp_path, rescore_factor=8, **index)
+    for query, results in zip(QUERIES, store.similarity_search_by_vectors_with_score(QUERIES.tolist(), k=K)):
+        ids, distances = exact_top(query)
+        assert [doc.id for doc, _ in results] == ids
+        # Re-scored against the full matrix: exact distances on Chroma's scale
+        assert [score for _, score in results] == pytest.approx(distances, abs=1e-4)
+
+
+def test_int8_index_scores_without_rescoring_stay_close(tmp_path):
+    store = retriever(tmp_path, rescore_factor=0, index_dtype="int8")
+    for query in QUERIES:
+        results = store.similarity_search_by_vector_with_score(query.tolist(), k=K)
+        ids, distances = exact_top(query)
+        assert results[0][0].id == ids[0]
+        assert results[0][1] == pytest.approx(distances[0], abs=0.02)
+        assert all(0 <= score <= 4 for _, score in results)
+
+
+def test_rescoring_recovers_what_a_truncated_index_misorders(tmp_path):
+    coarse = retriever(tmp_path / "coarse", rescore_factor=0, index_dtype="int8", index_dim=8)
+    fine = retriever(tmp_path / "fine", rescore_factor=8, index_dtype="int8", index_dim=8)
+    exact = [exact_top(query)[0] for query in QUERIES]
+    coarse_ids = [[doc.id for doc, _ in r] for r in coarse.similarity_search_by_vectors_with_score(QUERIES.tolist(), K)]
+    fine_ids = [[doc.id for doc, _ in r] for r in fine.similarity_search_by_vectors_with_score(QUERIES.tolist(), K)]
+    assert coarse_ids != exact
+    assert fine_ids == exact
+
+@pytest.fixture
+def exported(tmp_path):
+    pytest.importorskip("chromadb")
+    from gen_ai_components.providers import close_vector_store, collection_dir, open_chroma
+    from gen_ai_components.snapshot import COLLECTIONS, export_snapshot
+
+    source = str(tmp_path / "source")
+    for n, name in enumerate(COLLECTIONS[:2]):
+        db = open_chroma(collection_dir(source, name))
+        db._collection.upsert(ids=[f"{name}-{i}" for i in range(3)], embeddings=[[1.0, i, n] for i in range(3)],
+                              documents=[f"chunk {i}" for i in range(3)], metadatas=[{"seq_num": i} for i in range(3)])
+        close_vector_store(db)
+    return export_snapshot(source, str(tmp_path / "snapshots"), dtype="float32")
+
+
+def leftovers(root):
+    return [entry for entry in os.listdir(root) if ".import-" in entry]
+
+
+def test_import_publishes_each_collection(tmp_path, exported):
+    from gen_ai_components.providers import close_vector_store, collection_dir, collection_versions, open_chroma
+    from gen_ai_components.snapshot import COLLECTIONS, import_snapshot
+
+    target = str(tmp_path / "target")
+    os.makedirs(target)
+    import_snapshot(exported, target)
+
+    for name in COLLECTIONS[:2]:
+        assert len(collection_versions(target, name)) == 1
+        db = open_chroma(collection_dir(target, name))
+        assert sorted(db.get()["ids"]) == [f"{name}-{i}" for i in range(3)]
+        close_vector_store(db)
+    assert leftovers(target) == []
+
+
+def test_failed_import_removes_its_build(tmp_path, exported, monkeypatch):
+    from gen_ai_components import providers
+    from gen_ai_components.snapshot import import_snapshot
+
+    def fail(root, name, build_dir):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(providers, "publish_collection", fail)
+    target = str(tmp_path / "target")
+    os.makedirs(target)
+    with pytest.raises(OSError):
+        import_snapshot(exported, target)
+    assert leftovers(target) == []
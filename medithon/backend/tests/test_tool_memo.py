@@ -0,0 +1,32 @@
+from gen_ai_components.tool_memo import CHARS_PER_TOKEN, ToolOutputCompactor, canonical_key, chunk_id
+
+
+def result(*contents):
+    return {"tool": "drug_information_retrieval", "top_matches": [{"content": c, "metadata": {}} for c in contents]}
+
+
+def test_canonical_key_ignores_case_whitespace_and_drug_order():
+    a = canonical_key("comparative_analysis", {"drug_names": ["Metformin", "  glimepiride"]})
+    b = canonical_key("comparative_analysis", {"drug_names": ["GLIMEPIRIDE", "metformin"]})
+    assert a == b
+
+
+def test_repeated_chunks_are_sent_by_id():
+    compactor = ToolOutputCompactor()
+    compactor.compact(result("alpha", "beta"))
+    second = compactor.compact(result("beta", "gamma"))
+    assert [m["content"] for m in second["top_matches"]] == ["gamma"]
+    assert second["already_provided_chunk_ids"] == [chunk_id("beta")]
+
+
+def test_chunks_past_the_budget_are_listed_as_omitted():
+    compactor = ToolOutputCompactor(token_budget=10)
+    long_text = "x" * (10 * CHARS_PER_TOKEN)
+    compacted = compactor.compact(result(long_text, "second", "third"))
+    assert len(compacted["top_matches"]) == 1
+    assert compacted["omitted_chunk_ids"] == [chunk_id("second"), chunk_id("third")]
+
+    # Omitted chunks were never sent, so a later result may still include them
+    later = ToolOutputCompactor(token_budget=10)
+    later.sent_ids = compactor.sent_ids
+    assert [m["content"] for m in later.compact(result("second"))["top_matches"]] == ["second"]